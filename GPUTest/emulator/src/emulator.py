@@ -1,12 +1,20 @@
 from thread import *
 from state import *
+from program import *
+from warp import *
+from tracer import tracer, parse_events, EVENT_NAMES
 from mem import *
 from instr import *
 from reg_file import *
 from common.custom_enums import *
+import io
 import sys
+import atexit
 import argparse
+import multiprocessing
+from contextlib import redirect_stdout
 from pathlib import Path
+from typing import Optional
 
 # --- Path Setup ---
 _PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
@@ -64,46 +72,143 @@ def parse_args():
         type=int,
         default=None,
         metavar="TID",
-        help="Only print trace output for this thread ID (0-31 within warp). Omit to log all threads.",
+        help="Shorthand for '--trace - --trace-threads TID' (JSONL trace of one thread on stdout)",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        default=None,
+        help="Write an execution trace to FILE ('-' for stdout). Tracing is off by default",
+    )
+    parser.add_argument(
+        "--trace-format",
+        choices=["jsonl", "bin"],
+        default="jsonl",
+        help="Trace record format: JSON lines or fixed-size binary records (see tracer.py)",
+    )
+    parser.add_argument(
+        "--trace-events",
+        type=parse_events,
+        default="all",
+        metavar="KINDS",
+        help=f"Comma separated event kinds to trace: {', '.join(EVENT_NAMES)} or all",
+    )
+    parser.add_argument(
+        "--trace-threads",
+        type=lambda x: {int(t, 0) for t in x.split(",")},
+        default=None,
+        metavar="TIDS",
+        help="Comma separated thread IDs to trace (default: all threads)",
+    )
+    parser.add_argument(
+        "--trace-pc",
+        type=_parse_pc_range,
+        default=None,
+        metavar="START:END",
+        help="Only trace instructions with START <= PC < END",
+    )
+    parser.add_argument(
+        "--exec-mode",
+        choices=["warp", "thread"],
+        default="warp",
+        help="warp: issue each PC once across all lanes in lockstep; thread: step the 32 threads independently (cross-check)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["bits", "numpy"],
+        default="bits",
+        help="Register file backend; numpy keeps each warp's registers in one array and runs ALU ops across lanes at once",
+    )
+    parser.add_argument(
+        "--mem-backend",
+        choices=["paged", "mmap"],
+        default="paged",
+        help="paged: lazily allocated bytearray pages; mmap: one sparse mapping of the full 4 GB address space",
+    )
+    parser.add_argument(
+        "--mmap-file",
+        type=Path,
+        default=None,
+        help="Back the mmap memory with this file instead of anonymous memory",
+    )
+    parser.add_argument(
+        "--no-predecode",
+        action="store_true",
+        help="Decode every fetch from memory instead of using the predecoded program image",
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Simulate thread blocks in N worker processes. Every block starts from the initial memory image and write sets are merged in block order",
+    )
 
+    args = parser.parse_args()
+    if args.jobs > 1:
+        if args.trace is not None or args.log_thread is not None:
+            parser.error("tracing is not supported with --jobs > 1")
+        if args.mmap_file is not None:
+            parser.error(
+                "--mmap-file is shared between processes, use --jobs 1"
+            )
+    return args
 
-# --- Main Execution ---
-if __name__ == "__main__":
-    args = parse_args()
 
-    # Validation: Check if input file exists
-    if not args.input_file.exists():
-        print(f"Error: Input file '{args.input_file}' not found.")
-        sys.exit(1)
+def _parse_pc_range(text: str) -> tuple[int, int]:
+    start, _, end = text.partition(":")
+    return int(start, 0), int(end, 0)
 
-    print(f"Starting Simulation: {args.input_file}")
-    print(f"Threads: {
-        args.threads_per_block} | Blocks: {
-        args.num_blocks} | Start PC: {
-        hex(
-            args.start_pc)}")
-    warps_per_block = (args.threads_per_block + 31) // 32
 
-    # Shared State
-    mem = Mem(args.start_pc, str(args.input_file), args.mem_format)
+def _report_invalid_access(who: str, pc: int, e: KeyError) -> None:
+    # Invalid memory access: addr not in mem (never stored/initialized)
+    print(f"\n*** Invalid memory access: {who}, PC 0x{pc:04x} ***")
+    print(f"*** KeyError: {e} (address {e.args[0]} = 0x{e.args[0]:x}) ***")
+    sys.stdout.flush()
+
+
+def run_threads(threads: list[Thread]) -> None:
+    # Run Warp: continue until ALL threads have halted (SIMT allows
+    # divergence)
+    thread_halted = [False] * len(threads)
+    while not all(thread_halted):
+        for tid, thread in enumerate(threads):
+            if thread_halted[tid]:
+                continue
+            try:
+                thread_halted[tid] = thread.step_instruction()
+            except KeyError as e:
+                _report_invalid_access(f"thread {tid}", thread.pc, e)
+                raise
 
-    # No-op stdout for filtering thread output when --log-thread is set
-    class _NoOpWriter:
-        def write(self, s):
-            pass
 
-        def flush(self):
-            pass
+def run_warp(
+    warp_id: int,
+    threads: list[Thread],
+    pfile: PredicateRegFile,
+    program: ProgramImage,
+    regs: WarpRegFile = None,
+) -> None:
+    warp = Warp(threads, pfile, program=program, regs=regs)
+    try:
+        warp.run_until_halt()
+    except KeyError as e:
+        _report_invalid_access(f"thread {warp.lane}", warp.pc, e)
+        raise
+    print(
+        f"Warp {warp_id}: {warp.issued} issues "
+        f"({warp.divergent_issues} divergent), {warp.lane_ops} lane ops"
+    )
 
-    _real_stdout = sys.stdout
 
-    for block_id, warp_id in [
-        (b, w) for b in range(args.num_blocks) for w in range(warps_per_block)
-    ]:
+def simulate_block(
+    block_id: int, args, mem: Mem, program: Optional[ProgramImage]
+) -> None:
+    warps_per_block = (args.threads_per_block + 31) // 32
+    for warp_id in range(warps_per_block):
         pfile = PredicateRegFile(threads_per_warp=32)
+        wregs = WarpRegFile() if args.backend == "numpy" else None
 
         rfiles = []
         states = []
@@ -112,10 +217,15 @@ if __name__ == "__main__":
 
         # Setup Warp
         for tid in range(32):
-            if args.log_thread is not None and tid != args.log_thread:
-                sys.stdout = _NoOpWriter()
-            rfiles.append(RegFile())
-            states.append(State(memory=mem, rfile=rfiles[tid], pfile=pfile))
+            rfiles.append(RegFile() if wregs is None else wregs.lane(tid))
+            states.append(
+                State(
+                    memory=mem,
+                    rfile=rfiles[tid],
+                    pfile=pfile,
+                    program=program,
+                )
+            )
             csr_files.append(
                 CsrRegFile(
                     thread_id=(32 * warp_id + tid),
@@ -131,35 +241,148 @@ if __name__ == "__main__":
                     csr_file=csr_files[tid],
                 )
             )
-            sys.stdout = _real_stdout
 
-        # Run Warp: continue until ALL threads have halted (SIMT allows
-        # divergence)
         print(f"\n --- Starting Warp: {warp_id} in Block: {block_id} --- ")
-        thread_halted = [False] * len(threads)
-        while not all(thread_halted):
-            for tid, thread in enumerate(threads):
-                if thread_halted[tid]:
-                    continue
-                if args.log_thread is not None and tid != args.log_thread:
-                    sys.stdout = _NoOpWriter()
-                else:
-                    sys.stdout = _real_stdout
-                try:
-                    thread_halted[tid] = thread.step_instruction()
-                except KeyError as e:
-                    # Invalid memory access: addr not in mem (never stored/initialized)
-                    # Always print to real stdout (bypass --log-thread filter)
-                    _real_stdout.write(
-                        f"\n*** Invalid memory access: thread {tid}, PC 0x{
-                            thread.pc:04x} ***\n"
-                    )
-                    _real_stdout.write(f"*** KeyError: {e} (address {
-                        e.args[0]} = 0x{
-                        e.args[0]:x}) ***\n")
-                    _real_stdout.flush()
-                    raise
-        sys.stdout = _real_stdout
+        if args.exec_mode == "warp":
+            run_warp(warp_id, threads, pfile, program, wregs)
+        else:
+            run_threads(threads)
+
+
+# --- Block-Parallel Execution ---
+# Worker state. Under fork it is inherited from the parent, so workers share
+# its paged memory image copy-on-write; otherwise (spawn, or the mmap
+# backend, whose mapping is shared between processes) _init_job_worker
+# rebuilds it in each worker.
+_job_args = None
+_job_mem: Optional[Mem] = None
+_job_program: Optional[ProgramImage] = None
+
+
+def _init_job_worker(args) -> None:
+    global _job_args, _job_mem, _job_program
+    if _job_mem is not None:
+        return
+    _job_args = args
+    _job_mem = Mem(
+        args.start_pc,
+        str(args.input_file),
+        args.mem_format,
+        backend=args.mem_backend,
+        dump_at_exit=False,
+    )
+    _job_program = None if args.no_predecode else ProgramImage(_job_mem)
+
+
+def _run_block_job(block_id: int):
+    # Runs in a fresh worker per block (maxtasksperchild=1), so the block
+    # only ever sees the initial memory image
+    written: set[int] = set()
+    _job_mem.write_listeners.append(
+        lambda addr, n: written.update(range(addr, addr + n))
+    )
+    out = io.StringIO()
+    error = None
+    try:
+        with redirect_stdout(out):
+            simulate_block(block_id, _job_args, _job_mem, _job_program)
+    except Exception as e:
+        error = e
+    writes = {a & 0xFFFFFFFF: _job_mem.byte(a) for a in written}
+    return out.getvalue(), writes, error
+
+
+def run_blocks_parallel(args, mem: Mem, program: Optional[ProgramImage]):
+    global _job_args, _job_mem, _job_program
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+    if ctx.get_start_method() == "fork" and mem.backend == "paged":
+        _job_args, _job_mem, _job_program = args, mem, program
+
+    # mem must not change until every worker has been forked, so results
+    # are only merged once the pool is done
+    with ctx.Pool(
+        args.jobs,
+        initializer=_init_job_worker,
+        initargs=(args,),
+        maxtasksperchild=1,
+    ) as pool:
+        results = pool.map(_run_block_job, range(args.num_blocks), 1)
+
+    # Words written by more than one block race on real hardware, and the
+    # result may differ from a serial run even when the values agree
+    owner: dict[int, int] = {}  # byte addr -> last block that wrote it
+    conflicts: dict[int, tuple[int, int]] = {}  # word addr -> blocks
+    differing: set[int] = set()
+    for block_id, (out, writes, error) in enumerate(results):
+        sys.stdout.write(out)
+        for addr, val in writes.items():
+            prev = owner.get(addr)
+            if prev is not None:
+                conflicts.setdefault(addr & ~0x3, (prev, block_id))
+                if mem.byte(addr) != val:
+                    differing.add(addr & ~0x3)
+            owner[addr] = block_id
+        mem.merge(writes)
+        if error is not None:
+            raise error
+
+    if conflicts:
+        print(
+            f"\nWarning: {len(conflicts)} words written by more than one "
+            f"block ({len(differing)} with different values, last block "
+            "wins):"
+        )
+        for addr in sorted(conflicts)[:10]:
+            first, last = conflicts[addr]
+            note = " (values differ)" if addr in differing else ""
+            print(f"  0x{addr:08x}: block {first} and block {last}{note}")
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Validation: Check if input file exists
+    if not args.input_file.exists():
+        print(f"Error: Input file '{args.input_file}' not found.")
+        sys.exit(1)
+
+    print(f"Starting Simulation: {args.input_file}")
+    print(f"Threads: {
+        args.threads_per_block} | Blocks: {
+        args.num_blocks} | Start PC: {
+        hex(
+            args.start_pc)}")
+
+    if args.log_thread is not None and args.trace is None:
+        args.trace = "-"
+        args.trace_threads = {args.log_thread}
+    if args.trace is not None:
+        tracer.configure(
+            args.trace,
+            fmt=args.trace_format,
+            events=args.trace_events,
+            threads=args.trace_threads,
+            pc_range=args.trace_pc,
+        )
+        atexit.register(tracer.close)
+
+    # Shared State
+    mem = Mem(
+        args.start_pc,
+        str(args.input_file),
+        args.mem_format,
+        backend=args.mem_backend,
+        mmap_file=args.mmap_file,
+    )
+    program = None if args.no_predecode else ProgramImage(mem)
+
+    if args.jobs > 1 and args.num_blocks > 1:
+        run_blocks_parallel(args, mem, program)
+    else:
+        for block_id in range(args.num_blocks):
+            simulate_block(block_id, args, mem, program)
 
     mem.dump()
 
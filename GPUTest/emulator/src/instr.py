@@ -26,19 +26,34 @@ class Instr(ABC):
     def __init__(self, op: Op) -> None:
         self.op = op
 
+    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
+        if not self.check_predication(csr, state):
+            return None
+        return self.execute(csr, state)
+
     @abstractmethod
-    def eval(self, csr: CsrRegFile, state: State) -> bool:
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
+        # Run for one thread without checking the guard predicate. Returns
+        # the next PC for control flow, None to fall through.
         pass
 
-    def check_predication(self, csr: CsrRegFile, state: State) -> bool:
-        local_thread_id = csr.get_thread_id()
-
+    def is_predicated(self) -> bool:
         # Non-predicated instructions
-        if self.op in {H_Op.HALT, I_Op_2.JALR, P_Op.JPNZ, J_Op.JAL}:
+        return self.op not in {H_Op.HALT, I_Op_2.JALR, P_Op.JPNZ, J_Op.JAL}
+
+    def check_predication(self, csr: CsrRegFile, state: State) -> bool:
+        if not self.is_predicated():
             return True
 
+        local_thread_id = csr.get_thread_id()
         return state.pfile.read_thread(self.pred, local_thread_id)
 
+    def lane_mask(self, pfile: PredicateRegFile) -> int:
+        # Lanes of a warp that execute this instruction
+        if not self.is_predicated():
+            return (1 << pfile.threads_per_warp) - 1
+        return pfile.read(self.pred).uint
+
     def check_overflow(
         self, result: Union[int, float], global_thread_id: int
     ) -> None:
@@ -151,55 +166,35 @@ class Instr(ABC):
 
         # TODO: Handle floating point branches - B_TYPE_1
         type = Instr_Type(opcode)
-        print("- " + type.name + " -")
         # things passed into here: instruction (line) itself and PC
         match type:
             case Instr_Type.R_TYPE_0:
                 op = R_Op_0(funct3)
-                print(
-                    f"\tfunct={op}, rs1={rs1.int}, rs2={rs2.int}, rd={rd.uint}"
-                )
                 ret_instr = R_Instr_0(op=op, rs1=rs1, rs2=rs2, rd=rd)
             case Instr_Type.R_TYPE_1:
                 op = R_Op_1(funct3)
-                print(
-                    f"\tfunct={op}, rs1={rs1.int}, rs2={rs2.int}, rd={rd.uint}"
-                )
                 ret_instr = R_Instr_1(op=op, rs1=rs1, rs2=rs2, rd=rd)
             case Instr_Type.R_TYPE_2:  # Also depricated B_TYPE_1
                 try:  # R_TYPE_2
                     op = R_Op_2(funct3)
-                    print(f"\tfunct={op}, rs1={
-                        rs1.int}, rs2={
-                        rs2.int}, rd={
-                        rd.uint}")
                     ret_instr = R_Instr_2(op=op, rs1=rs1, rs2=rs2, rd=rd)
                 except BaseException:  # B_TYPE_1
                     op = B_Op_1(funct3)
                     ret_instr = B_Instr_1(
                         op=op, rs1=rs1, rs2=rs2, preddest=rd
                     )  # reads preddest in the normal rd spot
-                    print(f"\tfunct={op}")
             case Instr_Type.I_TYPE_0:
                 op = I_Op_0(funct3)
-                print(f"\tfunct={op},rd={rd.int},rs1={rs1.int},imm={imm.int}")
                 ret_instr = I_Instr_0(op=op, rs1=rs1, imm=imm, rd=rd)
             case Instr_Type.I_TYPE_1:
                 op = I_Op_1(funct3)
-                print(f"\tfunct={op},imm={imm.int}")
                 ret_instr = I_Instr_1(op=op, rs1=rs1, imm=imm, rd=rd)
             case Instr_Type.I_TYPE_2:
                 op = I_Op_2(funct3)
-                print(
-                    f"\tfunct={op}, rd={rd.int}, rs1={rs1.int}, imm={imm.int}"
-                )
                 ret_instr = I_Instr_2(op=op, rs1=rs1, imm=imm, rd=rd, pc=pc)
             case Instr_Type.S_TYPE_0:
                 op = S_Op_0(funct3)
                 # rs2 = imm #reads rs2 in imm spot
-                print(
-                    f"\tfunct={op},imm={rd.int}, rs1={rs1.int}, rs2={rs2.int}"
-                )
                 ret_instr = S_Instr_0(
                     op=op, rs1=rs1, rs2=rs2, imm=rd
                 )  # reads imm in the normal rd spot
@@ -208,11 +203,9 @@ class Instr(ABC):
                 ret_instr = B_Instr_0(
                     op=op, rs1=rs1, rs2=rs2, preddest=rd
                 )  # reads preddest in the normal rd spot
-                print(f"\tfunct={op}")
             case Instr_Type.U_TYPE:
                 op = U_Op(funct3)
                 imm = imm + rs1  # concatenate
-                print(f"\tfunct={op},imm={imm.int}, rd={rd.uint}")
                 ret_instr = U_Instr(op=op, imm=imm, rd=rd, pc=pc)
             case Instr_Type.J_TYPE:
                 op = J_Op(funct3)
@@ -221,11 +214,9 @@ class Instr(ABC):
             case Instr_Type.C_TYPE:
                 op = C_Op(funct3)
                 # CSR uses 6 bits [18:13]
-                print(f"ctype, funct={op}, csr={rs1.uint}, rd={rd.uint}")
                 ret_instr = C_Instr(op=op, csr1=rs1, rd=rd)
             case Instr_Type.F_TYPE:
                 op = F_Op(funct3)
-                print(f"ftype, funct={op},imm={imm.int}")
                 ret_instr = F_Instr(op=op, rs1=rs1, rd=rd)
             case Instr_Type.P_TYPE:
                 op = P_Op(funct3)
@@ -235,17 +226,13 @@ class Instr(ABC):
                     jpnz_imm = Bits(
                         bin=instruction.bin[7:19], length=12
                     )  # bits [24:13]
-                    print(f"ptype, funct={op}, prd={rd}, rs2={rs2}, imm={
-                        jpnz_imm.int} (jpnz 12b signed)")
                     ret_instr = P_Instr(
                         op, prd=rd, rs2=rs2, imm=jpnz_imm, pc=pc
                     )
                 else:
-                    print(f"ptype, funct={op}, prd={rd}, rs2={rs2}, imm={rs1}")
                     ret_instr = P_Instr(op, prd=rd, rs2=rs2, imm=rs1, pc=pc)
             case Instr_Type.H_TYPE:
                 op = H_Op(funct3)
-                print(f"halt, funct={op}, {funct3}")
                 ret_instr = H_Instr(op=op, funct3=funct3)
             case _:
                 raise NotImplementedError(
@@ -263,10 +250,7 @@ class R_Instr_0(Instr):
         self.rs2 = rs2
         self.rd = rd
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         rdat1 = state.rfile.read(self.rs1)
         rdat2 = state.rfile.read(self.rs2)
         match self.op:
@@ -316,10 +300,7 @@ class R_Instr_1(Instr):
         self.rs2 = rs2
         self.rd = rd
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         rdat1 = state.rfile.read(self.rs1)
         rdat2 = state.rfile.read(self.rs2)
 
@@ -388,10 +369,7 @@ class R_Instr_2(Instr):
         self.rs2 = rs2
         self.rd = rd
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         rdat1 = state.rfile.read(self.rs1)
         rdat2 = state.rfile.read(self.rs2)
 
@@ -421,10 +399,7 @@ class I_Instr_0(Instr):
         self.rd = rd
         self.imm = imm
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         rdat1 = state.rfile.read(self.rs1)
         imm_val = self.imm.int  # Sign-extended immediate
 
@@ -459,10 +434,7 @@ class I_Instr_1(Instr):
         self.rd = rd
         self.imm = imm
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         rdat1 = state.rfile.read(self.rs1)
         imm_val = (
             self.imm.int
@@ -502,10 +474,7 @@ class I_Instr_2(Instr):
         self.imm = imm
         self.pc = pc  # Program counter for JALR
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         rdat1 = state.rfile.read(self.rs1)
         imm_val = self.imm.int  # Sign-extended immediate
 
@@ -558,10 +527,7 @@ class F_Instr(Instr):
         self.rs1 = rs1
         self.rd = rd
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         rdat1 = state.rfile.read(self.rs1)
 
         match self.op:
@@ -614,11 +580,7 @@ class S_Instr_0(Instr):
         self.rs2 = rs2
         self.imm = imm
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            print("Skipped S-Type instruction due to predication")
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         rdat1 = state.rfile.read(self.rs1)
         rdat2 = state.rfile.read(self.rs2)
         imm_val = self.imm.int  # Sign-extended immediate
@@ -651,10 +613,7 @@ class B_Instr_0(Instr):
         self.rs2 = rs2
         self.preddest = preddest
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         rdat1 = state.rfile.read(self.rs1)
         rdat2 = state.rfile.read(self.rs2)
 
@@ -678,9 +637,6 @@ class B_Instr_0(Instr):
                 raise NotImplementedError(f"B-Type operation {
                     self.op} not implemented yet or doesn't exist.")
 
-        print(
-            f"Writing to predicate register {self.preddest.int} value {result}"
-        )
         state.pfile.write_thread(
             self.preddest, csr.get_thread_id(), bool(result)
         )
@@ -696,10 +652,7 @@ class B_Instr_1(Instr):
         self.rs2 = rs2
         self.preddest = preddest
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         rdat1 = state.rfile.read(self.rs1)
         rdat2 = state.rfile.read(self.rs2)
 
@@ -719,9 +672,6 @@ class B_Instr_1(Instr):
                 raise NotImplementedError(f"B-Type operation {
                     self.op} not implemented yet or doesn't exist.")
 
-        print(
-            f"Writing to predicate register {self.preddest.int} value {result}"
-        )
         state.pfile.write_thread(
             self.preddest, csr.get_thread_id(), bool(result)
         )
@@ -735,10 +685,7 @@ class U_Instr(Instr):
         self.imm = imm
         self.pc = pc  # Program counter for AUIPC
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         match self.op:
             # Build PC
             case U_Op.AUIPC:
@@ -795,10 +742,7 @@ class C_Instr(Instr):
         self.rd = rd
         self.csr1 = csr1
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
-        if not self.check_predication(csr, state):
-            return None
-
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         if self.op != C_Op.CSRR:
             raise NotImplementedError(
                 f"C-Type operation {self.op} not implemented yet or doesn't exist."
@@ -818,7 +762,7 @@ class J_Instr(Instr):
         self.imm = imm
         self.pc = pc
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         if self.op != J_Op.JAL:
             raise NotImplementedError(
                 f"J-Type operation {self.op} not implemented yet or doesn't exist."
@@ -844,7 +788,11 @@ class P_Instr(Instr):
         self.imm = imm
         self.pc = pc  # Program counter for JPNZ
 
-    def eval(self, csr: CsrRegFile, state: State) -> bool:
+    def is_predicated(self) -> bool:
+        # JPNZ tests a whole predicate register, PRSW/PRLW act per warp
+        return False
+
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         # Mark first thread in each warp
         is_first_thread = True
         if csr.get_thread_id() % state.pfile.threads_per_warp:
@@ -887,6 +835,6 @@ class H_Instr(Instr):  # returns true
     ) -> None:
         super().__init__(op)
 
-    def eval(self, csr: CsrRegFile, state: State) -> Optional[int]:
+    def execute(self, csr: CsrRegFile, state: State) -> Optional[int]:
         raise RuntimeError("Attempted to evaluate a HALT instruction.")
         return None
@@ -1,19 +1,53 @@
 # write into memsim.hex as hash table
-from pathlib import Path
 import atexit
+import mmap
+import struct
 from pathlib import Path
+from typing import Callable, Optional
 from bitstring import Bits
+from tracer import tracer, MEM_READ, MEM_WRITE
+
+# Memory is split into fixed-size pages that are only allocated once
+# touched. Every page has a data buffer and a same-sized valid buffer that
+# marks bytes which have been initialized or written, so reads of
+# uninitialized memory still raise KeyError(addr).
+PAGE_BITS = 16
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+ADDR_SPACE = 1 << 32  # 4 GB Twig address space (MMIO.md)
+
+_ACCESS = {n: struct.Struct(f) for n, f in ((1, "<B"), (2, "<H"), (4, "<I"))}
+_VALID = {n: b"\x01" * n for n in _ACCESS}
+_INVALID = b"\x00"
 
 
 class Mem:
     def __init__(
-        self, start_pc: int, input_file: str, mem_format: str
+        self,
+        start_pc: int,
+        input_file: str,
+        mem_format: str,
+        backend: str = "paged",
+        mmap_file: Optional[str] = None,
+        dump_at_exit: bool = True,
     ) -> None:
-        self.memory: dict[int, int] = {}
+        # page number -> (data, valid, offset of the page in both buffers)
+        self.pages: dict[int, tuple] = {}
+        self.backend = backend
+        if backend == "mmap":
+            # One sparse mapping over the whole address space; the OS only
+            # backs the pages that are actually touched.
+            self._mm_data = self._map(mmap_file)
+            self._mm_valid = self._map(None)
+        elif backend != "paged":
+            raise ValueError(f"Unknown memory backend {backend!r}")
         self.meminit_bases: set[int] = (
             set()
         )  # word-aligned addrs from init (include zeros on dump)
         self.endianness = "little"
+        # called as listener(addr, bytes) after every write (e.g. to drop
+        # stale predecoded instructions)
+        self.write_listeners: list[Callable[[int, int], None]] = []
         addr = start_pc
 
         p = Path(input_file)
@@ -61,50 +95,111 @@ class Mem:
                 self.meminit_bases.add(addr & ~0x3)
 
                 # Write to Memory (Endianness Handling)
-                if self.endianness == "little":
-                    b0 = (word >> 0) & 0xFF
-                    b1 = (word >> 8) & 0xFF
-                    b2 = (word >> 16) & 0xFF
-                    b3 = (word >> 24) & 0xFF
-                else:  # big-endian
-                    b3 = (word >> 0) & 0xFF
-                    b2 = (word >> 8) & 0xFF
-                    b1 = (word >> 16) & 0xFF
-                    b0 = (word >> 24) & 0xFF
-
-                self.memory[addr + 0] = b0
-                self.memory[addr + 1] = b1
-                self.memory[addr + 2] = b2
-                self.memory[addr + 3] = b3
+                self._store(addr, word.to_bytes(4, self.endianness))
 
                 # Auto-increment address for the next line (unless overridden
                 # by explicit addr)
                 addr += 4
 
-        atexit.register(self.dump_on_exit)
+        if dump_at_exit:
+            atexit.register(self.dump_on_exit)
+
+    @staticmethod
+    def _map(path: Optional[str]) -> mmap.mmap:
+        if path is None:
+            return mmap.mmap(-1, ADDR_SPACE)
+        with open(path, "a+b") as f:
+            f.truncate(ADDR_SPACE)
+            return mmap.mmap(f.fileno(), ADDR_SPACE)
+
+    def _page(self, addr: int) -> tuple:
+        num = addr >> PAGE_BITS
+        page = self.pages.get(num)
+        if page is None:
+            if self.backend == "mmap":
+                page = (self._mm_data, self._mm_valid, num << PAGE_BITS)
+            else:
+                page = (bytearray(PAGE_SIZE), bytearray(PAGE_SIZE), 0)
+            self.pages[num] = page
+        return page
+
+    def _store(self, addr: int, raw: bytes) -> None:
+        # Byte-wise store, used for init and accesses that cross a page
+        for i, b in enumerate(raw):
+            a = (addr + i) & 0xFFFFFFFF
+            data, valid, base = self._page(a)
+            o = base + (a & PAGE_MASK)
+            data[o] = b
+            valid[o] = 1
+
+    def _load(self, addr: int, bytes: int) -> int:
+        # Byte-wise little-endian load, for accesses that cross a page
+        val = 0
+        for i in range(bytes):  # reads LSB first
+            a = (addr + i) & 0xFFFFFFFF
+            page = self.pages.get(a >> PAGE_BITS)
+            o = a & PAGE_MASK
+            if page is None or not page[1][page[2] + o]:
+                raise KeyError(a)
+            val |= page[0][page[2] + o] << (8 * i)
+        return val
 
     def read(self, addr: int, bytes: int) -> Bits:
         addr = (
             addr & 0xFFFFFFFF
         )  # Normalize to 32-bit unsigned (handles sign-extension from .int)
-        val = 0
-
-        for i in range(bytes):  # reads LSB first
-            b = self.memory[addr + i] & 0xFF  # endianness
-            val |= b << (8 * i)
-
-        print(
-            f"* Read from address {addr:#010x} for {bytes} bytes: {val:#010x}"
-        )
+        off = addr & PAGE_MASK
+        page = self.pages.get(addr >> PAGE_BITS)
+        if page is not None and bytes in _ACCESS and off + bytes <= PAGE_SIZE:
+            data, valid, base = page
+            o = base + off
+            if valid.find(_INVALID, o, o + bytes) != -1:
+                raise KeyError(addr + valid.find(_INVALID, o, o + bytes) - o)
+            val = _ACCESS[bytes].unpack_from(data, o)[0]
+        else:
+            val = self._load(addr, bytes)
+
+        if tracer.mask & MEM_READ:
+            tracer.record(MEM_READ, addr, bytes, val)
         return Bits(uint=val, length=8 * bytes)
 
+    def fetch(self, pc: int) -> Bits:
+        # Instruction word at pc. The engines trace a fetch event instead,
+        # so this is not recorded as a mem_read of whichever thread the
+        # tracer last selected.
+        mask = tracer.mask
+        tracer.mask = 0
+        try:
+            return self.read(pc, 4)
+        finally:
+            tracer.mask = mask
+
     def write(self, addr: Bits, data: Bits, bytes_t: int) -> None:
         addr = addr & 0xFFFFFFFF  # Normalize to 32-bit unsigned
-        print(f"\tWrite to address {
-            addr:#010x} for {bytes_t} bytes: {
-            data.uint:#010x}")
-        for i in range(bytes_t):
-            self.memory[addr + i] = (data.uint >> (8 * i)) & 0xFF
+        val = data.uint & ((1 << (8 * bytes_t)) - 1)
+        if tracer.mask & MEM_WRITE:
+            tracer.record(MEM_WRITE, addr, bytes_t, val)
+        off = addr & PAGE_MASK
+        if bytes_t in _ACCESS and off + bytes_t <= PAGE_SIZE:
+            data_buf, valid, base = self._page(addr)
+            o = base + off
+            _ACCESS[bytes_t].pack_into(data_buf, o, val)
+            valid[o : o + bytes_t] = _VALID[bytes_t]
+        else:
+            self._store(addr, val.to_bytes(bytes_t, "little"))
+        for listener in self.write_listeners:
+            listener(addr, bytes_t)
+
+    def byte(self, addr: int) -> int:
+        return self._load(addr & 0xFFFFFFFF, 1)
+
+    def merge(self, writes: dict[int, int]) -> None:
+        # Apply a write set (byte addr -> value) recorded by another process
+        for addr, val in writes.items():
+            self._store(addr, bytes((val,)))
+        for listener in self.write_listeners:
+            for addr in writes:
+                listener(addr, 1)
 
     def dump_on_exit(self) -> None:
         try:
@@ -121,31 +216,20 @@ class Mem:
         Skips words that are entirely zero (uninitialized), except for addresses
         present in meminit, which are always included. Output is uppercase hex.
         """
-        # Include all word bases from memory; also include meminit bases (even
-        # if zero)
-        word_bases = {
-            addr & ~0x3 for addr in self.memory.keys()
-        } | self.meminit_bases
+        # Words are read in the memory's endianness
+        word_fmt = "<I" if self.endianness == "little" else ">I"
 
         with open(path, "w", encoding="utf-8") as f:
-            for base in sorted(word_bases):
-                # collect 4 bytes for this word
-                b0 = self.memory.get(base + 0, 0) & 0xFF
-                b1 = self.memory.get(base + 1, 0) & 0xFF
-                b2 = self.memory.get(base + 2, 0) & 0xFF
-                b3 = self.memory.get(base + 3, 0) & 0xFF
-                if (b0 | b1 | b2 | b3) == 0 and base not in self.meminit_bases:
-                    # skip all-zero words (unless address was in meminit)
-                    continue
-
-                if self.endianness == "little":
-                    # Little Endian: Addr+0 is LSB
-                    word = b0 | (b1 << 8) | (b2 << 16) | (b3 << 24)
-                else:
-                    # Big Endian: Addr+0 is MSB
-                    word = (b0 << 24) | (b1 << 16) | (b2 << 8) | b3
-
-                f.write(f"{base:#010x} {word:#010x}\n")
-
-    # dump into memsim.hex
-    # copy meminit.hex into memsim
+            for num in sorted(self.pages):
+                data, valid, base = self.pages[num]
+                page_addr = num << PAGE_BITS
+                words = struct.iter_unpack(
+                    word_fmt, data[base : base + PAGE_SIZE]
+                )
+                for i, (word,) in enumerate(words):
+                    addr = page_addr + 4 * i
+                    if word == 0 and addr not in self.meminit_bases:
+                        # skip all-zero words (unless address was in meminit)
+                        continue
+
+                    f.write(f"{addr:#010x} {word:#010x}\n")
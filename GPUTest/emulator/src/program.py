@@ -0,0 +1,63 @@
+# Predecoded program image: decode every instruction word once, share the
+# resulting Instr objects between all threads that fetch from that PC.
+
+from bitstring import Bits
+from mem import Mem
+from instr import Instr
+
+# Instruction region from MMIO.md (MMIO registers are included so kernels
+# linked at address 0 are also covered)
+CODE_START = 0x0000_0000
+CODE_END = 0x0010_0000
+
+
+class ProgramImage:
+    def __init__(
+        self,
+        memory: Mem,
+        code_start: int = CODE_START,
+        code_end: int = CODE_END,
+    ) -> None:
+        self.memory = memory
+        self.code_start = code_start
+        self.code_end = code_end
+        self.table: dict[int, Instr] = {}
+
+        memory.write_listeners.append(self.invalidate)
+        self.predecode()
+
+    def predecode(self) -> None:
+        """
+        Decode all initialized words in the code region up front. Words that
+        do not decode (data, padding) are left out of the table and raise at
+        fetch time like before, if they are ever executed.
+        """
+        for pc in sorted(self.memory.meminit_bases):
+            if not self.code_start <= pc < self.code_end:
+                continue
+            try:
+                self.table[pc] = self._decode(pc)
+            except (KeyError, ValueError, NotImplementedError):
+                pass
+
+    def fetch(self, pc: int) -> Instr:
+        instr = self.table.get(pc)
+        if instr is None:
+            instr = self._decode(pc)
+            if self.code_start <= pc < self.code_end:
+                self.table[pc] = instr
+        return instr
+
+    def invalidate(self, addr: int, bytes_t: int) -> None:
+        # An instruction at pc covers [pc, pc + 4), so any pc in
+        # (addr - 4, addr + bytes_t) overlaps the written range.
+        if addr + bytes_t <= self.code_start - 3 or addr >= self.code_end:
+            return
+        for pc in range(addr - 3, addr + bytes_t):
+            self.table.pop(pc, None)
+
+    def _decode(self, pc: int) -> Instr:
+        instr_bits = self.memory.fetch(pc)
+        return Instr.decode(
+            instruction=instr_bits, pc=Bits(uint=pc, length=32)
+        )
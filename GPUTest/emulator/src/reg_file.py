@@ -1,5 +1,11 @@
 from bitstring import Bits
 from functools import singledispatchmethod
+from tracer import tracer, REG_WRITE, PRED_WRITE
+
+try:
+    import numpy as np
+except ImportError:  # Only needed for the vectorized warp backend
+    np = None
 
 # TODO: Implement fixed zero register behavior
 
@@ -26,11 +32,64 @@ class RegFile:
         if rd.int == 0:
             return
 
-        # Print write as hex
-        print(f"\tr{rd.uint} <- 0x{val.uint:x}")
+        if tracer.mask & REG_WRITE:
+            tracer.record(REG_WRITE, rd.uint, val.uint)
         self.arr[rd.uint] = val
 
 
+class WarpRegFile:
+    """
+    Registers of a whole warp in one (num_regs x lanes) uint32 array, so ALU
+    ops can run across lanes at once. Float ops use a float32 view of the
+    same memory. Per-thread code reaches a lane through LaneRegFile.
+    """
+
+    def __init__(self, num_regs: int = 64, lanes: int = 32) -> None:
+        if np is None:
+            raise RuntimeError("The numpy backend requires numpy")
+        self.arr = np.zeros((num_regs, lanes), dtype=np.uint32)
+        self.num_regs = num_regs
+        self.lanes = lanes
+
+    def lane(self, lane: int) -> "LaneRegFile":
+        return LaneRegFile(self, lane)
+
+    def uints(self, r: int):
+        return self.arr[r].astype(np.int64)
+
+    def ints(self, r: int):
+        return self.arr[r].view(np.int32).astype(np.int64)
+
+    def floats(self, r: int):
+        return self.arr[r].view(np.float32).astype(np.float64)
+
+    def write(self, rd: int, vals, active) -> None:
+        # vals: uint32 per lane, only lanes set in active are written
+        if rd == 0:
+            return
+        np.copyto(self.arr[rd], vals, where=active)
+
+
+class LaneRegFile:
+    # RegFile interface onto one lane of a WarpRegFile
+    def __init__(self, regs: WarpRegFile, lane: int) -> None:
+        self.regs = regs
+        self.lane_id = lane
+        self.num_regs = regs.num_regs
+        self.num_bits_per_reg = 32
+
+    def read(self, rd: Bits) -> Bits:
+        return Bits(uint=int(self.regs.arr[rd.uint, self.lane_id]), length=32)
+
+    def write(self, rd: Bits, val: Bits) -> None:
+        if rd.int == 0:
+            return
+
+        if tracer.mask & REG_WRITE:
+            tracer.record(REG_WRITE, rd.uint, val.uint)
+        self.regs.arr[rd.uint, self.lane_id] = val.uint
+
+
 class PredicateRegFile(RegFile):
     def __init__(self, size: int = 32, threads_per_warp: int = 32) -> None:
         self.threads_per_warp = threads_per_warp
@@ -71,8 +130,12 @@ class PredicateRegFile(RegFile):
                 uint=(reg_val.uint & ~(1 << thread_id)),
                 length=self.threads_per_warp,
             )
+        if tracer.mask & PRED_WRITE:
+            tracer.record(PRED_WRITE, rd.uint, self.arr[rd.uint].uint)
 
     def write(self, rd: Bits, val: Bits) -> None:
+        if tracer.mask & PRED_WRITE:
+            tracer.record(PRED_WRITE, rd.uint, val.uint)
         self.arr[rd.uint] = val
 
 
@@ -90,16 +153,10 @@ class CsrRegFile(RegFile):
     ) -> None:
         super().__init__(num_regs=64, num_bits_per_reg=32, init_value=0)
 
-        print("* Setting thread ID as " + str(thread_id))
-        print(
-            "* Writing to CSR reg "
-            + str(Bits(uint=self.csr_map["thread_id"], length=6))
-        )
         self.write(
             Bits(uint=self.csr_map["thread_id"], length=6),
             Bits(uint=thread_id, length=32),
         )
-        print("* Thread ID set to " + str(self.get_thread_id()))
         self.write(
             Bits(uint=self.csr_map["block_id"], length=6),
             Bits(uint=block_id, length=32),
@@ -1,12 +1,17 @@
 # A simple wrapper on all the shared state within the gpu
 
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
 from reg_file import RegFile, PredicateRegFile
 from mem import Mem
 
+if TYPE_CHECKING:
+    from program import ProgramImage
+
 
 @dataclass
 class State:
     memory: Mem
     rfile: RegFile
     pfile: PredicateRegFile
+    program: Optional["ProgramImage"] = None  # shared predecoded code
@@ -2,6 +2,7 @@ from bitstring import Bits
 from state import State
 from reg_file import *
 from instr import *
+from tracer import tracer, FETCH
 
 
 class Thread:
@@ -12,13 +13,19 @@ class Thread:
         self.cfile = csr_file
 
     def step_instruction(self) -> bool:
-        # Get instruction
-        instr_bits = self.state.memory.read(self.pc, 4)
-        instr = Instr.decode(
-            instruction=instr_bits, pc=Bits(uint=self.pc, length=32)
-        )
-        print(f"\tPC: {self.pc}")
+        if tracer.enabled:
+            tracer.select(self.cfile.get_thread_id(), self.pc)
+            if tracer.mask & FETCH:
+                tracer.record(FETCH)
 
+        # Get instruction
+        if self.state.program is not None:
+            instr = self.state.program.fetch(self.pc)
+        else:
+            instr_bits = self.state.memory.fetch(self.pc)
+            instr = Instr.decode(
+                instruction=instr_bits, pc=Bits(uint=self.pc, length=32)
+            )
         if instr.op == H_Op.HALT:
             return True  # Thread has halted
 
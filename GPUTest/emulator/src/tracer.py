@@ -0,0 +1,139 @@
+# Structured execution trace. Off by default; when enabled, records are
+# written as JSON lines or fixed-size binary records to a file, filtered by
+# event kind, thread ID and PC range.
+#
+# Hot paths only test an int mask, so a disabled trace costs one attribute
+# lookup and no string formatting:
+#
+#     if tracer.mask & MEM_WRITE:
+#         tracer.record(MEM_WRITE, addr, size, value)
+
+import json
+import struct
+import sys
+from typing import BinaryIO, Optional
+
+# Event kinds (bit flags)
+FETCH = 0x01
+REG_WRITE = 0x02
+MEM_READ = 0x04
+MEM_WRITE = 0x08
+PRED_WRITE = 0x10
+ALL_EVENTS = FETCH | REG_WRITE | MEM_READ | MEM_WRITE | PRED_WRITE
+
+EVENT_NAMES = {
+    "fetch": FETCH,
+    "reg": REG_WRITE,
+    "mem_read": MEM_READ,
+    "mem_write": MEM_WRITE,
+    "pred": PRED_WRITE,
+}
+
+# Payload field names per event kind, after the common kind/tid/pc
+EVENT_FIELDS = {
+    FETCH: (),
+    REG_WRITE: ("reg", "value"),
+    MEM_READ: ("addr", "size", "value"),
+    MEM_WRITE: ("addr", "size", "value"),
+    PRED_WRITE: ("reg", "value"),
+}
+
+# Binary record: kind, tid, pc and three payload words (unused ones are 0)
+RECORD = struct.Struct("<BIIIII")
+
+_KIND_NAMES = {kind: name for name, kind in EVENT_NAMES.items()}
+
+
+def parse_events(spec: str) -> int:
+    # "all" or a comma separated list of EVENT_NAMES keys
+    if spec == "all":
+        return ALL_EVENTS
+    mask = 0
+    for name in spec.split(","):
+        if name not in EVENT_NAMES:
+            raise ValueError(
+                f"Unknown trace event {name!r}, expected one of "
+                f"{', '.join(EVENT_NAMES)}"
+            )
+        mask |= EVENT_NAMES[name]
+    return mask
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.events = 0
+        self.threads: Optional[set[int]] = None
+        self.pc_range: Optional[tuple[int, int]] = None
+        self.binary = False
+        self.out = None
+
+        # Kinds to record for the currently selected thread and PC
+        self.mask = 0
+        self.tid = 0
+        self.pc = 0
+
+    def configure(
+        self,
+        path: str,
+        fmt: str = "jsonl",
+        events: int = ALL_EVENTS,
+        threads: Optional[set[int]] = None,
+        pc_range: Optional[tuple[int, int]] = None,
+    ) -> None:
+        """
+        Start recording to path ("-" for stdout). threads limits tracing to
+        those thread IDs and pc_range to PCs in [start, end).
+        """
+        self.binary = fmt == "bin"
+        if path == "-":
+            self.out = sys.stdout.buffer if self.binary else sys.stdout
+        else:
+            self.out = open(path, "wb" if self.binary else "w")
+        self.events = events
+        self.threads = threads
+        self.pc_range = pc_range
+        self.enabled = events != 0
+
+    def select(self, tid: int, pc: int) -> None:
+        # Called by the execution engine before a thread executes at pc
+        self.tid = tid
+        self.pc = pc
+        if self.threads is not None and tid not in self.threads:
+            self.mask = 0
+        elif self.pc_range is not None and not (
+            self.pc_range[0] <= pc < self.pc_range[1]
+        ):
+            self.mask = 0
+        else:
+            self.mask = self.events
+
+    def record(self, kind: int, *fields: int) -> None:
+        if self.binary:
+            payload = fields + (0,) * (3 - len(fields))
+            self.out.write(RECORD.pack(kind, self.tid, self.pc, *payload))
+        else:
+            rec = {"event": _KIND_NAMES[kind], "tid": self.tid, "pc": self.pc}
+            rec.update(zip(EVENT_FIELDS[kind], fields))
+            self.out.write(json.dumps(rec) + "\n")
+
+    def close(self) -> None:
+        self.mask = 0
+        self.enabled = False
+        if self.out is not None:
+            self.out.flush()
+            if self.out not in (sys.stdout, sys.stdout.buffer):
+                self.out.close()
+            self.out = None
+
+
+def read_records(f: BinaryIO):
+    # Decode a binary trace back into (kind name, tid, pc, fields dict)
+    while chunk := f.read(RECORD.size):
+        kind, tid, pc, *payload = RECORD.unpack(chunk)
+        fields = dict(zip(EVENT_FIELDS[kind], payload))
+        yield _KIND_NAMES[kind], tid, pc, fields
+
+
+# Process wide tracer, configured once by emulator.py
+tracer = Tracer()
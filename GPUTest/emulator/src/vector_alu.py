@@ -0,0 +1,239 @@
+# Lane-parallel ALU for the numpy warp backend. R-, I- and F-type
+# instructions are evaluated for all active lanes of a warp at once on a
+# WarpRegFile; everything else (memory, branches, CSRs, control flow) is
+# left to the per-lane Instr.execute path.
+#
+# Results match the scalar instructions in instr.py, except that integer
+# results which do not fit in 32 bits wrap instead of raising.
+
+import logging
+from reg_file import WarpRegFile, np
+from instr import *
+
+logger = logging.getLogger(__name__)
+
+MASK32 = 0xFFFFFFFF
+
+
+def _u32(vals):
+    return (vals & MASK32).astype(np.uint32)
+
+
+def _f32(vals):
+    return vals.astype(np.float32).view(np.uint32)
+
+
+def _lanes(active) -> list[int]:
+    return np.flatnonzero(active).tolist()
+
+
+def lane_select(mask: int, lanes: int):
+    # Predicate-style lane bitmask -> boolean array indexed by lane
+    return ((mask >> np.arange(lanes)) & 1).astype(bool)
+
+
+def execute_vector(instr: Instr, regs: WarpRegFile, active) -> bool:
+    """
+    Run instr on every lane set in the boolean array active. Returns False,
+    without touching any state, if the instruction has no vector form.
+    """
+    with np.errstate(all="ignore"):
+        match instr:
+            case R_Instr_0():
+                _r_type_0(instr, regs, active)
+            case R_Instr_1():
+                _r_type_1(instr, regs, active)
+            case R_Instr_2():
+                _r_type_2(instr, regs, active)
+            case I_Instr_0():
+                _i_type_0(instr, regs, active)
+            case I_Instr_1():
+                _i_type_1(instr, regs, active)
+            case F_Instr():
+                _f_type(instr, regs, active)
+            case _:
+                return False
+    return True
+
+
+def _r_type_0(instr: R_Instr_0, regs: WarpRegFile, active) -> None:
+    a = regs.ints(instr.rs1.uint)
+    b = regs.ints(instr.rs2.uint)
+    match instr.op:
+        case R_Op_0.ADD:
+            result = a + b
+        case R_Op_0.SUB:
+            result = a - b
+        case R_Op_0.MUL:
+            result = a * b
+        case R_Op_0.DIV:
+            zero = b == 0
+            if (zero & active).any():
+                logger.warning(
+                    f"Division by zero in DIV on lanes {_lanes(zero & active)}"
+                    f": R{instr.rd.uint} = R{instr.rs1.uint} / "
+                    f"R{instr.rs2.uint}"
+                )
+            quot = np.trunc(a / np.where(zero, 1, b)).astype(np.int64)
+            result = np.where(zero, 0, quot)
+        case R_Op_0.AND:
+            result = a & b
+        case R_Op_0.OR:
+            result = a | b
+        case R_Op_0.XOR:
+            result = a ^ b
+        case R_Op_0.SLT:
+            result = (a < b).astype(np.int64)
+        case _:
+            raise NotImplementedError(
+                f"R-Type operation {instr.op} not implemented yet or "
+                "doesn't exist."
+            )
+
+    if instr.op in {R_Op_0.ADD, R_Op_0.SUB, R_Op_0.MUL}:
+        overflow = active & ((result > 2147483647) | (result < -2147483648))
+        if overflow.any():
+            logger.warning(
+                f"Arithmetic overflow in {instr.op.name} on lanes "
+                f"{_lanes(overflow)}: R{instr.rd.uint} = R{instr.rs1.uint}, "
+                f"R{instr.rs2.uint}"
+            )
+    regs.write(instr.rd.uint, _u32(result), active)
+
+
+def _r_type_1(instr: R_Instr_1, regs: WarpRegFile, active) -> None:
+    rs1 = instr.rs1.uint
+    rs2 = instr.rs2.uint
+    match instr.op:
+        case R_Op_1.SLTU:
+            result = _u32(regs.uints(rs1) < regs.uints(rs2))
+        case R_Op_1.ADDF:
+            result = _f32(regs.floats(rs1) + regs.floats(rs2))
+        case R_Op_1.SUBF:
+            result = _f32(regs.floats(rs1) - regs.floats(rs2))
+        case R_Op_1.MULF:
+            result = _f32(regs.floats(rs1) * regs.floats(rs2))
+        case R_Op_1.DIVF:
+            a = regs.floats(rs1)
+            b = regs.floats(rs2)
+            zero = b == 0.0
+            if (zero & active).any():
+                logger.warning(
+                    f"Division by zero in DIVF on lanes "
+                    f"{_lanes(zero & active)}: R{instr.rd.uint} = "
+                    f"R{rs1} / R{rs2}"
+                )
+            result = _f32(np.where(zero, 0.0, a / np.where(zero, 1.0, b)))
+        case R_Op_1.SLL:
+            shift = regs.uints(rs2) & 0x1F
+            result = _u32(regs.uints(rs1) << shift)
+        case R_Op_1.SRL:
+            shift = regs.uints(rs2) & 0x1F
+            result = _u32(regs.uints(rs1) >> shift)
+        case R_Op_1.SRA:
+            shift = regs.uints(rs2) & 0x1F
+            result = _u32(regs.ints(rs1) >> shift)
+        case _:
+            raise NotImplementedError(
+                f"R-Type 1 operation {instr.op} not implemented yet or "
+                "doesn't exist."
+            )
+    regs.write(instr.rd.uint, result, active)
+
+
+def _r_type_2(instr: R_Instr_2, regs: WarpRegFile, active) -> None:
+    rs1 = instr.rs1.uint
+    rs2 = instr.rs2.uint
+    match instr.op:
+        case R_Op_2.SLTF:
+            result = regs.floats(rs1) < regs.floats(rs2)
+        case R_Op_2.SGE:
+            result = regs.ints(rs1) >= regs.ints(rs2)
+        case R_Op_2.SGEU:
+            result = regs.uints(rs1) >= regs.uints(rs2)
+        case R_Op_2.SGEF:
+            result = regs.floats(rs1) >= regs.floats(rs2)
+        case _:
+            raise NotImplementedError(
+                f"R-Type 2 operation {instr.op} not implemented yet or "
+                "doesn't exist."
+            )
+    regs.write(instr.rd.uint, _u32(result), active)
+
+
+def _i_type_0(instr: I_Instr_0, regs: WarpRegFile, active) -> None:
+    a = regs.ints(instr.rs1.uint)
+    imm_val = instr.imm.int  # Sign-extended immediate
+    match instr.op:
+        case I_Op_0.ADDI:
+            result = a + imm_val
+        case I_Op_0.ORI:
+            result = a | imm_val
+        case I_Op_0.XORI:
+            result = a ^ imm_val
+        case I_Op_0.SLTI:
+            result = (a < imm_val).astype(np.int64)
+        case _:
+            raise NotImplementedError(
+                f"I-Type 0 operation {instr.op} not implemented yet or "
+                "doesn't exist."
+            )
+    regs.write(instr.rd.uint, _u32(result), active)
+
+
+def _i_type_1(instr: I_Instr_1, regs: WarpRegFile, active) -> None:
+    rs1 = instr.rs1.uint
+    imm_val = instr.imm.int
+    shift = imm_val & 0x1F  # Mask to 5 bits
+    match instr.op:
+        case I_Op_1.SLTIU:
+            result = regs.uints(rs1) < (imm_val & MASK32)
+        case I_Op_1.SRLI:
+            result = regs.uints(rs1) >> shift
+        case I_Op_1.SRAI:
+            result = regs.ints(rs1) >> shift
+        case I_Op_1.SLLI:
+            result = regs.uints(rs1) << shift
+        case _:
+            raise NotImplementedError(
+                f"I-Type 1 operation {instr.op} not implemented yet or "
+                "doesn't exist."
+            )
+    regs.write(instr.rd.uint, _u32(result), active)
+
+
+def _f_type(instr: F_Instr, regs: WarpRegFile, active) -> None:
+    rs1 = instr.rs1.uint
+    match instr.op:
+        case F_Op.ISQRT:
+            val = regs.floats(rs1)
+            invalid = val <= 0
+            if (invalid & active).any():
+                logger.warning(
+                    f"Invalid value for ISQRT on lanes "
+                    f"{_lanes(invalid & active)}: R{rs1}"
+                )
+            safe = np.where(invalid, 1.0, val)
+            result = _f32(np.where(invalid, 0.0, 1.0 / np.sqrt(safe)))
+        case F_Op.SIN:
+            result = _f32(np.sin(regs.floats(rs1)))
+        case F_Op.COS:
+            result = _f32(np.cos(regs.floats(rs1)))
+        case F_Op.ITOF:
+            result = _f32(regs.ints(rs1).astype(np.float64))
+        case F_Op.FTOI:
+            val = regs.floats(rs1)
+            finite = np.isfinite(val)
+            if (~finite & active).any():
+                logger.warning(
+                    f"Non-finite value for FTOI on lanes "
+                    f"{_lanes(~finite & active)}: R{rs1}"
+                )
+            val = np.where(finite, np.trunc(val), 0.0)
+            result = _u32(val.astype(np.int64))
+        case _:
+            raise NotImplementedError(
+                f"F-Type operation {instr.op} not implemented yet or "
+                "doesn't exist."
+            )
+    regs.write(instr.rd.uint, result, active)
@@ -0,0 +1,143 @@
+# Warp-lockstep SIMT engine: one fetch/decode per warp PC, executed across
+# every lane that sits at that PC under the instruction's predicate mask.
+
+from typing import Optional
+from bitstring import Bits
+from reg_file import PredicateRegFile, WarpRegFile
+from thread import Thread
+from program import ProgramImage
+from instr import *
+from vector_alu import execute_vector, lane_select
+from tracer import tracer, FETCH, REG_WRITE
+
+
+class Warp:
+    def __init__(
+        self,
+        threads: list[Thread],
+        pfile: PredicateRegFile,
+        program: Optional[ProgramImage] = None,
+        regs: Optional[WarpRegFile] = None,
+    ) -> None:
+        self.threads = threads
+        self.pfile = pfile
+        self.program = program
+        # Shared register array of the numpy backend; ALU ops then run on
+        # all lanes at once instead of lane by lane
+        self.regs = regs
+        self.tids = [thread.cfile.get_thread_id() for thread in threads]
+        self.lanes = [tid % pfile.threads_per_warp for tid in self.tids]
+        self.halted = [False] * len(threads)
+
+        # SIMT cost model counters
+        self.issued = 0  # warp instructions issued
+        self.divergent_issues = 0  # issues with lanes parked at another PC
+        self.lane_ops = 0  # lanes that actually executed an issue
+
+        # Lane being executed, for error reporting
+        self.pc = threads[0].pc if threads else 0
+        self.lane = 0
+
+    def done(self) -> bool:
+        return all(self.halted)
+
+    def step(self) -> bool:
+        """
+        Issue once for the live lanes at the lowest PC, while lanes at
+        higher PCs stay parked. Lanes that skipped ahead wait at the
+        reconvergence point until the others catch up, so diverged groups
+        merge again. Convergent warps form a single group, so this is one
+        fetch and one issue per step. Returns True once every lane has
+        halted.
+        """
+        groups: dict[int, list[int]] = {}
+        for idx, thread in enumerate(self.threads):
+            if not self.halted[idx]:
+                groups.setdefault(thread.pc, []).append(idx)
+        if not groups:
+            return True
+
+        pc = min(groups)
+        self.issue(pc, groups[pc])
+        if len(groups) > 1:
+            self.divergent_issues += 1
+
+        return self.done()
+
+    def issue(self, pc: int, group: list[int]) -> None:
+        self.pc = pc
+        self.issued += 1
+        instr = self.fetch(pc)
+
+        if instr.op == H_Op.HALT:
+            for idx in group:
+                if tracer.enabled:
+                    self.trace_fetch(idx, pc)
+                self.halted[idx] = True
+            return
+
+        mask = instr.lane_mask(self.pfile)
+        next_pc = pc + 4
+        if self.regs is not None and self.issue_vector(instr, mask, group):
+            for idx in group:
+                self.threads[idx].pc = next_pc
+            return
+
+        for idx in group:
+            thread = self.threads[idx]
+            lane = self.lanes[idx]
+            self.lane = lane
+            if tracer.enabled:
+                self.trace_fetch(idx, pc)
+            if (mask >> lane) & 1:
+                self.lane_ops += 1
+                ret = instr.execute(thread.cfile, thread.state)
+                thread.pc = next_pc if ret is None else ret
+            else:
+                thread.pc = next_pc
+
+    def issue_vector(self, instr: Instr, mask: int, group: list[int]) -> bool:
+        if len(group) == len(self.threads):
+            active = mask
+        else:
+            active = 0
+            for idx in group:
+                active |= 1 << self.lanes[idx]
+            active &= mask
+
+        if not execute_vector(
+            instr, self.regs, lane_select(active, self.regs.lanes)
+        ):
+            return False
+        self.lane_ops += active.bit_count()
+
+        if tracer.enabled:
+            # The vector ALU bypasses LaneRegFile, so record its writes here
+            rd = instr.rd.uint
+            for idx in group:
+                self.trace_fetch(idx, self.pc)
+                lane = self.lanes[idx]
+                if (
+                    tracer.mask & REG_WRITE
+                    and rd != 0
+                    and (active >> lane) & 1
+                ):
+                    tracer.record(REG_WRITE, rd, int(self.regs.arr[rd, lane]))
+        return True
+
+    def trace_fetch(self, idx: int, pc: int) -> None:
+        tracer.select(self.tids[idx], pc)
+        if tracer.mask & FETCH:
+            tracer.record(FETCH)
+
+    def fetch(self, pc: int) -> Instr:
+        if self.program is not None:
+            return self.program.fetch(pc)
+        instr_bits = self.threads[0].state.memory.fetch(pc)
+        return Instr.decode(
+            instruction=instr_bits, pc=Bits(uint=pc, length=32)
+        )
+
+    def run_until_halt(self) -> None:
+        while not self.step():
+            pass
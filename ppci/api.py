@@ -39,16 +39,7 @@ from .lang.llvmir import llvm_to_ir
 from .lang.pascal import pascal_to_ir
 from .lang.python import ir_to_python, python_to_ir
 from .lang.ws import ws_to_ir
-from .opt import (
-    CleanPass,
-    CommonSubexpressionEliminationPass,
-    ConstantFolder,
-    LoadAfterStorePass,
-)
-from .opt.cjmp import CJumpPass
-from .opt.mem2reg import Mem2RegPromotor
-from .opt.tailcall import TailCallOptimization
-from .opt.transform import DeleteUnusedInstructionsPass, RemoveAddZeroPass
+from .opt import InlinePass, PassManager, create_pipeline
 from .utils.reporting import DummyReportGenerator, HtmlReportGenerator
 from .wasm import read_wasm, wasm_to_ir
 
@@ -187,7 +178,7 @@ def disasm(data, march):
 OPT_LEVELS = ("0", "1", "2", "s")
 
 
-def optimize(ir_module, level=0, reporter=None):
+def optimize(ir_module, level=0, reporter=None, unroll_factor=None):
     """Run a bag of tricks against the :doc:`ir-code<ir/index>`.
 
     This is an in-place operation!
@@ -197,9 +188,12 @@ def optimize(ir_module, level=0, reporter=None):
         level: The optimization level, 0 is default. Can be 0,1,2 or s
             0: No optimization
             1: some optimization
-            2: more optimization
+            2: more optimization, inlining of small functions and loop
+               optimizations
             s: optimize for size
         reporter: Report detailed log to this reporter
+        unroll_factor: Unroll loops this many times at level 2, or by
+            the default factor when None.
     """
     logger = logging.getLogger("optimize")
     level = str(level)
@@ -215,29 +209,15 @@ def optimize(ir_module, level=0, reporter=None):
     if level == "0":
         return
 
-    # TODO: differentiate between optimization levels!
-
-    # Optimization passes (bag of tricks) run them three times:
-    opt_passes = [
-        Mem2RegPromotor(),
-        RemoveAddZeroPass(),
-        ConstantFolder(),
-        CommonSubexpressionEliminationPass(),
-        TailCallOptimization(),
-        LoadAfterStorePass(),
-        DeleteUnusedInstructionsPass(),
-        CleanPass(),
-    ] * 3
-
-    if level == "3":
-        opt_passes.append(CJumpPass())
-
-    # Run the passes over the module:
+    # Run the passes of this level over the module until nothing changes:
     verify_module(ir_module)
-    for opt_pass in opt_passes:
-        opt_pass.run(ir_module)
-        # reporter.message('{} after {}:'.format(ir_module, opt_pass))
-        # reporter.dump_ir(ir_module)
+    pass_manager = PassManager(create_pipeline(level, unroll_factor))
+    pass_manager.run(ir_module)
+
+    # Inline the optimized callees, and clean up the callers:
+    if level == "2" and InlinePass().run(ir_module):
+        pass_manager.run(ir_module)
+    logger.debug("Ran %s function passes", pass_manager.invocations)
 
     if reporter:
         # Dump report:
@@ -249,7 +229,13 @@ def optimize(ir_module, level=0, reporter=None):
 
 
 def ir_to_stream(
-    ir_module, march, output_stream, reporter=None, debug=False, opt="speed"
+    ir_module,
+    march,
+    output_stream,
+    reporter=None,
+    debug=False,
+    opt="speed",
+    regalloc="graph",
 ):
     """Translate IR module to output stream."""
     march = get_arch(march)
@@ -257,7 +243,9 @@ def ir_to_stream(
     if not reporter:  # pragma: no cover
         reporter = DummyReportGenerator()
 
-    code_generator = CodeGenerator(march, reporter, optimize_for=opt)
+    code_generator = CodeGenerator(
+        march, reporter, optimize_for=opt, regalloc=regalloc
+    )
     verify_module(ir_module)
 
     # Code generation:
@@ -275,7 +263,13 @@ def ir_to_assembly(ir_modules, march, add_binary=False):
 
 
 def ir_to_object(
-    ir_modules, march, reporter=None, debug=False, opt="speed", outstream=None
+    ir_modules,
+    march,
+    reporter=None,
+    debug=False,
+    opt="speed",
+    outstream=None,
+    regalloc="graph",
 ):
     """Translate IR-modules into code for the given architecture.
 
@@ -287,6 +281,8 @@ def ir_to_object(
         debug (bool): include debugging information
         opt (str): optimization goal. Can be 'speed', 'size' or 'co2'.
         outstream: instruction stream to write instructions to
+        regalloc (str): register allocator. Can be 'graph' for graph
+            coloring, or 'linear' for the faster linear scan.
 
     Returns:
         ObjectFile: An object file
@@ -321,6 +317,7 @@ def ir_to_object(
             reporter=reporter,
             debug=debug,
             opt=opt,
+            regalloc=regalloc,
         )
 
     reporter.message("All modules generated!")
@@ -47,6 +47,9 @@ def get_arch(arch):
     Args:
         arch: can be a string in the form of arch:option1:option2
 
+    Instances are shared: asking twice for the same architecture and
+    options returns the same instance.
+
     .. doctest::
 
         >>> from ppci.api import get_arch
@@ -124,6 +124,38 @@ class Architecture(MachineArchitecture):
     def gen_function_exit(self, rv):  # pragma: no cover
         raise NotImplementedError("Implement me!")
 
+    def spill_cost(self, frame, size):
+        """Estimate the cost of a load or a store of a new spill slot.
+
+        The register allocators multiply the uses of a register by this
+        cost when choosing which register to spill. The default is a
+        single instruction.
+
+        Arguments:
+            frame: the frame in which the slot will be allocated
+            size: the size of the slot in bytes
+        """
+        return 1
+
+    def rematerialize(self, definitions, vreg):
+        """Compute the value of a register again, instead of spilling it.
+
+        The register allocators place the instructions before each use of
+        a spilled register, and remove its definitions. For values that
+        are the same everywhere in the function, such as constants, this
+        is cheaper than a store and a load. By default nothing can be
+        computed again.
+
+        Arguments:
+            definitions: the instructions defining the register, in order
+            vreg: the register to compute the value into
+
+        Returns:
+            The instructions computing the value into vreg, or None when
+            the value cannot be computed again.
+        """
+        return None
+
     def between_blocks(self, frame):
         """Generate any instructions here if needed between two blocks"""
         return []
@@ -30,6 +30,7 @@ class Operand(property):
         self._cls = cls
         self._read = read
         self._write = write
+        self._register_map = None
 
         # if isinstance(cls, type) or isinstance(cls, tuple)
 
@@ -81,9 +82,10 @@ class Operand(property):
     def from_value(self, value):
         """Create the an object of the right type from the given value"""
         if issubclass(self._cls, Register):
-            regs = self._cls.all_registers()
-            reg_map = {r.num: r for r in regs}
-            return reg_map[value]
+            if self._register_map is None:
+                regs = self._cls.all_registers()
+                self._register_map = {r.num: r for r in regs}
+            return self._register_map[value]
         else:
             # assume int here!
             return value
@@ -436,7 +438,7 @@ class Instruction(Constructor, metaclass=InsMeta):
     def sizes(cls):
         """Get possible encoding sizes in bytes"""
         if hasattr(cls, "tokens"):
-            return [sum(t.size for t in cls.tokens) // 8]
+            return [sum(t.Info.size for t in cls.tokens) // 8]
         else:
             return []
 
@@ -6,7 +6,7 @@ These can be used to define an instruction set.
 from collections import namedtuple
 
 from ..utils.tree import Tree, from_string
-from .encoding import Relocation
+from .encoding import FixedPattern, Relocation
 
 Pattern = namedtuple(
     "Pattern",
@@ -23,17 +23,22 @@ class Isa:
     Isa's can be merged into new isa's which can be used to define target.
     For example the arm without FPU can be combined with the FPU isa
     to expand the supported functions.
+
+    When a decode_field is given, instructions can be decoded by looking
+    them up on the value of this field, see :class:`DecodeTable`.
     """
 
-    def __init__(self):
+    def __init__(self, decode_field=None):
         self.instructions = []
         self.relocation_map = {}
         self.patterns = []
         self.peepholes = []
+        self.decode_field = decode_field
+        self._decode_table = None
 
     def __add__(self, other):
         assert isinstance(other, Isa)
-        isa3 = Isa()
+        isa3 = Isa(decode_field=self.decode_field or other.decode_field)
         isa3.instructions = self.instructions + other.instructions
         isa3.patterns = self.patterns + other.patterns
         isa3.relocation_map = self.relocation_map.copy()
@@ -43,8 +48,20 @@ class Isa:
     def add_instruction(self, instruction):
         """Register an instruction into this ISA"""
         self.instructions.append(instruction)
+        self._decode_table = None
         return instruction
 
+    @property
+    def decode_table(self):
+        """The decode table of this isa, or None without a decode_field"""
+        if self.decode_field is None:
+            return None
+        if self._decode_table is None:
+            self._decode_table = DecodeTable(
+                self.instructions, self.decode_field
+            )
+        return self._decode_table
+
     def register_relocation(self, relocation):
         """Register a relocation into this isa"""
         assert issubclass(relocation, Relocation)
@@ -82,3 +99,81 @@ class Isa:
             return function
 
         return wrapper
+
+
+class DecodeTable:
+    """Find the instruction that encodes some data with a single lookup.
+
+    Instructions are indexed on the fixed value that they give to the
+    decode field (for example the opcode) in their first token. Decoding
+    then only tries the instructions that share the opcode of the data,
+    in the order in which they were added to the isa.
+
+    Instructions that do not fix the decode field, such as data
+    directives, are never the result of decoding.
+    """
+
+    def __init__(self, instructions, field):
+        self.field = field
+        # Tokens with the field at the same bits share a lookup table:
+        # (size, endianness, field mask) -> (token class, table), where the
+        # table maps the masked token value to a list of instructions.
+        self.groups = {}
+        self.sizes = set()
+        self.order = {}
+        for instruction in instructions:
+            tokens = getattr(instruction, "tokens", None)
+            if not tokens or not hasattr(tokens[0], field):
+                continue
+            for pattern in instruction.dict_to_patterns(instruction.patterns):
+                if isinstance(pattern, FixedPattern):
+                    if pattern.field == field:
+                        self._add(instruction, tokens[0], pattern.value)
+                        break
+
+    def _add(self, instruction, token_class, value):
+        # Determine the bits of the field, by setting them one by one
+        token = token_class()
+        mask = 0
+        for bit in range(token_class.Info.size):
+            token.bit_value = 1 << bit
+            if getattr(token, self.field):
+                mask |= 1 << bit
+        token.bit_value = 0
+        setattr(token, self.field, value)
+
+        info = token_class.Info
+        key = (info.size, info.endianness, mask)
+        _, table = self.groups.setdefault(key, (token_class, {}))
+        table.setdefault(token.bit_value, []).append(instruction)
+        self.order[instruction] = len(self.order)
+        self.sizes.update(instruction.sizes())
+
+    def candidates(self, data):
+        """Get the instructions that might encode the start of data"""
+        candidates = []
+        for (size, _, mask), (token_class, table) in self.groups.items():
+            size //= 8
+            if len(data) >= size:
+                value = token_class.unpack(data[:size]) & mask
+                candidates.extend(table.get(value, ()))
+        if len(self.groups) > 1:
+            candidates.sort(key=self.order.__getitem__)
+        return candidates
+
+    def decode(self, data):
+        """Decode the instruction at the start of data.
+
+        Returns the instruction and its size in bytes, or None when no
+        instruction encodes the data.
+        """
+        for instruction in self.candidates(data):
+            for size in instruction.sizes():
+                if len(data) < size:
+                    continue
+                try:
+                    return instruction.decode(data[:size]), size
+                except (ValueError, TypeError, KeyError):
+                    # Another field does not match this instruction
+                    pass
+        return None
@@ -53,6 +53,10 @@ class Frame:
         self.out_calls = []
         self.temps = generate_temps()
 
+        # Flow graph and interference graph of the register allocator:
+        self.cfg = None
+        self.ig = None
+
         # Local stack:
         self.stacksize = 0
         self.alignment = 1
@@ -123,7 +127,7 @@ class Frame:
 
     def live_ranges(self, vreg):
         """Determine the live range of some register"""
-        return self.cfg._live_ranges[vreg]
+        return self.cfg.live_ranges(vreg)
 
     def new_reg(self, cls, twain=""):
         """Retrieve a new virtual register"""
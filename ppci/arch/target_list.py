@@ -39,11 +39,19 @@ target_class_map = {t.name: t for t in target_classes}
 target_names = tuple(sorted(target_class_map.keys()))
 
 
-@lru_cache(maxsize=30)
 def create_arch(name, options=None):
     """Get a target architecture by its name. Possibly arch options can be
     given.
+
+    Architectures are created once per name and set of options, later
+    calls return the same instance.
     """
+    # The order of the options does not matter:
+    return _create_arch(name, tuple(sorted(options or ())))
+
+
+@lru_cache(maxsize=30)
+def _create_arch(name, options):
     # Create the instance!
     target = target_class_map[name](options=options)
     return target
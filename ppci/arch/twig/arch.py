@@ -1,6 +1,7 @@
 """TWIG architecture."""
 
 import logging
+from functools import cached_property
 
 from ... import ir
 from ...binutils.assembler import BaseAssembler
@@ -10,28 +11,38 @@ from ..data_instructions import DByte, data_isa
 from ..generic_instructions import Label, Global, Alignment, RegisterUseDef
 from ..encoding import Instruction
 from ..stack import FramePointerLocation, StackLocation
+from ...codegen.instructionscheduler import ListScheduler
 from .asm_printer import TwigAsmPrinter
 from .instructions import (
     Add,
+    Addf,
     Addi,
     And,
     Cos,
     Csrr,
+    Div,
+    Divf,
     Halt,
     Isqrt,
     ItoF,
     FtoI,
+    Lb,
+    Lh,
     Lli,
     Lmi,
     Lui,
     Lw,
     Mul,
+    Mulf,
     Prsw,
     Prlw,
     Bl,
     Blr,
+    Sb,
+    Sh,
     Slli,
     Srli,
+    Subf,
     Sw,
     Sin,
     isa,
@@ -159,9 +170,38 @@ class TwigAssembler(BaseAssembler):
         return label_name
 
 
+# Functional unit class and result latency in cycles of the instructions
+# that are not single cycle ALU operations. Used by the packet scheduler.
+schedule_classes = {
+    Lw: ("mem", 4),
+    Lh: ("mem", 4),
+    Lb: ("mem", 4),
+    Prlw: ("mem", 4),
+    Sw: ("mem", 1),
+    Sh: ("mem", 1),
+    Sb: ("mem", 1),
+    Prsw: ("mem", 1),
+    Sin: ("sfu", 8),
+    Cos: ("sfu", 8),
+    Isqrt: ("sfu", 8),
+    Mul: ("alu", 3),
+    Div: ("alu", 8),
+    Addf: ("alu", 4),
+    Subf: ("alu", 4),
+    Mulf: ("alu", 4),
+    Divf: ("alu", 8),
+    ItoF: ("alu", 2),
+    FtoI: ("alu", 2),
+}
+
+
 class TwigArch(Architecture):
     name = "twig"
 
+    # Packet resources: instructions per packet and per functional unit
+    packet_width = 4
+    unit_limits = {"alu": 4, "mem": 1, "sfu": 1, "branch": 1}
+
     def __init__(self, options=None):
         super().__init__(options=options)
 
@@ -180,8 +220,6 @@ class TwigArch(Architecture):
         # self.asm_printer = TwigAsmPrinter()
         if TwigAsmPrinter:
             self.asm_printer = TwigAsmPrinter()
-        self.assembler = TwigAssembler()
-        self.assembler.gen_asm_parser(self.isa)
 
         self.info = ArchInfo(
             type_infos={
@@ -265,6 +303,14 @@ class TwigArch(Architecture):
             R63,
         )  # + tuple(predregisters)
 
+    @cached_property
+    def assembler(self):
+        """The assembler. Its parser is generated on first use, since only
+        assembly sources and inline assembly need it."""
+        assembler = TwigAssembler()
+        assembler.gen_asm_parser(self.isa)
+        return assembler
+
     def branch(self, reg, lab):
         if isinstance(lab, TwigRegister):
             return Blr(reg, lab, 0, clobbers=self.caller_save)
@@ -395,6 +441,52 @@ class TwigArch(Architecture):
                 new_instructions.append(ins)
         return new_instructions
 
+    def spill_cost(self, frame, size):
+        """Count the instructions of a load from a new spill slot.
+
+        Each thread has its own copy of the slot, so the offset of the
+        slot is scaled by the number of threads in the peephole pass. Such
+        offsets do not fit the immediate of a load, and are built in the
+        scratch register first. The offset is not known until the frame
+        is complete, so the size of the frame so far is used.
+        """
+        callee_save_space = 4 * len(self.get_callee_saved(frame))
+        offset = (
+            callee_save_space + round_up(frame.stacksize + size)
+        ) * NUM_THREADS
+        return len(list(self.immUsed(R0, FP, offset, "lw")))
+
+    def rematerialize(self, definitions, vreg):
+        """Compute constants, frame addresses and CSR reads again.
+
+        A constant is an addi from the zero register, followed by the
+        instructions that load its other bits. A frame address is an
+        addi from the frame pointer. Moves of a call result to itself
+        follow the CSR reads of the thread and block IDs. The copies run
+        for all threads, like spill code does.
+        """
+        code = []
+        for ins in definitions:
+            if not code and isinstance(ins, Csrr):
+                code.append(Csrr(vreg, ins.rs1, 0))
+            elif not code and isinstance(ins, Addi) and ins.rs1 in (R0, FP):
+                copy = Addi(vreg, ins.rs1, ins.offset, 0)
+                copy.fprel = ins.fprel
+                code.append(copy)
+            elif code and isinstance(ins, (Lui, Lmi, Lli)):
+                code.append(type(ins)(vreg, ins.imm, 0))
+            elif (
+                code
+                and isinstance(ins, Addi)
+                and ins.rs1 is ins.rd
+                and ins.offset == 0
+            ):
+                # A move of the value to itself does nothing
+                continue
+            else:
+                return None
+        return code or None
+
     def move(self, dst, src):
         """Generate a move from src to dst"""
         return Addi(dst, src, 0, 0, ismove=True)
@@ -786,57 +878,16 @@ class TwigArch(Architecture):
                 new_instructions.extend(block)
                 continue
 
-            N = len(block)
             block_name = block_names.get(block_idx, f"Block_{block_idx}")
-            backward_edges = {i: [] for i in range(N)}
-            backward_edges_debug = {i: [] for i in range(N)}
-
-            # Build Data Dependency Graph (DDG)
-            for i in range(N):
-                reads_i, writes_i, is_mem_r_i, is_mem_w_i, is_br_i = (
-                    get_inst_info(block[i])
-                )
-
-                for j in range(i - 1, -1, -1):
-                    reads_j, writes_j, is_mem_r_j, is_mem_w_j, is_br_j = (
-                        get_inst_info(block[j])
-                    )
-
-                    # Data Hazard
-                    has_dep = False
-                    dep_type = None
-                    if reads_i & writes_j:
-                        has_dep = True
-                        dep_type = "RAW"
-                    elif writes_i & writes_j:
-                        has_dep = True
-                        dep_type = "WAW"
-                    elif writes_i & reads_j:
-                        has_dep = True
-                        dep_type = "WAR"
-                    # Memory Barrier
-                    elif is_mem_w_i and (is_mem_r_j or is_mem_w_j):
-                        has_dep = True
-                        dep_type = "MEM_WRITE"
-                    elif is_mem_r_i and is_mem_w_j:
-                        has_dep = True
-                        dep_type = "MEM_READ"
-                    # Control Barrier
-                    elif is_br_i or is_br_j:
-                        has_dep = True
-                        dep_type = "BRANCH"
-
-                    if has_dep:
-                        backward_edges[i].append(j)
-                        backward_edges_debug[i].append((j, dep_type))
+            backward_edges = build_dependency_graph(block)
 
             # Print DDG
             if self.logger.isEnabledFor(logging.DEBUG):
                 self.logger.debug("=== Basic Block: %s ===", block_name)
                 for i, inst in enumerate(block):
-                    deps = backward_edges_debug[i]
+                    deps = backward_edges[i]
                     dep_str = ", ".join(
-                        [f"[{src}]: {dtype}" for src, dtype in deps]
+                        [f"[{src}]: {dtype}" for src, dtype in deps.items()]
                     )
                     if not dep_str:
                         dep_str = "None"
@@ -844,56 +895,36 @@ class TwigArch(Architecture):
                         "  [%2d] %-20s -> Deps: %s", i, str(inst), dep_str
                     )
 
-            # Greedy Packetize
-            scheduled_set = set()
-            packet_count = 0
+            # List schedule the block into packets
+            units = []
+            latencies = []
+            for inst in block:
+                unit, latency = get_schedule_class(inst)
+                units.append(unit)
+                latencies.append(latency)
+            scheduler = ListScheduler(
+                self.unit_limits, max_packet_size or self.packet_width
+            )
+            schedule = scheduler.schedule(backward_edges, units, latencies)
 
             if self.logger.isEnabledFor(logging.DEBUG):
                 self.logger.debug("--- Packets for %s ---", block_name)
 
-            while len(scheduled_set) < N:
-                # Get all instructions whose dependencies have been completely
-                # met
-                ready_list = [
-                    i
-                    for i in range(N)
-                    if i not in scheduled_set
-                    and all(dep in scheduled_set for dep in backward_edges[i])
-                ]
-
-                # Sort to maintain original order when there are no
-                # dependencies, ensuring stable output
-                ready_list.sort()
-
-                if not ready_list:
-                    raise RuntimeError("DDG Cycle detected")
-
-                # Form the Packet
-                packet_idx = (
-                    ready_list[:max_packet_size]
-                    if max_packet_size
-                    else ready_list
-                )
+            for packet_count, (cycle, packet_idx) in enumerate(schedule, 1):
                 packet = [block[i] for i in packet_idx]
-
-                packet_count += 1
                 if self.logger.isEnabledFor(logging.DEBUG):
                     p_insts = ", ".join([f"[{idx}]" for idx in packet_idx])
-                    self.logger.debug("  Packet %d: %s", packet_count, p_insts)
+                    self.logger.debug(
+                        "  Packet %d (cycle %d): %s",
+                        packet_count,
+                        cycle,
+                        p_insts,
+                    )
 
                 # Mark Packet Start / End
                 packet[0].is_packet_start = True
                 packet[-1].is_packet_end = True
-
-                # Clear any residual markers on other instructions
-                for inst in packet:
-                    if inst != packet[0]:
-                        inst.is_packet_start = False
-                    if inst != packet[-1]:
-                        inst.is_packet_end = False
-
                 new_instructions.extend(packet)
-                scheduled_set.update(packet_idx)
 
         # Replace the original instruction list
         # Passing the reordered result directly to the downstream stream filter
@@ -904,6 +935,82 @@ def round_up(s):
     return s + (16 - s % 16)
 
 
+def build_dependency_graph(block):
+    """Build the data dependency graph of a basic block.
+
+    Returns, for every instruction, a dict mapping the index of each earlier
+    instruction it must follow to the kind of hazard. Only the nearest
+    conflicting instructions are recorded (the last writer and the readers
+    since then for every register, the same for memory, and the branches);
+    older conflicts are implied through them, so the graph orders the block
+    exactly like comparing every pair of instructions, in linear time.
+    """
+    backward_edges = [{} for _ in block]
+    last_writer = {}  # register -> index of its last write
+    readers = {}  # register -> indices that read it since that write
+    last_mem_write = None
+    mem_readers = []
+    since_branch = []  # instructions after the last branch
+    last_branch = None
+
+    for i, instr in enumerate(block):
+        reads, writes, is_mem_r, is_mem_w, is_br = get_inst_info(instr)
+        deps = backward_edges[i]
+
+        # Control Barrier: a branch follows everything before it and
+        # everything after it follows the branch
+        if last_branch is not None:
+            deps[last_branch] = "BRANCH"
+        if is_br:
+            for j in since_branch:
+                deps[j] = "BRANCH"
+
+        # Memory Barrier
+        if is_mem_w:
+            for j in mem_readers:
+                deps[j] = "MEM_WRITE"
+            if last_mem_write is not None:
+                deps[last_mem_write] = "MEM_WRITE"
+        elif is_mem_r and last_mem_write is not None:
+            deps[last_mem_write] = "MEM_READ"
+
+        # Data Hazard
+        for reg in writes:
+            for j in readers.get(reg, ()):
+                deps[j] = "WAR"
+            if reg in last_writer:
+                deps[last_writer[reg]] = "WAW"
+        for reg in reads:
+            if reg in last_writer:
+                deps[last_writer[reg]] = "RAW"
+
+        # Update the tables
+        for reg in reads:
+            readers.setdefault(reg, []).append(i)
+        for reg in writes:
+            last_writer[reg] = i
+            readers[reg] = []
+        if is_mem_w:
+            last_mem_write = i
+            mem_readers = []
+        elif is_mem_r:
+            mem_readers.append(i)
+        if is_br:
+            last_branch = i
+            since_branch = []
+        else:
+            since_branch.append(i)
+
+    return backward_edges
+
+
+def get_schedule_class(instr):
+    """Functional unit and latency of an instruction for the scheduler"""
+    if getattr(instr, "is_branch", False):
+        return "branch", 1
+    return schedule_classes.get(type(instr), ("alu", 1))
+
+
 def get_inst_info(instr):
     reads = set(str(r) for r in getattr(instr, "used_registers", []))
     writes = set(str(r) for r in getattr(instr, "defined_registers", []))
@@ -916,4 +1023,13 @@ def get_inst_info(instr):
     reads.discard("x0")
     writes.discard("x0")
 
+    # Predicate registers: the guarding predicate and the prsw/prlw operand
+    pred = getattr(instr, "pred", None)
+    if isinstance(pred, int):
+        reads.add(f"p{pred}")
+    if isinstance(instr, Prsw):
+        reads.add(f"p{instr.prs}")
+    elif isinstance(instr, Prlw):
+        writes.add(f"p{instr.prd}")
+
     return reads, writes, is_mem_read, is_mem_write, is_branch
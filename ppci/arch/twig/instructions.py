@@ -28,7 +28,7 @@ from ..data_instructions import Dd, Dcd2
 
 import struct
 
-isa = Isa()
+isa = Isa(decode_field="opcode")
 
 isa.register_relocation(JImm17Relocation)
 isa.register_relocation(PBImm12Relocation)
@@ -393,6 +393,9 @@ class Prsw(TwigPredSWInstruction):
     imm = Operand("imm", int)  # offset
     syntax = Syntax(["prsw", " ", prs, ",", " ", rs2, ",", " ", imm])
     patterns = {"opcode": 0b1101100, "prs": prs, "rs2": rs2, "imm": imm}
+    is_mem_read = False
+    is_mem_write = True
+    is_branch = False
 
 
 class Prlw(TwigPredLWInstruction):
@@ -403,6 +406,9 @@ class Prlw(TwigPredLWInstruction):
     imm = Operand("imm", int)  # offset
     syntax = Syntax(["prlw", " ", prd, ",", " ", rs2, ",", " ", imm])
     patterns = {"opcode": 0b1101101, "prd": prd, "rs2": rs2, "imm": imm}
+    is_mem_read = True
+    is_mem_write = False
+    is_branch = False
 
 
 class TwigJInstruction(Instruction):
@@ -437,6 +443,13 @@ class Bl_disasm(TwigJInstruction):
     def encode(self):
         return b""
 
+    @classmethod
+    def decode(cls, data):
+        instruction = super().decode(data)
+        if instruction.imm & 0x10000:  # The 17-bit offset is signed
+            instruction.imm -= 0x20000
+        return instruction
+
 
 # Check if change to str
 # class Blr_disas(TwigJrInstruction):
@@ -712,6 +725,8 @@ class Halt(TwigHInstruction):
 
     syntax = Syntax(["halt"])
     patterns = {"opcode": 0b1111111}
+    # Ends the block like a branch, nothing may be moved past it
+    is_branch = True
 
     def encode(self):
         return (0xFFFFFFFF).to_bytes(4, byteorder="little")
@@ -1298,8 +1313,11 @@ def pattern_pjmp(context, tree):
     )
     lab_no_name = str(lab_no.name) if hasattr(lab_no, "name") else str(lab_no)
 
-    context.emit(Jpnz(pred_val, lab_yes_name))
-    context.emit(Bl(R0, lab_no_name, jumps=[lab_no]))
+    # jpnz jumps when the predicate is set for any thread, and the jump
+    # after it is taken otherwise. Both are edges of the flow graph:
+    jmp_ins = Bl(R0, lab_no_name, jumps=[lab_no])
+    context.emit(Jpnz(pred_val, lab_yes_name, jumps=[lab_yes, jmp_ins]))
+    context.emit(jmp_ins)
 
 
 # @isa.pattern("stm", "BJMPF64(reg,reg)", size=10)
@@ -391,10 +391,11 @@ register_classes_swfp = [
         "reg",
         [ir.i8, ir.i16, ir.i32, ir.ptr, ir.u8, ir.u16, ir.f32, ir.u32],
         TwigRegister,
+        # R11 is left out, it is the scratch register of the frame pointer
+        # relative loads and stores expanded after register allocation:
         [
             R9,
             R10,
-            R11,
             R12,
             R13,
             R14,
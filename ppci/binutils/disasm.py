@@ -1,35 +1,73 @@
 """Contains disassembler stuff."""
 
-from ..arch.data_instructions import DByte
+from ..arch.data_instructions import DByte, Dd
 
 
 class Disassembler:
-    """Base disassembler for some architecture"""
+    """Base disassembler for some architecture.
 
-    def __init__(self, arch):
+    Instructions are decoded with the decode table of the isa. When the
+    isa has no decode table, or some data encodes no instruction, the data
+    is emitted as data directives: words for fixed size 32-bit isa's, and
+    bytes otherwise.
+    """
+
+    def __init__(self, arch, chunk_size=1 << 16):
         self.arch = arch
+        self.decode_table = arch.isa.decode_table
+        self.chunk_size = chunk_size
+        sizes = self.decode_table.sizes if self.decode_table else set()
+        self.data_instruction = Dd if sizes == {4} else DByte
+        self.max_size = max(sizes, default=1)
 
     def disasm(self, data, outs, address=0):
         """Disassemble data into an instruction stream"""
-        # TODO: implement this!
-
-        # The trial and error method, will be slow as a snail:
-        # for instruction in self.arch.isa.instructions:
-        #    for size in instruction.sizes():
-        #        part = data[:size]
-        #        try:
-        #            print(instruction, part, size)
-        #            i = instruction.decode(part)
-        #            print(i)
-        #        except ValueError:
-        #            pass
-
-        # For now, all is bytes!
-        for byte in data:
-            ins = DByte(byte)
-            ins.address = address
-            outs.emit(ins)
-            address += len(ins.encode())
-
-    def take_one(self):
-        pass
+        for instruction in self.decode(data, address=address):
+            outs.emit(instruction)
+
+    def decode(self, data, address=0):
+        """Decode data, yields the instructions with their address set"""
+        offset = 0
+        while offset < len(data):
+            instruction, size = self.take_one(data, offset)
+            instruction.address = address + offset
+            yield instruction
+            offset += size
+
+    def decode_stream(self, f, address=0):
+        """Decode a binary file, reading it a chunk at a time.
+
+        Yields the instructions with their address set, so very large
+        images can be disassembled without loading them completely.
+        """
+        data = b""
+        while True:
+            chunk = f.read(self.chunk_size)
+            data += chunk
+            # Keep a partial instruction for the next chunk
+            end = len(data) if not chunk else len(data) - self.max_size + 1
+            offset = 0
+            while offset < end:
+                instruction, size = self.take_one(data, offset)
+                instruction.address = address + offset
+                yield instruction
+                offset += size
+            data = data[offset:]
+            address += offset
+            if not chunk:
+                break
+
+    def take_one(self, data, offset=0):
+        """Decode the instruction at offset, returns it with its size"""
+        if self.decode_table:
+            decoded = self.decode_table.decode(
+                data[offset : offset + self.max_size]
+            )
+            if decoded:
+                return decoded
+
+        size = self.data_instruction.sizes()[0]
+        if len(data) - offset < size:  # A partial word at the end
+            size = 1
+            return DByte.decode(data[offset : offset + 1]), size
+        return self.data_instruction.decode(data[offset : offset + size]), size
@@ -0,0 +1,147 @@
+"""Content addressed on-disk cache for compilation results.
+
+Entries are keyed by a hash of everything that determines the output of a
+compilation: the preprocessed translation unit, the compiler options and
+the compiler itself. An entry is only ever looked up by its key, so stale
+entries are never returned; they simply age out.
+
+The cache is bounded in size. Every hit refreshes the modification time
+of the entry, and when the cache grows beyond its limit the least recently
+used entries are removed.
+"""
+
+import functools
+import hashlib
+import io
+import logging
+import os
+import tempfile
+
+from .. import __version__
+from ..binutils.objectfile import ObjectFile
+from ..irutils import from_json, to_json
+
+logger = logging.getLogger("cache")
+
+
+@functools.lru_cache(maxsize=None)
+def compiler_fingerprint():
+    """Identify the compiler: its version and a hash of its sources.
+
+    Including the sources means that editing the compiler invalidates the
+    cache, even when the version number stays the same.
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    h = hashlib.sha256(__version__.encode())
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.endswith(".py"):
+                path = os.path.join(root, filename)
+                with open(path, "rb") as f:
+                    h.update(os.path.relpath(path, package_dir).encode())
+                    h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+
+class CompileCache:
+    """A directory of compilation results, addressed by content hash.
+
+    Args:
+        directory: where to keep the entries. Created when needed.
+        max_size: size limit of the cache in bytes.
+    """
+
+    def __init__(self, directory, max_size=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *parts):
+        """Create a key from the given parts and the compiler fingerprint.
+
+        The parts are hashed by their repr, so they must have a stable one.
+        """
+        h = hashlib.sha256(compiler_fingerprint().encode())
+        for part in parts:
+            h.update(repr(part).encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key, kind):
+        return os.path.join(self.directory, key[:2], f"{key}.{kind}")
+
+    def get(self, key, kind):
+        """Get the text stored under key, or None when not cached"""
+        path = self._path(key, kind)
+        try:
+            with open(path, "r") as f:
+                text = f.read()
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+    def put(self, key, kind, text):
+        """Store text under key, then evict entries when over the limit"""
+        path = self._path(key, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first, so that concurrent compilations
+        # never see a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until within the size limit"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:  # Removed by another process
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            else:
+                logger.debug("Evicted %s from cache", path)
+            total -= size
+
+    def load_ir(self, key):
+        """Load a cached IR-module, or None"""
+        text = self.get(key, "ir.json")
+        return None if text is None else from_json(text)
+
+    def store_ir(self, key, module):
+        self.put(key, "ir.json", to_json(module))
+
+    def load_object(self, key):
+        """Load a cached object file, or None"""
+        text = self.get(key, "obj.json")
+        return None if text is None else ObjectFile.load(io.StringIO(text))
+
+    def store_object(self, key, obj):
+        f = io.StringIO()
+        obj.save(f)
+        self.put(key, "obj.json", f.getvalue())
@@ -38,6 +38,19 @@ compile_parser.add_argument(
 compile_parser.add_argument(
     "-O", help="optimize code", default="0", choices=api.OPT_LEVELS
 )
+compile_parser.add_argument(
+    "--unroll",
+    type=int,
+    metavar="N",
+    help="Unroll loops N times at -O2, 1 disables unrolling (default: 4)",
+)
+compile_parser.add_argument(
+    "-fregalloc",
+    dest="regalloc",
+    choices=("graph", "linear"),
+    help="Register allocator, graph coloring or the faster linear scan "
+    "(default: linear at -O0, graph otherwise)",
+)
 compile_parser.add_argument(
     "--instrument-functions",
     help="Instrument given functions",
@@ -46,12 +59,24 @@ compile_parser.add_argument(
 )
 
 
+def register_allocator(args):
+    """Get the register allocator selected by the options"""
+    if args.regalloc:
+        return args.regalloc
+    return "linear" if args.O == "0" else "graph"
+
+
 def do_compile(ir_modules, march, reporter, args):
     """Handle the proper output action"""
 
     # Optimize:
     for ir_module in ir_modules:
-        api.optimize(ir_module, level=args.O, reporter=reporter)
+        api.optimize(
+            ir_module,
+            level=args.O,
+            reporter=reporter,
+            unroll_factor=args.unroll,
+        )
 
     # Instrument:
     if args.instrument_functions:
@@ -69,7 +94,13 @@ def do_compile(ir_modules, march, reporter, args):
         with open(args.output, "w") as output:
             stream = TextOutputStream(printer=march.asm_printer, f=output)
             for ir_module in ir_modules:
-                api.ir_to_stream(ir_module, march, stream, reporter=reporter)
+                api.ir_to_stream(
+                    ir_module,
+                    march,
+                    stream,
+                    reporter=reporter,
+                    regalloc=register_allocator(args),
+                )
     elif args.wasm:  # Output web-assembly code
         assert len(ir_modules) == 1
         ir_module = ir_modules[0]
@@ -81,7 +112,11 @@ def do_compile(ir_modules, march, reporter, args):
             api.ir_to_python(ir_modules, output, reporter=reporter)
     else:  # Full object output
         obj = api.ir_to_object(
-            ir_modules, march, reporter=reporter, debug=args.g
+            ir_modules,
+            march,
+            reporter=reporter,
+            debug=args.g,
+            regalloc=register_allocator(args),
         )
         with open(args.output, "w") as output:
             obj.save(output)
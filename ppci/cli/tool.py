@@ -1,8 +1,8 @@
 import argparse
 import sys
 import struct
-import io
 from ..api import get_arch, asm
+from ..binutils.disasm import Disassembler
 from ..binutils.objectfile import ObjectFile
 
 parser = argparse.ArgumentParser(
@@ -205,77 +205,53 @@ def do_asm(args):
 
 
 def do_disasm(args):
-    """Handles disassembly with a robust fallback for
-    JAL/Label instructions."""
+    """Disassembles a binary, one line per 32-bit word."""
     filename = args.disasm
     print(f"Disassembling {filename}...")
 
-    from ..api import get_arch
-
-    arch = get_arch("twig")
-    raw_data = b""
+    disassembler = Disassembler(arch)
 
     # 1. Input detection
     # .hex, .txt, and .bin in this project refer to '0101' bit-string text
     is_bit_input = args.hex or filename.endswith((".hex", ".txt", ".bin"))
     is_obj_input = filename.endswith(".oj")
 
+    print(f"{'Addr':<8} | {'Hex':<8} | {'Instruction'}")
+    print("-" * 50)
+
     if is_bit_input:
         raw_data = bit_str_to_bytes(filename)
     elif is_obj_input:
-        # ... object file loading logic ...
-        pass
+        with open(filename, "r") as f:
+            obj = ObjectFile.load(f)
+        if obj.has_section("code"):
+            raw_data = obj.get_section("code").data
+        else:
+            raw_data = b""
     else:
+        # Raw binary, decode it a chunk of whole words at a time
         with open(filename, "rb") as f:
-            raw_data = f.read()
+            address = 0
+            while True:
+                chunk = f.read(1 << 16)
+                if not chunk:
+                    break
+                print_disasm(disassembler, chunk, address)
+                address += len(chunk)
+        return
 
-    print(f"{'Addr':<8} | {'Hex':<8} | {'Instruction'}")
-    print("-" * 50)
+    print_disasm(disassembler, raw_data)
 
-    f_stream = io.BytesIO(raw_data)
-    addr = 0
 
-    while f_stream.tell() < len(raw_data):
-        chunk = f_stream.read(4)
+def print_disasm(disassembler, data, address=0):
+    """Print the words in data with their address and instruction"""
+    for instruction in disassembler.decode(data, address=address):
+        offset = instruction.address - address
+        chunk = data[offset : offset + 4]
         if len(chunk) < 4:
-            break
-
+            break  # Trailing bytes that do not form a word
         val = int.from_bytes(chunk, byteorder="little")
-        decoded_ins = None
-
-        # --- Standard PPCI Decoding ---
-        for instruction_def in arch.isa.instructions:
-            try:
-                decoded_ins = instruction_def.decode(chunk)
-                if decoded_ins:
-                    break
-            except Exception:
-                continue
-
-        # --- Display Logic with Fallback ---
-        if decoded_ins:
-            print(f"{addr:08X} | {val:08X} | {decoded_ins}")
-        else:
-            # Manually extract opcode (lowest 7 bits)
-            opcode = val & 0x7F
-
-            # 0x60 is the opcode for 'Bl' (jal) in Twig
-            if opcode == 0x60:
-                # Based on TwigJToken: rd (7-13), imm (13-30)
-                rd_idx = (val >> 7) & 0x3F
-                # 17-bit immediate value
-                imm_val = (val >> 13) & 0x1FFFF
-
-                # Sign extension for 17-bit
-                if imm_val & 0x10000:
-                    imm_val -= 0x20000
-
-                print(f"{addr:08X} | {val:08X} | jal x{rd_idx}, {imm_val}")
-            else:
-                # If still unknown, output as data
-                print(f"{addr:08X} | {val:08X} | dd {val}")
-
-        addr += 4
+        print(f"{instruction.address:08X} | {val:08X} | {instruction}")
 
 
 if __name__ == "__main__":
@@ -1,12 +1,21 @@
 import argparse
+import io
+import logging
+import multiprocessing
+import os
 import sys
 from .. import api
 from ..lang.c import CAstPrinter, create_ast
 from ..lang.c.options import COptions, coptions_parser
 from .base import LogSetup, base_parser
-from .compile_base import compile_parser, do_compile
+from .compile_base import compile_parser, do_compile, register_allocator
 from ..arch import get_arch
+from ..build.cache import CompileCache
 from ..binutils.linker import link
+from ..binutils.objectfile import ObjectFile
+from ..common import CompilerError
+from ..irutils import from_json, to_json
+from ..utils.reporting import DummyReportGenerator
 from ..binutils.layout import (
     Layout,
     Memory,
@@ -49,13 +58,50 @@ parser.add_argument(
     default="meminit.hex",
     help="Output file for custom 32-bit binary strings",
 )
+parser.add_argument(
+    "--cache-dir",
+    default=os.environ.get("TWIG_CACHE_DIR"),
+    metavar="DIR",
+    help="Reuse IR and object code of unchanged translation units from "
+    "this directory (default: $TWIG_CACHE_DIR, caching is off if unset)",
+)
+parser.add_argument(
+    "--cache-size",
+    type=int,
+    default=256,
+    metavar="MB",
+    help="Size limit of the compile cache in megabytes (default: 256)",
+)
+parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    default=False,
+    help="Do not use the compile cache",
+)
+parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=1,
+    metavar="N",
+    help="Compile translation units in N worker processes (default: 1)",
+)
 parser.add_argument(
     "sources", metavar="source", nargs="+", type=argparse.FileType("r")
 )
 
+logger = logging.getLogger("twig")
+
 
 def twig(args=None):
     args = parser.parse_args(args)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.jobs > 1:
+        if args.html_report or args.text_report:
+            parser.error("reports are not supported with --jobs > 1")
+        if not all(src.seekable() for src in args.sources):
+            parser.error("--jobs > 1 requires sources to be files")
     with LogSetup(args) as log_setup:
         march = get_arch("twig")
         coptions = COptions()
@@ -78,34 +124,50 @@ def twig(args=None):
                     )
                     printer.print(ast)
         else:
-            # Compile sources to IR
-            ir_modules = []
-            for src in args.sources:
-                ir_module = api.c_to_ir(
-                    src, march, coptions=coptions, reporter=log_setup.reporter
+            cache = None
+            if args.cache_dir and not args.no_cache:
+                cache = CompileCache(
+                    args.cache_dir, max_size=args.cache_size * 1024 * 1024
                 )
 
-                # Optimize (Optional)
-                api.optimize(
-                    ir_module, level=args.O, reporter=log_setup.reporter
-                )
-
-                ir_modules.append(ir_module)
-
             # --ir, -c, -S
             if args.ir or args.c or args.S:
+                ir_modules = compile_sources(
+                    "ir", march, coptions, args, log_setup.reporter, cache
+                )
                 do_compile(
                     ir_modules, march, log_setup.reporter, log_setup.args
                 )
             else:
                 # Compile IR to Object (in-memory)
                 march.entry_symbol = args.entry
-                obj = api.ir_to_object(
-                    ir_modules,
-                    march,
-                    reporter=log_setup.reporter,
-                    debug=args.g,
-                )
+                if cache or args.jobs > 1:
+                    # One object per translation unit, so that each can be
+                    # reused or compiled on its own
+                    objects = compile_sources(
+                        "object",
+                        march,
+                        coptions,
+                        args,
+                        log_setup.reporter,
+                        cache,
+                    )
+                else:
+                    ir_modules = [
+                        compile_ir(
+                            src, march, coptions, args, log_setup.reporter
+                        )
+                        for src in args.sources
+                    ]
+                    objects = [
+                        api.ir_to_object(
+                            ir_modules,
+                            march,
+                            reporter=log_setup.reporter,
+                            debug=args.g,
+                            regalloc=register_allocator(args),
+                        )
+                    ]
 
                 # Prepare Layout
                 if args.layout:
@@ -120,7 +182,7 @@ def twig(args=None):
                 # 4. Link
                 try:
                     linked_obj = link(
-                        objects=[obj],
+                        objects=objects,
                         layout=layout_obj,
                         entry=args.entry,
                         debug=args.g,
@@ -141,6 +203,170 @@ def twig(args=None):
                 if args.hex_output:
                     write_meminit_hex(linked_obj, args.hex_output)
 
+            if cache:
+                logger.info(
+                    "Compile cache: %d hits, %d misses",
+                    cache.hits,
+                    cache.misses,
+                )
+
+
+def source_key(src, coptions, args, cache):
+    """Cache key of a source: its preprocessed text and the options.
+
+    Returns None for sources that cannot be read twice (such as stdin),
+    which are then not cached.
+    """
+    if not src.seekable():
+        return None
+    text = io.StringIO()
+    api.preprocess(src, text, coptions)
+    src.seek(0)
+    return cache.key(
+        getattr(src, "name", None),
+        text.getvalue(),
+        sorted(coptions.settings.items()),
+        [str(path) for path in coptions.include_directories],
+        coptions.macros,
+        coptions.undefine_macros,
+        args.O,
+        args.unroll,
+    )
+
+
+def compile_ir(src, march, coptions, args, reporter, cache=None, key=None):
+    """Compile and optimize a source to IR, or take it from the cache"""
+    if cache and key is None:
+        key = source_key(src, coptions, args, cache)
+    if key:
+        ir_module = cache.load_ir(key)
+        if ir_module is not None:
+            logger.debug("Using cached IR for %s", src.name)
+            return ir_module
+
+    ir_module = api.c_to_ir(src, march, coptions=coptions, reporter=reporter)
+
+    # Optimize (Optional)
+    api.optimize(
+        ir_module,
+        level=args.O,
+        reporter=reporter,
+        unroll_factor=args.unroll,
+    )
+
+    if key:
+        cache.store_ir(key, ir_module)
+    return ir_module
+
+
+def compile_object(src, march, coptions, args, reporter, cache=None):
+    """Compile a source to an object, or take it from the cache"""
+    key = cache and source_key(src, coptions, args, cache)
+    regalloc = register_allocator(args)
+    obj_key = key and cache.key(key, args.entry, args.g, regalloc)
+    if obj_key:
+        obj = cache.load_object(obj_key)
+        if obj is not None:
+            logger.debug("Using cached object for %s", src.name)
+            return obj
+
+    ir_module = compile_ir(src, march, coptions, args, reporter, cache, key)
+    obj = api.ir_to_object(
+        [ir_module], march, reporter=reporter, debug=args.g, regalloc=regalloc
+    )
+    if obj_key:
+        cache.store_object(obj_key, obj)
+    return obj
+
+
+def compile_sources(kind, march, coptions, args, reporter, cache=None):
+    """Compile all sources to IR-modules or objects, in source order"""
+    if args.jobs > 1 and len(args.sources) > 1:
+        return compile_parallel(kind, coptions, args, cache)
+
+    compile_fn = compile_ir if kind == "ir" else compile_object
+    return [
+        compile_fn(src, march, coptions, args, reporter, cache)
+        for src in args.sources
+    ]
+
+
+def compile_parallel(kind, coptions, args, cache=None):
+    """Compile the sources in a pool of worker processes.
+
+    Workers send the IR-modules or objects back in their json form. The
+    results are collected in source order, so the link is the same as
+    with a serial compilation.
+    """
+    options = argparse.Namespace(
+        O=args.O,
+        unroll=args.unroll,
+        regalloc=args.regalloc,
+        g=args.g,
+        entry=args.entry,
+    )
+    filenames = [src.name for src in args.sources]
+    jobs = min(args.jobs, len(filenames))
+    logger.info("Compiling %d sources with %d jobs", len(filenames), jobs)
+    with multiprocessing.Pool(
+        jobs,
+        initializer=_init_job_worker,
+        initargs=(kind, coptions, options, cache),
+    ) as pool:
+        results = pool.map(_compile_job, filenames, chunksize=1)
+
+    outputs = []
+    for text, error, hits, misses in results:
+        if cache:
+            cache.hits += hits
+            cache.misses += misses
+        if error:
+            raise CompilerError(*error)
+        if kind == "ir":
+            outputs.append(from_json(text))
+        else:
+            outputs.append(ObjectFile.load(io.StringIO(text)))
+    return outputs
+
+
+# State of a worker process of compile_parallel, set by _init_job_worker.
+_job_state = None
+
+
+def _init_job_worker(kind, coptions, options, cache):
+    global _job_state
+    march = get_arch("twig")
+    march.entry_symbol = options.entry
+    _job_state = (kind, march, coptions, options, cache)
+
+
+def _compile_job(filename):
+    """Compile one source, returns (text, error, cache hits, cache misses)"""
+    kind, march, coptions, options, cache = _job_state
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    reporter = DummyReportGenerator()
+    try:
+        with open(filename, "r") as src:
+            if kind == "ir":
+                ir_module = compile_ir(
+                    src, march, coptions, options, reporter, cache
+                )
+                text = to_json(ir_module)
+            else:
+                obj = compile_object(
+                    src, march, coptions, options, reporter, cache
+                )
+                f = io.StringIO()
+                obj.save(f)
+                text = f.getvalue()
+    except CompilerError as ex:
+        # Compiler errors do not survive pickling, send their parts
+        return None, (ex.msg, ex.loc, ex.hints), 0, 0
+
+    if cache:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    return text, None, hits, misses
+
 
 # Default memory layout based on MMIO.md
 ##############################################
@@ -29,6 +29,7 @@ from ..irutils import Verifier, split_block
 from .instructionscheduler import InstructionScheduler
 from .instructionselector import InstructionSelector1
 from .irdag import SelectionGraphBuilder
+from .linearscan import LinearScanRegisterAllocator
 from .peephole import PeepHoleStream
 from .registerallocator import GraphColoringRegisterAllocator
 from .packetize import PacketizeStream
@@ -38,8 +39,12 @@ class CodeGenerator:
     """Machine code generator"""
 
     logger = logging.getLogger("codegen")
+    register_allocators = {
+        "graph": GraphColoringRegisterAllocator,
+        "linear": LinearScanRegisterAllocator,
+    }
 
-    def __init__(self, arch, reporter, optimize_for="size"):
+    def __init__(self, arch, reporter, optimize_for="size", regalloc="graph"):
         assert isinstance(arch, Architecture), arch
         self.arch = arch
         self.reporter = reporter
@@ -56,7 +61,7 @@ class CodeGenerator:
             arch, self.sgraph_builder, reporter, weights=selection_weights
         )
         self.instruction_scheduler = InstructionScheduler()
-        self.register_allocator = GraphColoringRegisterAllocator(
+        self.register_allocator = self.register_allocators[regalloc](
             arch, self.instruction_selector, reporter
         )
 
@@ -291,6 +296,8 @@ class CodeGenerator:
             output_stream.emit(dd)
 
         # Check if we know what variables are live
+        if frame.ig is None:
+            return
         for tmp in frame.ig.temp_map:
             if self.debug_db.contains(tmp):
                 self.debug_db.get(tmp)
@@ -1,5 +1,5 @@
+import heapq
 import logging
-from collections import defaultdict
 
 from ..graph.digraph import DiGraph, DiNode
 
@@ -14,8 +14,18 @@ class FlowGraphNode(DiNode):
         self.kill = set()
         self.live_in = set()
         self.live_out = set()
+
+        # The same sets as bitsets, indexed by the register numbers of the
+        # flow graph:
+        self.gen_bits = 0
+        self.kill_bits = 0
+        self.live_in_bits = 0
+        self.live_out_bits = 0
         self.instructions = []
 
+        # The number of loops containing the node:
+        self.loop_depth = 0
+
         # Start with the instruction itself..
         self.add_instruction(ins)
 
@@ -29,6 +39,16 @@ class FlowGraphNode(DiNode):
         self.gen = self.gen | (ins.gen - self.kill)
         self.kill = self.kill | ins.kill
 
+    def update(self):
+        """Combine the gen and kill effects of the instructions again,
+        after they were changed."""
+        instructions = self.instructions
+        self.gen = set()
+        self.kill = set()
+        self.instructions = []
+        for ins in instructions:
+            self.add_instruction(ins)
+
     def __repr__(self):
         r = f"CFG-node({len(self.instructions)})"
         return r
@@ -48,12 +68,24 @@ class FlowGraphNode(DiNode):
 class FlowGraph(DiGraph):
     """A directed graph containing nodes with linear lists of instructions"""
 
+    # Instructions in a loop are assumed to run this many times as often as
+    # the instructions around the loop:
+    loop_weight = 10
+
     def __init__(self, instrs):
         """Create a flowgraph from a linear list of abstract instructions"""
         super().__init__()
         self.logger = logging.getLogger("flowgraph")
         self._map = {}
-        self._live_ranges = defaultdict(list)
+
+        # Registers are numbered in order of appearance, the bitsets of
+        # the nodes have a bit per register number:
+        self.register_numbers = {}
+        self.registers = []
+
+        # Instructions changed since liveness was calculated:
+        self._changed = set()
+        self._loop_depths_known = False
 
         # TODO: make this very tricky part of code better readable!!!
 
@@ -91,6 +123,8 @@ class FlowGraph(DiGraph):
                 assert node is not None
                 node.add_instruction(ins)
 
+        self._nodes = {ins: node for node in self for ins in node.instructions}
+
     def has_node(self, ins):
         """Return true if statement is a leader instruction"""
         return ins in self._map
@@ -103,7 +137,102 @@ class FlowGraph(DiGraph):
             self.add_node(node)
         return self._map[ins]
 
-    # def live_range(
+    def to_bits(self, registers):
+        """Get the bitset of some registers"""
+        bits = 0
+        for register in registers:
+            number = self.register_numbers.get(register)
+            if number is None:
+                number = len(self.registers)
+                self.register_numbers[register] = number
+                self.registers.append(register)
+            bits |= 1 << number
+        return bits
+
+    def to_set(self, bits):
+        """Get the registers in a bitset"""
+        registers = set()
+        while bits:
+            lowest = bits & -bits
+            registers.add(self.registers[lowest.bit_length() - 1])
+            bits ^= lowest
+        return registers
+
+    def postorder(self):
+        """Get the nodes in depth first postorder.
+
+        The search starts at the node of the first instruction, nodes not
+        reached from there follow.
+        """
+        order = []
+        visited = set()
+        for start in self:
+            if start in visited:
+                continue
+            visited.add(start)
+            stack = [(start, iter(start.successors))]
+            while stack:
+                node, successors = stack[-1]
+                for successor in successors:
+                    if successor not in visited:
+                        visited.add(successor)
+                        stack.append((successor, iter(successor.successors)))
+                        break
+                else:
+                    stack.pop()
+                    order.append(node)
+        return order
+
+    def calculate_loop_depths(self):
+        """Determine the number of loops containing each node.
+
+        An edge to a node on the depth first search stack is a back edge,
+        to the header of a loop. Everything that reaches the back edge
+        without passing the header is in the loop. Loops sharing a header
+        are merged into one.
+        """
+        bodies = {}
+        visited = set()
+        for start in self:
+            if start in visited:
+                continue
+            visited.add(start)
+            stack = [(start, iter(start.successors))]
+            on_stack = {start}
+            while stack:
+                node, successors = stack[-1]
+                for successor in successors:
+                    if successor in on_stack:
+                        body = bodies.setdefault(successor, {successor})
+                        worklist = [node]
+                        while worklist:
+                            member = worklist.pop()
+                            if member not in body:
+                                body.add(member)
+                                worklist.extend(member.predecessors)
+                    elif successor not in visited:
+                        visited.add(successor)
+                        on_stack.add(successor)
+                        stack.append((successor, iter(successor.successors)))
+                        break
+                else:
+                    stack.pop()
+                    on_stack.remove(node)
+
+        for node in self:
+            node.loop_depth = 0
+        for body in bodies.values():
+            for node in body:
+                node.loop_depth += 1
+        self._loop_depths_known = True
+
+    def frequency(self, instruction):
+        """Estimate how often an instruction runs, relative to code outside
+        of any loop."""
+        if not self._loop_depths_known:
+            self.calculate_loop_depths()
+        return self.loop_weight ** self._nodes[instruction].loop_depth
+
     def calculate_liveness(self):
         """Calculate liveness in CFG:"""
         ###
@@ -112,53 +241,130 @@ class FlowGraph(DiGraph):
         #  out[n] = for s in n.succ in union in[s]
         ###
         for node in self:
-            node.live_in = set()
-            node.live_out = set()
-
-        # Sort flowgraph nodes by backward depth first search:
-        # TODO: cfg_nodes = [x[1] for x in dfs(self.nodes[0], reverse=True)]
-        cfg_nodes = list(self.nodes)
-
-        # Dataflow fixed point iteration over the nodes in the CFG:
-        n_iterations = 0
-        change = True
-        while change:
-            change = False
-            for node in cfg_nodes:
-                _in = node.live_in
-                _out = node.live_out
-                node.live_in = node.gen | (node.live_out - node.kill)
-                if node.successors:
-                    node.live_out = set.union(
-                        *(s.live_in for s in node.successors)
-                    )
-                else:
-                    node.live_out = set()
+            node.gen_bits = self.to_bits(node.gen)
+            node.kill_bits = self.to_bits(node.kill)
+            node.live_in_bits = 0
+            node.live_out_bits = 0
+        self._changed.clear()
+
+        # Liveness flows backwards, so successors are visited before their
+        # predecessors by following the postorder:
+        self._order = {node: n for n, node in enumerate(self.postorder())}
+        self.solve_liveness(self)
+
+        for node in self:
+            self.calculate_instruction_liveness(node)
+
+    def solve_liveness(self, nodes):
+        """Propagate liveness from the given nodes until nothing changes.
+
+        Returns the nodes of which the liveness changed.
+        """
+        worklist = [(self._order[node], node) for node in nodes]
+        heapq.heapify(worklist)
+        queued = set(nodes)
+        changed = set()
+        n_visits = 0
+        while worklist:
+            _, node = heapq.heappop(worklist)
+            queued.remove(node)
+            n_visits += 1
 
-                # Record for change:
-                change = (
-                    change or (_in != node.live_in) or (_out != node.live_out)
-                )
-            n_iterations += 1
+            live_out = 0
+            for successor in node.successors:
+                live_out |= successor.live_in_bits
+            live_in = node.gen_bits | (live_out & ~node.kill_bits)
+            if live_out != node.live_out_bits:
+                node.live_out_bits = live_out
+                changed.add(node)
+            if live_in != node.live_in_bits:
+                node.live_in_bits = live_in
+                changed.add(node)
+                for predecessor in node.predecessors:
+                    if predecessor not in queued:
+                        queued.add(predecessor)
+                        heapq.heappush(
+                            worklist, (self._order[predecessor], predecessor)
+                        )
 
-        # In one pass fix all instructions:
+        self.logger.debug("Visits: %s,  nodes: %s", n_visits, len(self))
+        return changed
+
+    def calculate_instruction_liveness(self, node):
+        """Determine the liveness of the instructions in a node"""
+        assert len(node.instructions) > 0
+        node.live_in = self.to_set(node.live_in_bits)
+        node.live_out = self.to_set(node.live_out_bits)
+        live = node.live_out
+        for ins in reversed(node.instructions):
+            ins.live_out = live
+            ins.live_in = live = ins.gen | (live - ins.kill)
+
+    def live_ranges(self, vreg):
+        """Get the pairs of successive instructions a register is live
+        between."""
+        ranges = []
         for node in self:
-            assert len(node.instructions) > 0
-            ins2 = node.instructions[-1]
-            ins2.live_out = node.live_out  # Propagate into last instruction
-            ins2.live_in = ins2.gen | (ins2.live_out - ins2.kill)
-            if len(node.instructions) > 1:
-                for ins in reversed(node.instructions[:-1]):
-                    ins1 = ins
+            for ins1, ins2 in zip(node.instructions, node.instructions[1:]):
+                if vreg in ins1.live_out:
+                    ranges.append((ins1, ins2))
+        return ranges
+
+    def insert_code_before(self, instruction, code):
+        """Insert a code sequence without jumps before an instruction.
+
+        Call update_liveness when done changing the code.
+        """
+        node = self._nodes[instruction]
+        index = node.instructions.index(instruction)
+        self._insert_code(node, index, code)
+
+    def insert_code_after(self, instruction, code):
+        """Insert a code sequence without jumps after an instruction"""
+        node = self._nodes[instruction]
+        index = node.instructions.index(instruction) + 1
+        self._insert_code(node, index, code)
 
-                    ins1.live_out = ins2.live_in
-                    ins1.live_in = ins1.gen | (ins1.live_out - ins1.kill)
+    def _insert_code(self, node, index, code):
+        node.instructions[index:index] = code
+        for ins in code:
+            self._nodes[ins] = node
+        self._changed.add(node)
 
-                    for vreg in ins2.live_in & ins1.live_out:
-                        self._live_ranges[vreg].append((ins1, ins2))
+    def remove_instruction(self, instruction):
+        """Remove an instruction, which is not the only one of its node"""
+        node = self._nodes.pop(instruction)
+        node.instructions.remove(instruction)
+        self._changed.add(node)
 
-                    ins2 = ins1
+    def instruction_changed(self, instruction):
+        """Note that the registers of an instruction were changed"""
+        self._changed.add(self._nodes[instruction])
+
+    def update_liveness(self, removed=()):
+        """Update the liveness after the code was changed.
+
+        Registers may be removed from the code completely. Other changes
+        may only make more registers live, as after spilling, which
+        replaces the removed registers by registers live between a load
+        or store and the instruction next to it.
+        """
+        changed = self._changed
+        self._changed = set()
+        for node in changed:
+            node.update()
+            node.gen_bits = self.to_bits(node.gen)
+            node.kill_bits = self.to_bits(node.kill)
+
+        # Removed registers are live nowhere:
+        mask = self.to_bits(removed)
+        affected = set(changed)
+        for node in self:
+            if (node.live_in_bits | node.live_out_bits) & mask:
+                node.live_in_bits &= ~mask
+                node.live_out_bits &= ~mask
+                affected.add(node)
 
-        self.logger.debug(
-            "Iterations: %s,  nodes: %s", n_iterations, len(self)
-        )
+        affected |= self.solve_liveness(changed)
+        for node in affected:
+            self.calculate_instruction_liveness(node)
@@ -3,9 +3,116 @@ This algorithm takes the selected instructions and schedules them in
 a linear form.
 """
 
+import heapq
+
 
 class InstructionScheduler:
     def schedule(self, graph, frame):
         # TODO: schedule traces in better order.
         # This is optional!
         pass
+
+
+class ListScheduler:
+    """Latency and resource aware list scheduler for VLIW packets.
+
+    The input is the dependency graph of a basic block: for every
+    instruction a dict that maps each earlier instruction it depends on to
+    the kind of dependency ("RAW", "WAW", ...). Every instruction has a
+    functional unit class and a result latency in cycles.
+
+    Each cycle, one packet is filled with the ready instructions that have
+    the longest latency-weighted path to the end of the block. A packet
+    holds at most ``width`` instructions and at most ``unit_limits[unit]``
+    instructions of each unit class. Units without a limit are unlimited.
+    When no instruction is ready, the schedule stalls; empty packets are
+    not emitted.
+    """
+
+    def __init__(self, unit_limits=None, width=None):
+        self.unit_limits = unit_limits or {}
+        self.width = width
+
+    def edge_latency(self, kind, src_latency, dst_latency):
+        """Cycles between issuing an instruction and a dependent one"""
+        if kind == "RAW":
+            return max(src_latency, 1)
+        if kind == "WAW":
+            # The later write must not complete before the earlier one
+            return max(src_latency - dst_latency + 1, 1)
+        return 1
+
+    def schedule(self, backward_edges, units, latencies):
+        """Schedule a block, returns a list of (cycle, indices) packets.
+
+        The indices in a packet are sorted, so instructions keep their
+        original relative order within a packet.
+        """
+        n = len(backward_edges)
+        successors = [[] for _ in range(n)]
+        indegree = [len(deps) for deps in backward_edges]
+        for i, deps in enumerate(backward_edges):
+            for j, kind in deps.items():
+                delay = self.edge_latency(kind, latencies[j], latencies[i])
+                successors[j].append((i, delay))
+
+        # Priority: length of the critical path from an instruction to the
+        # end of the block. Edges point backwards, so one reverse pass will
+        # do.
+        height = [0] * n
+        for i in reversed(range(n)):
+            height[i] = max(
+                [delay + height[k] for k, delay in successors[i]],
+                default=max(latencies[i], 1),
+            )
+
+        earliest = [0] * n
+        waiting = [(0, i) for i in range(n) if indegree[i] == 0]
+        available = {}  # unit -> heap of (-height, index)
+        packets = []
+        cycle = 0
+        scheduled = 0
+
+        while scheduled < n:
+            while waiting and waiting[0][0] <= cycle:
+                _, i = heapq.heappop(waiting)
+                heap = available.setdefault(units[i], [])
+                heapq.heappush(heap, (-height[i], i))
+
+            packet = self._fill_packet(available)
+            if not packet:
+                if not waiting:
+                    raise RuntimeError("DDG Cycle detected")
+                cycle = waiting[0][0]  # Stall until an instruction is ready
+                continue
+
+            packet.sort()
+            packets.append((cycle, packet))
+            scheduled += len(packet)
+            for i in packet:
+                for k, delay in successors[i]:
+                    earliest[k] = max(earliest[k], cycle + delay)
+                    indegree[k] -= 1
+                    if indegree[k] == 0:
+                        heapq.heappush(waiting, (earliest[k], k))
+            cycle += 1
+
+        return packets
+
+    def _fill_packet(self, available):
+        packet = []
+        used = {}
+        while self.width is None or len(packet) < self.width:
+            # Best candidate among the units that still have a free slot
+            best = None
+            for unit, heap in available.items():
+                limit = self.unit_limits.get(unit)
+                if heap and (limit is None or used.get(unit, 0) < limit):
+                    if best is None or heap[0] < available[best][0]:
+                        best = unit
+            if best is None:
+                break
+            _, i = heapq.heappop(available[best])
+            used[best] = used.get(best, 0) + 1
+            packet.append(i)
+        return packet
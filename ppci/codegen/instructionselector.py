@@ -56,6 +56,7 @@ Memory move operations:
 
 import abc
 import logging
+from functools import lru_cache
 
 from .. import ir
 from ..arch.encoding import Instruction
@@ -240,6 +241,103 @@ class TreeSelector:
         return self.sys.get_nts(template_tree)
 
 
+@lru_cache(maxsize=30)
+def create_burg_system(arch, weights):
+    """Create the table of rules for an architecture.
+
+    The rules do not depend on the selector using them, so selectors for
+    the same architecture and weights share the table.
+    """
+    sys = BurgSystem()
+
+    for terminal in terminals:
+        sys.add_terminal(terminal)
+
+    # Add special case nodes:
+    sys.add_rule("stm", Tree("CALL"), 0, None, call_function)
+    sys.add_rule("stm", Tree("ASM"), 0, None, inline_asm)
+
+    # Add undefined value for register classes:
+    _create_undefined_rules(sys, arch)
+
+    # Add all isa patterns:
+    for pattern in arch.isa.patterns:
+        cost = (
+            pattern.size * weights[0]
+            + pattern.cycles * weights[1]
+            + pattern.energy * weights[2]
+        )
+        sys.add_rule(
+            pattern.non_term,
+            pattern.tree,
+            cost,
+            pattern.condition,
+            pattern.method,
+        )
+
+    sys.check()
+    return sys
+
+
+def _create_undefined_rules(sys, arch):
+    """Create rules for undefined values based on register classes."""
+    und_map = {}
+    for register_class in arch.info.register_classes:
+        for ir_typ in register_class.ir_types:
+            if ir_typ in ir.value_types:
+                und_map[ir_typ] = (register_class.name, register_class.typ)
+
+    for ir_typ, info in und_map.items():
+        reg_class_name, reg_class = info
+        _mk_undefined_rule(sys, reg_class_name, reg_class, ir_typ)
+
+
+def _mk_undefined_rule(sys, reg_class_name, reg_class, ir_ty):
+    """Create rule for undefined value.
+
+    For example, create UNDU16 which defines
+    a 16 bits registers and returns it.
+    """
+    suffix = ir_ty.name.upper()
+
+    def und_pattern(context, tree):
+        r = context.new_reg(reg_class)
+        context.emit(RegisterUseDef(defs=(r,)))
+        return r
+
+    sys.add_rule(reg_class_name, Tree(f"UND{suffix}"), 0, None, und_pattern)
+
+
+def call_function(context, tree):
+    label, args, rv = tree.value
+    try:
+        call_iter = context.arch.gen_call(
+            context.frame,
+            label,
+            args,
+            rv,
+            pred=tree.pred,
+        )
+    except TypeError:
+        # Architecture doesn't accept pred kwarg
+        call_iter = context.arch.gen_call(
+            context.frame,
+            label,
+            args,
+            rv,
+        )
+    for instruction in call_iter:
+        context.emit(instruction)
+
+
+def inline_asm(context, tree):
+    """Run assembler on inline assembly code."""
+    template, output_registers, input_registers, clobbers = tree.value
+    context.emit(
+        InlineAssembly(template, output_registers, input_registers, clobbers)
+    )
+
+
 class InstructionSelector1:
     """Instruction selector which takes in a DAG and puts instructions
     into a frame.
@@ -264,96 +362,9 @@ class InstructionSelector1:
         self.reporter = reporter
         self.dag_splitter = DagSplitter(arch)
 
-        # Generate burm table of rules:
-        self.sys = BurgSystem()
-
-        for terminal in terminals:
-            self.sys.add_terminal(terminal)
-
-        # Add special case nodes:
-        self.sys.add_rule("stm", Tree("CALL"), 0, None, self.call_function)
-        self.sys.add_rule("stm", Tree("ASM"), 0, None, self.inline_asm)
-
-        # Add undefined value for register classes:
-        self._create_undefined_rules()
-
-        # Add all isa patterns:
-        for pattern in arch.isa.patterns:
-            cost = (
-                pattern.size * weights[0]
-                + pattern.cycles * weights[1]
-                + pattern.energy * weights[2]
-            )
-            self.sys.add_rule(
-                pattern.non_term,
-                pattern.tree,
-                cost,
-                pattern.condition,
-                pattern.method,
-            )
-
-        self.sys.check()
+        self.sys = create_burg_system(arch, tuple(weights))
         self.tree_selector = TreeSelector(self.sys)
 
-    def _create_undefined_rules(self):
-        """Create rules for undefined values based on register classes."""
-        und_map = {}
-        for register_class in self.arch.info.register_classes:
-            for ir_typ in register_class.ir_types:
-                if ir_typ in ir.value_types:
-                    und_map[ir_typ] = (register_class.name, register_class.typ)
-
-        for ir_typ, info in und_map.items():
-            reg_class_name, reg_class = info
-            self._mk_undefined_rule(reg_class_name, reg_class, ir_typ)
-
-    def _mk_undefined_rule(self, reg_class_name, reg_class, ir_ty):
-        """Create rule for undefined value.
-
-        For example, create UNDU16 which defines
-        a 16 bits registers and returns it.
-        """
-        suffix = ir_ty.name.upper()
-
-        def und_pattern(context, tree):
-            r = context.new_reg(reg_class)
-            context.emit(RegisterUseDef(defs=(r,)))
-            return r
-
-        self.sys.add_rule(
-            reg_class_name, Tree(f"UND{suffix}"), 0, None, und_pattern
-        )
-
-    def call_function(self, context, tree):
-        label, args, rv = tree.value
-        try:
-            call_iter = self.arch.gen_call(
-                context.frame,
-                label,
-                args,
-                rv,
-                pred=tree.pred,
-            )
-        except TypeError:
-            # Architecture doesn't accept pred kwarg
-            call_iter = self.arch.gen_call(
-                context.frame,
-                label,
-                args,
-                rv,
-            )
-        for instruction in call_iter:
-            context.emit(instruction)
-
-    def inline_asm(self, context, tree):
-        """Run assembler on inline assembly code."""
-        template, output_registers, input_registers, clobbers = tree.value
-        context.emit(
-            InlineAssembly(
-                template, output_registers, input_registers, clobbers
-            )
-        )
-
     def select(self, ir_function: ir.SubRoutine, frame):
         """Select instructions of function into a frame"""
         assert isinstance(ir_function, ir.SubRoutine)
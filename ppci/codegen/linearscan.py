@@ -0,0 +1,500 @@
+"""Linear scan register allocation.
+
+The graph coloring allocator builds an interference graph, which has an
+edge for each pair of registers that are live at the same time. Linear
+scan [Poletto1999]_ avoids the graph. The instructions of the frame are
+numbered in their order, and each register gets a live interval: the
+positions at which it is live. The intervals are visited in order of
+their start. A register is assigned to an interval when it is free for the
+whole interval, which is checked against the intervals that were assigned
+a register before.
+
+**Lifetime holes**
+
+Blocks are placed one after the other in the instruction list, so a
+register may be live in one block, not live in the next block, and live
+again in the block after that. An interval is a list of ranges, and the
+positions between the ranges are lifetime holes. Intervals whose ranges do
+not overlap may share a register, even when one lies in a hole of the
+other [Wimmer2005]_.
+
+Each instruction has two positions: registers are used at the first, and
+defined at the second. A register used for the last time by an instruction
+can be assigned to the register defined by it.
+
+**Fixed intervals**
+
+Physical registers used by the instructions, such as the registers of the
+calling convention, get fixed intervals. Registers clobbered by a call are
+fixed for the position at which the call defines its registers. Fixed
+intervals block their register and all aliases of it.
+
+**Spilling**
+
+When no register is free for an interval, the register is taken whose
+intervals are the cheapest to spill: they have the fewest uses for the part
+of them that is left. Uses are weighed by the loop nesting of their
+instructions, and by the cost of a load or a store on the target. An
+interval that is not used at its start is spilled itself when that is
+cheaper. Spilled registers get a stack slot, and are loaded into a new
+register before each use and stored after each definition. This gives a
+spilled value a second chance at a register around each of its
+instructions. The short intervals of the loaded and
+stored values are never spilled. After spilling, the liveness of the
+changed code is updated and the intervals are scanned again.
+
+Values that the target can compute again, such as constants, get no stack
+slot. They are computed before each use instead, and their definitions are
+removed.
+
+**Moves**
+
+A move between registers hints the register of the one interval to the
+other. Moves between the same register are removed after the allocation.
+
+.. [Poletto1999] Massimiliano Poletto and Vivek Sarkar. Linear scan register
+   allocation. ACM TOPLAS, 1999.
+
+.. [Wimmer2005] Christian Wimmer and Hanspeter Mössenböck. Optimized
+   interval splitting in a linear scan register allocator. VEE, 2005.
+
+"""
+
+import bisect
+import logging
+import math
+
+from ..arch.arch import Architecture, Frame
+from ..utils.collections import OrderedSet
+from .flowgraph import FlowGraph
+from .registerallocator import MiniGen
+
+
+class LiveInterval:
+    """The positions at which a register is live.
+
+    The positions are kept as sorted ranges, with the first and the last
+    position of each range.
+    """
+
+    __slots__ = (
+        "register",
+        "fixed",
+        "reg",
+        "starts",
+        "ends",
+        "uses",
+        "weight",
+    )
+
+    def __init__(self, register, fixed=False):
+        self.register = register
+        self.fixed = fixed
+
+        # The assigned physical register:
+        self.reg = register.get_real() if fixed else None
+        self.starts = []
+        self.ends = []
+
+        # The positions at which instructions use or define the register:
+        self.uses = []
+
+        # The estimated number of times these instructions run:
+        self.weight = 0
+
+    def __repr__(self):
+        ranges = ", ".join(
+            f"{start}-{end}" for start, end in zip(self.starts, self.ends)
+        )
+        return f"Interval({self.register}, {ranges}, reg={self.reg})"
+
+    @property
+    def start(self):
+        return self.starts[0]
+
+    @property
+    def end(self):
+        return self.ends[-1]
+
+    @property
+    def size(self):
+        """The number of positions in the interval"""
+        return sum(self.ends) - sum(self.starts) + len(self.starts)
+
+    def add_position(self, position):
+        """Add a position, positions are added in increasing order"""
+        if self.ends and position <= self.ends[-1] + 1:
+            self.ends[-1] = max(self.ends[-1], position)
+        else:
+            self.starts.append(position)
+            self.ends.append(position)
+
+    def covers(self, position):
+        """Test if the register is live at the given position"""
+        index = bisect.bisect_right(self.starts, position) - 1
+        return index >= 0 and self.ends[index] >= position
+
+    def next_use(self, position):
+        """Get the first use at or after the given position"""
+        index = bisect.bisect_left(self.uses, position)
+        return self.uses[index] if index < len(self.uses) else math.inf
+
+    def next_intersection(self, other):
+        """Get the first position covered by both intervals, or None"""
+        i = j = 0
+        while i < len(self.starts) and j < len(other.starts):
+            start = max(self.starts[i], other.starts[j])
+            if start <= min(self.ends[i], other.ends[j]):
+                return start
+            elif self.ends[i] < other.ends[j]:
+                i += 1
+            else:
+                j += 1
+        return None
+
+
+class LinearScanRegisterAllocator:
+    """Target independent linear scan register allocator.
+
+    This allocator is faster than the graph coloring allocator, at the
+    cost of more moves and spills in the generated code.
+    """
+
+    logger = logging.getLogger("linearscan")
+    max_spill_rounds = 30
+
+    def __init__(self, arch: Architecture, instruction_selector, reporter):
+        assert isinstance(arch, Architecture), arch
+        self.arch = arch
+        self.spill_gen = MiniGen(arch, instruction_selector)
+        self.reporter = reporter
+        self.alias = arch.info.alias
+        self.cls_regs = {}
+        for reg_class in self.arch.info.register_classes:
+            self.cls_regs[reg_class.typ] = OrderedSet(reg_class.registers)
+
+    def alloc_frame(self, frame: Frame):
+        """Allocate registers for all virtual registers of a frame"""
+        self.frame = frame
+        self.spill_temps = set()
+        cfg = FlowGraph(frame.instructions)
+        cfg.calculate_liveness()
+        frame.cfg = cfg
+
+        for spill_rounds in range(self.max_spill_rounds + 1):
+            intervals, fixed = self.build_intervals(frame.instructions)
+            spilled = self.scan(intervals, fixed)
+            if not spilled:
+                break
+            elif spill_rounds == self.max_spill_rounds:
+                raise RuntimeError(
+                    f"Give up after {self.max_spill_rounds} spill rounds!"
+                )
+            self.logger.debug(
+                "Spilling round %s: %s registers",
+                spill_rounds + 1,
+                len(spilled),
+            )
+            self.rewrite_program(cfg, spilled)
+            cfg.update_liveness([interval.register for interval in spilled])
+
+        self.apply_registers(intervals, fixed)
+
+    def build_intervals(self, instructions):
+        """Determine the live intervals of the registers in a frame.
+
+        Returns the intervals of the virtual registers, and the fixed
+        intervals of the physical registers.
+        """
+        intervals = {}
+        fixed = {}
+        self.references = {}
+        self.hints = {}
+        self.rematerializations = {}
+        self.spill_weights = {}
+
+        def interval_of(register):
+            if register.is_colored:
+                register = register.get_real()
+                if register not in fixed:
+                    fixed[register] = LiveInterval(register, fixed=True)
+                return fixed[register]
+            elif register not in intervals:
+                intervals[register] = LiveInterval(register)
+            return intervals[register]
+
+        cfg = self.frame.cfg
+        for index, ins in enumerate(instructions):
+            use_position, def_position = 2 * index, 2 * index + 1
+            frequency = cfg.frequency(ins)
+            for register in ins.live_in:
+                interval_of(register).add_position(use_position)
+            for register in ins.live_out | ins.kill:
+                interval_of(register).add_position(def_position)
+            for register in ins.clobbers:
+                interval_of(register).add_position(def_position)
+
+            for register in OrderedSet(ins.used_registers):
+                interval = interval_of(register)
+                interval.uses.append(use_position)
+                interval.weight += frequency
+            for register in OrderedSet(ins.defined_registers):
+                interval = interval_of(register)
+                interval.uses.append(def_position)
+                interval.weight += frequency
+
+            for register in OrderedSet(
+                ins.used_registers + ins.defined_registers
+            ):
+                interval = interval_of(register)
+                if not interval.fixed:
+                    self.references.setdefault(interval, []).append(ins)
+
+            if ins.ismove:
+                dst = interval_of(ins.defined_registers[0])
+                src = interval_of(ins.used_registers[0])
+                self.hints.setdefault(dst, src)
+                self.hints.setdefault(src, dst)
+
+        return list(intervals.values()), list(fixed.values())
+
+    def aliases(self, register):
+        return self.alias.get(register, (register,))
+
+    def scan(self, intervals, fixed):
+        """Assign registers to the intervals, in order of their start.
+
+        Intervals live at the current position are active, intervals
+        with a lifetime hole at the current position are inactive.
+        Returns the intervals that were spilled.
+        """
+        unhandled = sorted(
+            intervals, key=lambda interval: (interval.start, interval.size)
+        )
+        active = []
+        inactive = list(fixed)
+        spilled = []
+        for current in unhandled:
+            position = current.start
+            for interval in list(active):
+                if interval.end < position:
+                    active.remove(interval)
+                elif not interval.covers(position):
+                    active.remove(interval)
+                    inactive.append(interval)
+            for interval in list(inactive):
+                if interval.end < position:
+                    inactive.remove(interval)
+                elif interval.covers(position):
+                    inactive.remove(interval)
+                    active.append(interval)
+
+            if not self.try_allocate_free_reg(current, active, inactive):
+                self.allocate_blocked_reg(current, active, inactive, spilled)
+            if current.reg is not None:
+                active.append(current)
+        return spilled
+
+    def try_allocate_free_reg(self, current, active, inactive):
+        """Assign a register that is free during the whole interval"""
+        registers = self.cls_regs[type(current.register)]
+        free_until = dict.fromkeys(registers, math.inf)
+        for interval in active:
+            for register in self.aliases(interval.reg):
+                if register in free_until:
+                    free_until[register] = -1
+        for interval in inactive:
+            position = interval.next_intersection(current)
+            if position is not None:
+                for register in self.aliases(interval.reg):
+                    if free_until.get(register, -1) > position:
+                        free_until[register] = position
+
+        # Prefer the register of the other side of a move:
+        hint = self.hints.get(current)
+        if (
+            hint is not None
+            and hint.reg in free_until
+            and free_until[hint.reg] > current.end
+        ):
+            current.reg = hint.reg
+            return True
+
+        for register in registers:
+            if free_until[register] > current.end:
+                current.reg = register
+                return True
+        return False
+
+    def spill_cost(self, interval, position):
+        """The cost of spilling an interval live at the given position.
+
+        Spilling adds a load or a store for each use of the interval, and
+        frees its register for the rest of the interval. Uses in loops
+        run more often, and weigh heavier.
+        """
+        if interval.fixed or interval.register in self.spill_temps:
+            return math.inf
+        return self.spill_weight(interval) / (interval.end - position + 1)
+
+    def spill_weight(self, interval):
+        """Estimate the cost of the code added when spilling an interval.
+
+        A register that is computed again before its uses has no stores.
+        """
+        if interval not in self.spill_weights:
+            code = self.rematerialization(interval)
+            if code is None:
+                weight = interval.weight * self.arch.spill_cost(
+                    self.frame, interval.register.bitsize // 8
+                )
+            else:
+                cfg = self.frame.cfg
+                weight = len(code) * sum(
+                    cfg.frequency(ins)
+                    for ins in self.references[interval]
+                    if not ins.writes_register(interval.register)
+                )
+            self.spill_weights[interval] = weight
+        return self.spill_weights[interval]
+
+    def definitions(self, interval):
+        """Get the instructions defining the register of an interval"""
+        return [
+            ins
+            for ins in self.references[interval]
+            if ins.writes_register(interval.register)
+        ]
+
+    def rematerialization(self, interval):
+        """Get the instructions computing the register of an interval
+        again, or None"""
+        if interval not in self.rematerializations:
+            self.rematerializations[interval] = self.arch.rematerialize(
+                self.definitions(interval), interval.register
+            )
+        return self.rematerializations[interval]
+
+    def allocate_blocked_reg(self, current, active, inactive, spilled):
+        """Spill the intervals using a register, or the interval itself.
+
+        The register is taken whose intervals are the cheapest to spill,
+        unless spilling the interval itself is cheaper.
+        """
+        position = current.start
+        registers = self.cls_regs[type(current.register)]
+        blocking = {register: OrderedSet() for register in registers}
+        intersecting = active + [
+            interval
+            for interval in inactive
+            if interval.next_intersection(current) is not None
+        ]
+        for interval in intersecting:
+            for register in self.aliases(interval.reg):
+                if register in blocking:
+                    blocking[register].add(interval)
+
+        costs = {
+            register: sum(
+                self.spill_cost(interval, position)
+                for interval in blocking[register]
+            )
+            for register in registers
+        }
+        best = min(registers, key=costs.get)
+        if math.isinf(costs[best]):
+            if current.register in self.spill_temps:
+                raise RuntimeError(f"No register left for {current.register}")
+            spilled.append(current)
+            return
+        elif (
+            current.next_use(position) > position
+            and self.spill_cost(current, position) <= costs[best]
+        ):
+            # The interval needs no register right away, and is cheaper to
+            # spill than the intervals using the register:
+            spilled.append(current)
+            return
+
+        for interval in blocking[best]:
+            if interval in active:
+                active.remove(interval)
+            else:
+                inactive.remove(interval)
+            interval.reg = None
+            spilled.append(interval)
+        current.reg = best
+
+    def rewrite_program(self, cfg, spilled):
+        """Load spilled registers before each use and store them after
+        each definition.
+
+        Registers which can be computed again are computed before each use
+        instead, and their definitions are removed.
+        """
+        before, after = {}, {}
+        removed = set()
+        for interval in spilled:
+            tmp = interval.register
+            if self.rematerialization(interval) is not None:
+                self.logger.debug("Rematerializing %s", tmp)
+                definitions = self.definitions(interval)
+                for ins in definitions:
+                    removed.add(ins)
+                    cfg.remove_instruction(ins)
+                for ins in self.references[interval]:
+                    if ins not in removed:
+                        vreg = self.frame.new_reg(type(tmp))
+                        self.spill_temps.add(vreg)
+                        ins.replace_register(tmp, vreg)
+                        cfg.instruction_changed(ins)
+                        code = self.arch.rematerialize(definitions, vreg)
+                        before.setdefault(ins, []).extend(code)
+                        cfg.insert_code_before(ins, code)
+                continue
+
+            size = tmp.bitsize // 8
+            slot = self.frame.alloc(size, size)
+            self.logger.debug("Placing %s on stack at %s", tmp, slot)
+            for ins in self.references[interval]:
+                vreg = self.frame.new_reg(type(tmp))
+                self.spill_temps.add(vreg)
+                ins.replace_register(tmp, vreg)
+                cfg.instruction_changed(ins)
+                if ins.reads_register(vreg):
+                    code = self.spill_gen.gen_load(self.frame, vreg, slot)
+                    before.setdefault(ins, []).extend(code)
+                    cfg.insert_code_before(ins, code)
+                if ins.writes_register(vreg):
+                    code = self.spill_gen.gen_store(self.frame, vreg, slot)
+                    after.setdefault(ins, []).extend(code)
+                    cfg.insert_code_after(ins, code)
+
+        instructions = []
+        for ins in self.frame.instructions:
+            if ins in removed:
+                continue
+            instructions.extend(before.get(ins, ()))
+            instructions.append(ins)
+            instructions.extend(after.get(ins, ()))
+        self.frame.instructions[:] = instructions
+
+    def apply_registers(self, intervals, fixed):
+        """Color the virtual registers, and remove moves between the same
+        register"""
+        for interval in intervals:
+            assert interval.reg is not None
+            interval.register.set_color(interval.reg.color)
+            self.frame.used_regs.add(interval.reg.get_real())
+        for interval in fixed:
+            self.frame.used_regs.add(interval.reg)
+
+        self.frame.instructions[:] = [
+            ins
+            for ins in self.frame.instructions
+            if not (
+                ins.ismove
+                and ins.defined_registers[0].get_real()
+                is ins.used_registers[0].get_real()
+            )
+        ]
@@ -109,11 +109,14 @@ classes that possibly interfere.
 
 **Implementations**
 
-The following class can be used to perform register allocation.
+The following class can be used to perform register allocation. The
+faster :class:`ppci.codegen.linearscan.LinearScanRegisterAllocator` is
+used when compiling without optimizations.
 
 """
 
 import logging
+import math
 from functools import lru_cache
 
 from ..arch.arch import Architecture, Frame
@@ -191,9 +194,6 @@ class MiniGen:
         return offset_tree
 
 
-# TODO: implement linear scan allocator and other allocators!
-
-
 class GraphColoringRegisterAllocator:
     """Target independent register allocator.
 
@@ -209,6 +209,7 @@ class GraphColoringRegisterAllocator:
         self.arch = arch
         self.spill_gen = MiniGen(arch, instruction_selector)
         self.reporter = reporter
+        self.cfg = None
 
         # A map with register alias info:
         self.alias = arch.info.alias
@@ -235,6 +236,8 @@ class GraphColoringRegisterAllocator:
             frame: The frame to perform register allocation on.
         """
         spill_rounds = 0
+        self.cfg = None
+        self.spill_temps = set()
 
         self.logger.debug("Starting iterative coloring")
         while True:
@@ -268,9 +271,13 @@ class GraphColoringRegisterAllocator:
                         f"Give up after {max_spill_rounds} spill rounds!"
                     )
 
-                # Rewrite program now.
+                # Rewrite program now, and update the liveness of the
+                # changed code:
+                removed = []
                 for node in spilled_nodes:
                     self.rewrite_program(node)
+                    removed.extend(node.temps)
+                self.cfg.update_liveness(removed)
 
                 if self.verbose:
                     self.reporter.message("Rewrote program with spilling")
@@ -302,20 +309,23 @@ class GraphColoringRegisterAllocator:
         """Initialize data structures"""
         self.frame = frame
 
-        cfg = FlowGraph(self.frame.instructions)
-        self.logger.debug(
-            "Constructed flowgraph with %s nodes", len(cfg.nodes)
-        )
+        if self.cfg is None:
+            self.cfg = FlowGraph(self.frame.instructions)
+            self.logger.debug(
+                "Constructed flowgraph with %s nodes", len(self.cfg.nodes)
+            )
+            self.cfg.calculate_liveness()
+            self.frame.cfg = self.cfg
 
-        cfg.calculate_liveness()
         self.frame.ig = InterferenceGraph()
-        self.frame.ig.calculate_interference(cfg)
+        self.frame.ig.calculate_interference(self.cfg)
         self.logger.debug(
             "Constructed interferencegraph with %s nodes",
             len(self.frame.ig.nodes),
         )
 
         self.moves = [i for i in self.frame.instructions if i.ismove]
+        self.rematerializations = {}
         for mv in self.moves:
             self.link_move(mv)
 
@@ -673,16 +683,17 @@ class GraphColoringRegisterAllocator:
         graph any ways.
         """
 
-        # TODO: select a node which is certainly not a node that was
-        # introduced during spilling?
-        # Select to be spilled variable:
-        # Select node with the lowest priority:
+        # Select node with the lowest priority.
+        # Spilling the registers loaded and stored by spill code again
+        # does not help:
         p = []
         for n in self.spill_worklist:
             assert not n.is_colored
-            d = sum(len(self.frame.ig.defs(t)) for t in n.temps)
-            u = sum(len(self.frame.ig.uses(t)) for t in n.temps)
-            priority = (u + d) / n.degree
+            if any(t in self.spill_temps for t in n.temps):
+                p.append((n, math.inf))
+                continue
+            cost = sum(self.spill_cost(t) for t in n.temps)
+            priority = cost / n.degree
             self.logger.debug("%s has spill priority=%s", n, priority)
             p.append((n, priority))
         node = min(p, key=lambda x: x[1])[0]
@@ -692,42 +703,86 @@ class GraphColoringRegisterAllocator:
         self.simplify_worklist.add(node)
         self.freeze_moves(node)
 
+    def rematerialization(self, tmp):
+        """Get the instructions computing a register again, or None"""
+        if tmp not in self.rematerializations:
+            self.rematerializations[tmp] = self.arch.rematerialize(
+                self.frame.ig.defs(tmp), tmp
+            )
+        return self.rematerializations[tmp]
+
+    def spill_cost(self, tmp):
+        """Estimate the cost of the code added when spilling a register.
+
+        Each use and def gets a load or a store, which runs as often as
+        the instruction, so uses in loops weigh heavier. A register that
+        is computed again before its uses has no stores.
+        """
+        code = self.rematerialization(tmp)
+        if code is None:
+            instructions = self.frame.ig.uses(tmp) + self.frame.ig.defs(tmp)
+            cost = self.arch.spill_cost(self.frame, tmp.bitsize // 8)
+        else:
+            instructions = self.frame.ig.uses(tmp)
+            cost = len(code)
+        return cost * sum(self.cfg.frequency(i) for i in instructions)
+
     def rewrite_program(self, node):
-        """Rewrite program by creating a load and a store for each use"""
-        # Generate spill code:
-        self.logger.debug(f"Placing {node} on stack")
-        if self.verbose:
-            self.reporter.message(f"Placing {node} on stack")
+        """Rewrite program by creating a load and a store for each use.
 
-        size = node.reg_class.bitsize // 8
-        alignment = size
-        slot = self.frame.alloc(size, alignment)
-        self.logger.debug("Allocating stack slot %s", slot)
+        Registers which can be computed again are computed before each use
+        instead, and their definitions are removed.
+        """
+        slot = None
 
         # TODO: maybe break-up coalesced node before doing this?
         for tmp in node.temps:
-            instructions = OrderedSet(
-                self.frame.ig.uses(tmp) + self.frame.ig.defs(tmp)
-            )
+            definitions = self.frame.ig.defs(tmp)
+            rematerialize = self.rematerialization(tmp) is not None
+            if rematerialize:
+                self.logger.debug("Rematerializing %s", tmp)
+                for instruction in definitions:
+                    self.frame.instructions.remove(instruction)
+                    self.cfg.remove_instruction(instruction)
+            elif slot is None:
+                # Generate spill code:
+                self.logger.debug(f"Placing {node} on stack")
+                if self.verbose:
+                    self.reporter.message(f"Placing {node} on stack")
+
+                size = node.reg_class.bitsize // 8
+                alignment = size
+                slot = self.frame.alloc(size, alignment)
+                self.logger.debug("Allocating stack slot %s", slot)
+
+            instructions = OrderedSet(self.frame.ig.uses(tmp) + definitions)
             for instruction in instructions:
+                if rematerialize and instruction in definitions:
+                    continue
                 if self.verbose:
                     self.reporter.message(
                         f"Updating instruction: {instruction}"
                     )
 
                 vreg2 = self.frame.new_reg(type(tmp))
+                self.spill_temps.add(vreg2)
                 self.logger.debug("tmp: %s, new: %s", tmp, vreg2)
                 if self.verbose:
                     self.reporter.message(f"Replace {tmp} by {vreg2}")
                 instruction.replace_register(tmp, vreg2)
+                self.cfg.instruction_changed(instruction)
 
                 if instruction.reads_register(vreg2):
-                    code = self.spill_gen.gen_load(self.frame, vreg2, slot)
+                    if rematerialize:
+                        code = self.arch.rematerialize(definitions, vreg2)
+                    else:
+                        code = self.spill_gen.gen_load(self.frame, vreg2, slot)
                     if self.verbose:
                         self.reporter.message(
                             f"Load code before: {list(map(str, code))}"
                         )
                     self.frame.insert_code_before(instruction, code)
+                    self.cfg.insert_code_before(instruction, code)
 
                 if instruction.writes_register(vreg2):
                     code = self.spill_gen.gen_store(self.frame, vreg2, slot)
@@ -736,6 +791,7 @@ class GraphColoringRegisterAllocator:
                             f"Store code after: {list(map(str, code))}"
                         )
                     self.frame.insert_code_after(instruction, code)
+                    self.cfg.insert_code_after(instruction, code)
 
                 if self.verbose:
                     self.reporter.dump_frame(self.frame)
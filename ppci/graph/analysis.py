@@ -0,0 +1,181 @@
+"""Cached control flow analysis of ir functions.
+
+Building the control flow graph, the dominator tree and the dominance
+frontier of a function is costly, and many optimization passes need them.
+The :class:`AnalysisManager` of a function computes each of these on
+first use and keeps the result, until a change to the control flow of
+the function invalidates it.
+
+The analysis only tracks the blocks and their edges. Passes that only
+change instructions within blocks keep it valid.
+"""
+
+from .. import ir
+from .cfg import Loop
+from .domtree import CfgInfo
+
+
+class AnalysisManager:
+    """Lazily computed and memoized control flow info of a function.
+
+    Get the manager of a function with :attr:`ppci.ir.SubRoutine.analysis`.
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self._cfg_info = None
+        self._loops = None
+        self._loop_depth = None
+
+    def __repr__(self):
+        return f"AnalysisManager(function={self.function})"
+
+    def invalidate(self):
+        """Forget all info, because the control flow graph changed"""
+        self._cfg_info = None
+        self._loops = None
+        self._loop_depth = None
+
+    @property
+    def cfg_info(self):
+        """The :class:`ppci.graph.domtree.CfgInfo` of the function"""
+        if self._cfg_info is None:
+            self._cfg_info = CfgInfo(self.function)
+        return self._cfg_info
+
+    @property
+    def cfg(self):
+        """The control flow graph of the function"""
+        return self.cfg_info.cfg
+
+    @property
+    def dominance_frontier(self):
+        """Map from block to the blocks in its dominance frontier"""
+        return self.cfg_info.df
+
+    def is_reachable(self, block):
+        """Test if the block can be reached from the entry"""
+        return block in self.cfg_info._block_map
+
+    def dominates(self, one, other):
+        """Test whether block one dominates block other"""
+        cfg_info = self.cfg_info
+        return self.cfg.dominates(
+            cfg_info.get_node(one), cfg_info.get_node(other)
+        )
+
+    def strictly_dominates(self, one, other):
+        """Test whether block one strictly dominates block other"""
+        cfg_info = self.cfg_info
+        return self.cfg.strictly_dominates(
+            cfg_info.get_node(one), cfg_info.get_node(other)
+        )
+
+    def immediate_dominator(self, block):
+        """Get the immediate dominator of a block, None for the entry"""
+        cfg_info = self.cfg_info
+        node = self.cfg.get_immediate_dominator(cfg_info.get_node(block))
+        return cfg_info.get_block(node) if node else None
+
+    def post_dominates(self, one, other):
+        """Test whether block one post dominates block other"""
+        cfg_info = self.cfg_info
+        return self.cfg.post_dominates(
+            cfg_info.get_node(one), cfg_info.get_node(other)
+        )
+
+    def immediate_post_dominator(self, block):
+        """Get the immediate post dominator of a block.
+
+        Returns None when the block is post dominated by the exit only.
+        """
+        cfg_info = self.cfg_info
+        node = self.cfg.get_immediate_post_dominator(cfg_info.get_node(block))
+        return cfg_info.get_block(node) if cfg_info.has_block(node) else None
+
+    def dominator_tree_children(self, block):
+        """Get the blocks immediately dominated by the given block"""
+        cfg_info = self.cfg_info
+        if self.cfg.root_tree is None:
+            self.cfg._calculate_dominator_info()
+        tree_node = self.cfg.tree_map[cfg_info.get_node(block)]
+        # The exit node of the graph is not a block:
+        return [
+            cfg_info.get_block(child.node)
+            for child in tree_node.children
+            if cfg_info.has_block(child.node)
+        ]
+
+    @property
+    def loops(self):
+        """The natural loops of the function, outermost loops first.
+
+        Each loop has a header block, and the rest of the blocks in the
+        loop. Loops sharing a header are merged into one.
+        """
+        if self._loops is None:
+            self._calculate_loops()
+        return self._loops
+
+    def loop_depth(self, block):
+        """Get the number of loops that contain the block"""
+        if self._loops is None:
+            self._calculate_loops()
+        return self._loop_depth.get(block, 0)
+
+    def loop_preheader(self, loop):
+        """Get the block through which the loop is entered.
+
+        This is the only block outside the loop that jumps to the header,
+        and it must jump to the header only. Returns None when the loop
+        has no such block.
+        """
+        body = set(loop.rest)
+        outside = {
+            block
+            for block in loop.header.predecessors
+            if block not in body
+            and block is not loop.header
+            and self.is_reachable(block)
+        }
+        if len(outside) != 1:
+            return None
+        (preheader,) = outside
+        if not isinstance(preheader.last_instruction, ir.Jump):
+            return None
+        return preheader
+
+    def _calculate_loops(self):
+        """Find the natural loops, by walking back from each back edge"""
+        bodies = {}
+        for block in self.function:
+            if not self.is_reachable(block):
+                continue
+            for header in block.successors:
+                if not self.dominates(header, block):
+                    continue
+
+                # Back edge, everything that reaches it without passing
+                # the header is in the loop:
+                body = bodies.setdefault(header, {header})
+                worklist = [block]
+                while worklist:
+                    member = worklist.pop()
+                    if member not in body:
+                        body.add(member)
+                        worklist.extend(
+                            p
+                            for p in member.predecessors
+                            if self.is_reachable(p)
+                        )
+
+        order = {block: index for index, block in enumerate(self.function)}
+        self._loops = []
+        self._loop_depth = {}
+        for header, body in sorted(
+            bodies.items(), key=lambda item: (-len(item[1]), order[item[0]])
+        ):
+            rest = sorted(body - {header}, key=order.__getitem__)
+            self._loops.append(Loop(header=header, rest=rest))
+            for block in body:
+                self._loop_depth[block] = self._loop_depth.get(block, 0) + 1
@@ -5,7 +5,81 @@ from .digraph import DiGraph, DiNode
 
 
 class CallGraph(DiGraph):
-    pass
+    """Graph with a node for each routine, and an edge from each routine
+    to the routines it calls."""
+
+    __slots__ = ("node_map",)
+
+    def __init__(self):
+        super().__init__()
+        self.node_map = {}
+
+    def get_node(self, routine):
+        """Get the node of the given routine"""
+        return self.node_map[routine]
+
+    def strongly_connected_components(self):
+        """Determine the groups of routines which call each other.
+
+        This is Tarjan's algorithm. The groups are returned in bottom-up
+        order: the routines a group calls are in groups before it.
+        """
+        # Visit the callees in a fixed order, to get the same result on
+        # every run:
+        order = {node: number for number, node in enumerate(self.nodes)}
+
+        def callees(node):
+            return iter(sorted(self.successors(node), key=order.get))
+
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+        for root in self.nodes:
+            if root in index:
+                continue
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            worklist = [(root, callees(root))]
+            while worklist:
+                node, successors = worklist[-1]
+                for successor in successors:
+                    if successor not in index:
+                        index[successor] = lowlink[successor] = len(index)
+                        stack.append(successor)
+                        on_stack.add(successor)
+                        worklist.append((successor, callees(successor)))
+                        break
+                    elif successor in on_stack:
+                        lowlink[node] = min(lowlink[node], index[successor])
+                else:
+                    worklist.pop()
+                    if worklist:
+                        parent = worklist[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            component.append(member.routine)
+                            if member is node:
+                                break
+                        components.append(component)
+        return components
+
+
+class CallGraphNode(DiNode):
+    """Node for a single routine in a call graph"""
+
+    def __init__(self, graph, routine):
+        super().__init__(graph)
+        self.routine = routine
+
+    def __repr__(self):
+        return f"CallGraphNode({self.routine.name})"
 
 
 def mod_to_call_graph(ir_module) -> CallGraph:
@@ -13,20 +87,20 @@ def mod_to_call_graph(ir_module) -> CallGraph:
     cg = CallGraph()
 
     # Create call graph nodes:
-    node_map = {}
     for routine in ir_module.functions:
-        node_map[routine] = DiNode(cg)
+        cg.node_map[routine] = CallGraphNode(cg, routine)
     for routine in ir_module.externals:
         if isinstance(routine, ir.ExternalSubRoutine):
-            node_map[routine] = DiNode(cg)
+            cg.node_map[routine] = CallGraphNode(cg, routine)
 
-    # Add call graph edges:
+    # Add call graph edges, calls through pointers are not known:
     for routine in ir_module.functions:
-        n1 = node_map[routine]
+        n1 = cg.node_map[routine]
         for instruction in routine.get_instructions():
             if isinstance(instruction, (ir.FunctionCall, ir.ProcedureCall)):
                 routine2 = instruction.callee
-                n2 = node_map[routine2]
-                cg.add_edge(n1, n2)
+                if routine2 in cg.node_map:
+                    n2 = cg.node_map[routine2]
+                    cg.add_edge(n1, n2)
 
     return cg
@@ -192,6 +192,11 @@ class Module:
         self._functions.append(function)
         function.module = self
 
+    def remove_function(self, function):
+        """Remove a function from this module"""
+        self._functions.remove(function)
+        function.module = None
+
     def add_variable(self, variable):
         """Add a variable to this module"""
         assert isinstance(variable, Variable)
@@ -231,9 +236,14 @@ class Module:
 
 
 class Value:
-    """Base of all values"""
+    """Base of all values.
+
+    The slots holding the name, type and users are declared by the
+    subclasses, so that local values can also derive from
+    :class:`Instruction`.
+    """
 
-    __slots__ = ("name", "ty", "used_by")
+    __slots__ = ()
 
     def __init__(self, name: str, ty: Typ):
         # Has a name and a type?
@@ -244,17 +254,24 @@ class Value:
         if not isinstance(ty, Typ):
             raise TypeError("ty argument must be an instance of Typ")
         self.ty = ty
-        self.used_by = OrderedSet()
+
+        # Instructions using this value, a dict is an ordered set:
+        self._users = {}
+
+    @property
+    def used_by(self):
+        """The instructions that use this value, in order of first use"""
+        return self._users.keys()
 
     def add_user(self, i):
         """Add a usage for this value"""
         assert isinstance(i, Instruction)
-        self.used_by.add(i)
+        self._users[i] = None
 
     def del_user(self, i):
         """Add a usage for this value"""
         assert isinstance(i, Instruction)
-        self.used_by.remove(i)
+        del self._users[i]
 
     @property
     def is_used(self):
@@ -268,7 +285,7 @@ class Value:
 
     def replace_by(self, value):
         """Replace all uses of this value by another value"""
-        for use in list(self.used_by):
+        for use in list(self._users):
             use.replace_use(self, value)
 
 
@@ -285,10 +302,23 @@ class Binding:
     LOCAL = "local"
 
 
+class InlineHint:
+    """Enum for the wishes of the programmer about inlining a subroutine.
+
+    Front-ends set this from the source, for example from the C inline
+    keyword and the always_inline and noinline attributes.
+    """
+
+    DEFAULT = "default"
+    INLINE = "inline"
+    ALWAYS = "always"
+    NEVER = "never"
+
+
 class GlobalValue(Value):
     """A global value (with a name and an address)"""
 
-    __slots__ = ("binding",)
+    __slots__ = ("name", "ty", "_users", "binding")
 
     def __init__(self, name, binding):
         super().__init__(name, ptr)
@@ -364,9 +394,24 @@ class SubRoutine(GlobalValue):
         super().__init__(name, binding)
         self.blocks = []
         self.entry = None
-        self.defined_names = OrderedSet()
+        self.defined_names = set()
         self.unique_counter = 0
         self.arguments = []
+        self.inline_hint = InlineHint.DEFAULT
+        self._analysis = None
+
+    @property
+    def analysis(self):
+        """The cached control flow analysis of this routine.
+
+        See :class:`ppci.graph.analysis.AnalysisManager`. Whoever changes
+        the control flow graph must invalidate it.
+        """
+        if self._analysis is None:
+            from .graph.analysis import AnalysisManager
+
+            self._analysis = AnalysisManager(self)
+        return self._analysis
 
     def make_unique_name(self, dut):
         """Check if the name of the given dut is unique
@@ -537,14 +582,28 @@ class Block:
 
     A block is properly terminated if its last instruction is a
     :class:`FinalInstruction`.
+
+    The instructions form a doubly linked list, so inserting and removing
+    an instruction takes constant time. Each instruction also carries a
+    sequence number that increases along the block, which makes testing
+    the order of two instructions a constant time operation as well.
     """
 
+    # Distance between sequence numbers of appended instructions:
+    SEQUENCE_GAP = 1 << 10
+
     def __init__(self, name):
         self.name = name
         self.function = None
-        self.instructions = []
+        self._first = None
+        self._last = None
+        self._length = 0
         self.references = OrderedSet()
 
+        # Unroll factor requested for the loop headed by this block, 0 to
+        # unroll the loop completely:
+        self.unroll = None
+
     def dump(self):
         print("  ", self)
         for instruction in self:
@@ -557,24 +616,105 @@ class Block:
         return str(self)
 
     def __iter__(self):
-        yield from self.instructions
+        """Iterate over the instructions.
+
+        The current instruction may be removed during iteration, iteration
+        then proceeds with the instruction that followed it.
+        """
+        instruction = self._first
+        while instruction is not None:
+            following = instruction._next
+            yield instruction
+            if instruction.block is self:
+                following = instruction._next
+            elif following is not None and following.block is not self:
+                break
+            instruction = following
+
+    def __reversed__(self):
+        instruction = self._last
+        while instruction is not None:
+            preceding = instruction._prev
+            yield instruction
+            instruction = preceding
 
     def __len__(self):
-        return len(self.instructions)
+        return self._length
 
     def __getitem__(self, key):
-        return self.instructions.__getitem__(key)
+        if isinstance(key, slice):
+            return self.instructions[key]
+        if key < 0:
+            key += self._length
+        if not 0 <= key < self._length:
+            raise IndexError("block index out of range")
+
+        # Walk from the nearest end:
+        if key < self._length // 2:
+            instruction = self._first
+            for _ in range(key):
+                instruction = instruction._next
+        else:
+            instruction = self._last
+            for _ in range(self._length - 1 - key):
+                instruction = instruction._prev
+        return instruction
+
+    @property
+    def instructions(self):
+        """A list of the instructions in this block"""
+        return list(self)
+
+    def _link(self, instruction, before_instruction):
+        """Put an instruction in the list, before the given instruction"""
+        if instruction.block is not None:
+            raise ValueError(f"{instruction} is already in a block")
+        if before_instruction is None:
+            prev, following = self._last, None
+        else:
+            prev, following = before_instruction._prev, before_instruction
+        instruction._prev = prev
+        instruction._next = following
+        if prev is None:
+            self._first = instruction
+        else:
+            prev._next = instruction
+        if following is None:
+            self._last = instruction
+        else:
+            following._prev = instruction
+        instruction.block = self
+        self._length += 1
+
+        # Pick a sequence number between the neighbours:
+        if prev is None and following is None:
+            instruction._seq = 0
+        elif following is None:
+            instruction._seq = prev._seq + self.SEQUENCE_GAP
+        elif prev is None:
+            instruction._seq = following._seq - self.SEQUENCE_GAP
+        elif following._seq - prev._seq > 1:
+            instruction._seq = (prev._seq + following._seq) // 2
+        else:
+            self._renumber()
+
+    def _renumber(self):
+        """Spread the sequence numbers evenly, when running out of space"""
+        for seq, instruction in enumerate(self):
+            instruction._seq = seq * self.SEQUENCE_GAP
 
     def insert_instruction(self, instruction, before_instruction=None):
-        """Insert an instruction at the front of the block"""
+        """Insert an instruction before another instruction, or at the
+        front of the block"""
         if before_instruction is not None:
             assert self == before_instruction.block
-            pos = before_instruction.position
         else:
-            pos = 0
+            before_instruction = self._first
         assert isinstance(instruction, Instruction)
-        instruction.block = self
-        self.instructions.insert(pos, instruction)
+        if before_instruction is None:
+            self._link(instruction, None)
+        else:
+            self._link(instruction, before_instruction)
         if isinstance(instruction, Value):
             self.function.make_unique_name(instruction)
 
@@ -582,22 +722,48 @@ class Block:
         """Add an instruction to the end of this block"""
         assert isinstance(instruction, Instruction)
         assert not self.is_closed
-        instruction.block = self
-        self.instructions.append(instruction)
+        self._link(instruction, None)
         if isinstance(instruction, Value):
             self.function.make_unique_name(instruction)
 
     def remove_instruction(self, instruction):
         """Remove instruction from block"""
+        if instruction.block is not self:
+            raise ValueError(f"{instruction} is not in {self}")
+        prev, following = instruction._prev, instruction._next
+        if prev is None:
+            self._first = following
+        else:
+            prev._next = following
+        if following is None:
+            self._last = prev
+        else:
+            following._prev = prev
+        instruction._prev = instruction._next = None
         instruction.block = None
-        self.instructions.remove(instruction)
+        self._length -= 1
         return instruction
 
+    def split(self, instruction, block):
+        """Move an instruction and all instructions after it to the end
+        of another block"""
+        if instruction.block is not self:
+            raise ValueError(f"{instruction} is not in {self}")
+        while instruction is not None:
+            following = instruction._next
+            self.remove_instruction(instruction)
+            block._link(instruction, None)
+            instruction = following
+
+    @property
+    def first_instruction(self):
+        """Return this blocks first instruction"""
+        return self._first
+
     @property
     def last_instruction(self):
         """Gets the last instruction from the block"""
-        if not self.is_empty:
-            return self.instructions[-1]
+        return self._last
 
     @property
     def is_empty(self):
@@ -614,11 +780,6 @@ class Block:
         """Check if this block is the entry block of a function"""
         return self.function.entry is self
 
-    @property
-    def first_instruction(self):
-        """Return this blocks first instruction"""
-        return self.instructions[0]
-
     @property
     def phis(self):
         """Return all :class:`Phi` instructions of this block"""
@@ -668,94 +829,167 @@ class Block:
                 phi.set_incoming(b2, value)
 
 
-def value_use(name):
-    """Creates a property that also keeps track of usage"""
+class ValueUse:
+    """Operand of an instruction, that also keeps track of usage.
 
-    def getter(self):
-        """Gets the value"""
-        if name in self._var_map:
-            return self._var_map[name]
-        else:  # pragma: no cover
-            raise KeyError(name)
+    The operands of an instruction are stored in a fixed size list, with
+    each operand at the index it got when the class was created.
+    """
+
+    __slots__ = ("name", "index")
 
-    def setter(self, value):
+    def __init__(self, name):
+        self.name = name
+        self.index = None
+
+    def __set_name__(self, owner, attribute):
+        owner._operand_names = owner._operand_names + (self.name,)
+        self.index = len(owner._operand_names) - 1
+
+    def __get__(self, instance, owner=None):
+        """Gets the value"""
+        if instance is None:
+            return self
+        value = instance._operands[self.index]
+        if value is None:  # pragma: no cover
+            raise KeyError(self.name)
+        return value
+
+    def __set__(self, instance, value):
         """Sets the value"""
         if not isinstance(value, Value):
             raise TypeError(f"Expecting a Value instance, but got {value}")
         # If value was already set, remove usage
-        if name in self._var_map:
-            self.del_use(self._var_map[name])
+        old = instance._operands[self.index]
+        if old is not None:
+            instance.del_use(old)
 
-        # Place the value in the var map:
-        self._var_map[name] = value
+        # Place the value in the operand list:
+        instance._operands[self.index] = value
 
         # Add usage:
-        self.add_use(value)
+        instance.add_use(value)
 
-    return property(getter, setter)
+
+def value_use(name):
+    """Creates a property that also keeps track of usage"""
+    return ValueUse(name)
 
 
 class Instruction:
-    """Base class for all instructions that go into a basic block"""
+    """Base class for all instructions that go into a basic block.
+
+    Instructions are slotted to keep the memory footprint of large modules
+    small. Subclasses must declare the attributes they add in __slots__.
+    """
+
+    __slots__ = (
+        "_operands",
+        "_uses",
+        "block",
+        "pred",
+        "_prev",
+        "_next",
+        "_seq",
+    )
+
+    # Names of the operands declared with value_use:
+    _operand_names = ()
 
     def __init__(self):
-        # Create a collection to store the values this value uses.
-        # TODO: think of better naming..
-        self._var_map = {}
+        self._operands = [None] * len(self._operand_names)
+
+        # Values used by this instruction, with the number of times each
+        # value is used:
+        self._uses = {}
         self.block = None
-        self.uses = OrderedSet()
         self.pred = 0
 
+        # Position in the block, see :class:`Block`
+        self._prev = None
+        self._next = None
+        self._seq = 0
+
     @property
     def function(self):
         """Return the function this instruction is part of"""
         return self.block.function
 
+    @property
+    def uses(self):
+        """The values used by this instruction"""
+        return self._uses.keys()
+
     def add_use(self, value):
         """Add v to the list of values used by this instruction"""
         if not isinstance(value, Value):
             raise TypeError(f"Expected Value, but got {value}")
-        self.uses.add(value)
-        value.add_user(self)
+        count = self._uses.get(value, 0)
+        self._uses[value] = count + 1
+        if not count:
+            value.add_user(self)
 
     def del_use(self, v):
+        """Remove one use of v, values can be used more than once"""
         assert isinstance(v, Value)
-        self.uses.remove(v)
-        v.del_user(self)
+        count = self._uses[v] - 1
+        if count:
+            self._uses[v] = count
+        else:
+            del self._uses[v]
+            v.del_user(self)
+
+    def _del_uses(self):
+        for use in self._uses:
+            use.del_user(self)
+        self._uses.clear()
 
     def delete(self):
-        for use in list(self.uses):
-            self.del_use(use)
-        if self.uses:
-            uses = ", ".join(map(str, self.uses))
-            raise ValueError(
-                f"Cannot delete {self} since it is still used by {uses}"
-            )
+        self._del_uses()
 
     def replace_use(self, old, new):
         """replace value usage 'old' with new value, updating the def-use
         information.
         """
-        # TODO: update reference
-        # assert old in self._var_map.values()
-        found = False
-        for name in self._var_map:
-            if self._var_map[name] is old:
-                self._var_map[name] = new
-                found = True
-        if found:
-            self.del_use(old)
-            self.add_use(new)
+        operands = self._operands
+        for index, value in enumerate(operands):
+            if value is old:
+                operands[index] = new
+                self.del_use(old)
+                self.add_use(new)
 
     def remove_from_block(self):
-        for use in list(self.uses):
-            self.del_use(use)
+        self._del_uses()
         self.block.remove_instruction(self)
 
     @property
     def position(self):
-        """Return numerical position in block"""
-        return self.block.instructions.index(self)
+        """Return numerical position in block.
+
+        This counts the instructions before this one, use
+        :meth:`precedes` to compare the order of instructions.
+        """
+        position = 0
+        instruction = self._prev
+        while instruction is not None:
+            position += 1
+            instruction = instruction._prev
+        return position
+
+    @property
+    def previous_instruction(self):
+        """The instruction before this one in the block, or None"""
+        return self._prev
+
+    @property
+    def next_instruction(self):
+        """The instruction after this one in the block, or None"""
+        return self._next
+
+    def precedes(self, other):
+        """Test if this instruction comes before other in the same block"""
+        assert self.block is other.block
+        return self._seq < other._seq
 
     @property
     def is_terminator(self):
@@ -772,6 +1006,8 @@ class Instruction:
 class LocalValue(Value, Instruction):
     """An instruction that results in a value has a type and a name"""
 
+    __slots__ = ("name", "ty", "_users")
+
     def __init__(self, name: str, ty: Typ):
         super().__init__(name, ty)
 
@@ -798,12 +1034,14 @@ class LocalValue(Value, Instruction):
 
     def used_in_blocks(self):
         """Returns a set of blocks where this value is used"""
-        return OrderedSet(i.block for i in self.used_by)
+        return OrderedSet(i.block for i in self._users)
 
 
 class AddressOf(LocalValue):
     """This instruction takes the address of a block of data"""
 
+    __slots__ = ()
+
     src = value_use("src")
 
     def __init__(self, src, name: str):
@@ -821,6 +1059,8 @@ class AddressOf(LocalValue):
 class Cast(LocalValue):
     """Base type conversion instruction"""
 
+    __slots__ = ()
+
     src = value_use("src")
 
     def __init__(self, value, name, ty):
@@ -834,6 +1074,8 @@ class Cast(LocalValue):
 class Undefined(LocalValue):
     """Undefined value, this value must never be used."""
 
+    __slots__ = ()
+
     def __str__(self):
         return f"{self.name} = undefined"
 
@@ -854,6 +1096,13 @@ class PredicateAnnotation(Instruction):
     - condition_mask: Computed from the branch condition
     """
 
+    __slots__ = (
+        "pred_reg",
+        "pred_mask",
+        "context_name",
+        "parent_pred_reg",
+    )
+
     def __init__(
         self, pred_reg, pred_mask, context_name="", parent_pred_reg=None
     ):
@@ -888,6 +1137,8 @@ class PredicateAnnotation(Instruction):
 class Const(LocalValue):
     """Represents a constant value"""
 
+    __slots__ = ("value",)
+
     def __init__(self, value, name, ty):
         super().__init__(name, ty)
         self.value = value
@@ -902,6 +1153,8 @@ class LiteralData(LocalValue):
     instruction, a label and its data is emitted in the literal area
     """
 
+    __slots__ = ("data",)
+
     def __init__(self, data, name):
         super().__init__(name, BlobDataTyp(len(data), 1))
         self.data = data
@@ -915,6 +1168,8 @@ class LiteralData(LocalValue):
 class FunctionCall(LocalValue):
     """Call a function with some arguments and a return value"""
 
+    __slots__ = ("arguments",)
+
     callee = value_use("callee")
 
     def __init__(self, callee, arguments, name, ty):
@@ -934,11 +1189,11 @@ class FunctionCall(LocalValue):
 
     def replace_use(self, old, new):
         super().replace_use(old, new)
-        if old in self.arguments:
-            idx = self.arguments.index(old)
-            self.del_use(old)
-            self.arguments[idx] = new
-            self.add_use(new)
+        for idx, argument in enumerate(self.arguments):
+            if argument is old:
+                self.del_use(old)
+                self.arguments[idx] = new
+                self.add_use(new)
 
     def __str__(self):
         args = ", ".join(arg.name for arg in self.arguments)
@@ -948,6 +1203,8 @@ class FunctionCall(LocalValue):
 class ProcedureCall(Instruction):
     """Call a procedure with some arguments"""
 
+    __slots__ = ("arguments",)
+
     callee = value_use("callee")
 
     def __init__(self, callee, arguments):
@@ -965,11 +1222,11 @@ class ProcedureCall(Instruction):
 
     def replace_use(self, old, new):
         super().replace_use(old, new)
-        if old in self.arguments:
-            idx = self.arguments.index(old)
-            self.del_use(old)
-            self.arguments[idx] = new
-            self.add_use(new)
+        for idx, argument in enumerate(self.arguments):
+            if argument is old:
+                self.del_use(old)
+                self.arguments[idx] = new
+                self.add_use(new)
 
     def __str__(self):
         args = ", ".join(arg.name for arg in self.arguments)
@@ -979,6 +1236,8 @@ class ProcedureCall(Instruction):
 class Unop(LocalValue):
     """Generic unary operation"""
 
+    __slots__ = ("operation",)
+
     ops = ["-", "~"]  # someday perhaps: 'floor', 'sqrt'
     a = value_use("a")
 
@@ -1000,6 +1259,8 @@ class Unop(LocalValue):
 class Binop(LocalValue):
     """Generic binary operation"""
 
+    __slots__ = ("operation",)
+
     ops = ["+", "-", "*", "/", "%", "|", "&", "^", "<<", ">>", "rol", "ror"]
     a = value_use("a")
     b = value_use("b")
@@ -1033,6 +1294,8 @@ class CompareSet(LocalValue):
     (||, &&) are flattened into set instructions combined with AND/OR.
     """
 
+    __slots__ = ("cond",)
+
     conditions = ["==", "<", ">", ">=", "<=", "!="]
     a = value_use("a")
     b = value_use("b")
@@ -1078,6 +1341,8 @@ class Phi(LocalValue):
     the IR-code to be in SSA form.
     """
 
+    __slots__ = ("inputs",)
+
     def __init__(self, name, ty):
         super().__init__(name, ty)
         self.inputs = {}
@@ -1126,6 +1391,8 @@ class Phi(LocalValue):
 class Alloc(LocalValue):
     """Allocates space on the stack. The type of this value is a ptr"""
 
+    __slots__ = ("amount", "alignment")
+
     def __init__(self, name: str, amount: int, alignment: int):
         super().__init__(name, BlobDataTyp(amount, alignment))
 
@@ -1152,6 +1419,8 @@ class Alloc(LocalValue):
 class CopyBlob(Instruction):
     """Sort of memcpy operation."""
 
+    __slots__ = ("amount",)
+
     dst = value_use("dst")
     src = value_use("src")
 
@@ -1201,6 +1470,8 @@ class Variable(GlobalValue):
 class Parameter(LocalValue):
     """Parameter of a :class:`SubRoutine`."""
 
+    __slots__ = ("num",)
+
     def __init__(self, name, ty):
         super().__init__(name, ty)
 
@@ -1218,6 +1489,8 @@ class Load(LocalValue):
         volatile: whether or not this memory access is volatile.
     """
 
+    __slots__ = ("volatile",)
+
     address = value_use("address")
 
     def __init__(self, address, name, ty, volatile=False):
@@ -1235,6 +1508,8 @@ class Load(LocalValue):
 class Store(Instruction):
     """Store a value into memory"""
 
+    __slots__ = ("volatile",)
+
     address = value_use("address")
     value = value_use("value")
 
@@ -1265,6 +1540,8 @@ class Store(Instruction):
 class InlineAsm(Instruction):
     """Inline assembly code."""
 
+    __slots__ = ("template", "clobbers", "input_values", "output_values")
+
     def __init__(self, template, clobbers):
         super().__init__()
         self.template = template
@@ -1283,11 +1560,11 @@ class InlineAsm(Instruction):
 
     def replace_use(self, old, new):
         super().replace_use(old, new)
-        if old in self.input_values:
-            idx = self.input_values.index(old)
-            self.del_use(old)
-            self.input_values[idx] = new
-            self.add_use(new)
+        for idx, value in enumerate(self.input_values):
+            if value is old:
+                self.del_use(old)
+                self.input_values[idx] = new
+                self.add_use(new)
 
     def __str__(self):
         return f"asm ({self.template})"
@@ -1301,7 +1578,12 @@ class FinalInstruction(Instruction):
     instruction.
     """
 
-    pass
+    __slots__ = ()
+
+    @property
+    def targets(self):
+        """Gets a list of blocks this instruction can jump to"""
+        return []
 
 
 class Exit(FinalInstruction):
@@ -1311,9 +1593,10 @@ class Exit(FinalInstruction):
     in a :class:`Procedure`.
     """
 
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
-        self.targets = []
 
     def __str__(self):
         return "exit"
@@ -1325,12 +1608,13 @@ class Return(FinalInstruction):
     This instruction is only legal in a :class:`Function`.
     """
 
+    __slots__ = ()
+
     result = value_use("result")
 
     def __init__(self, result):
         super().__init__()
         self.result = result
-        self.targets = []
 
     def __str__(self):
         return f"return {self.result.name}"
@@ -1357,6 +1641,8 @@ def block_use(name):
 class JumpBase(FinalInstruction):
     """Base of all jumping instructions"""
 
+    __slots__ = ("_block_map",)
+
     def __init__(self):
         super().__init__()
         self._block_map = {}
@@ -1397,6 +1683,8 @@ class JumpBase(FinalInstruction):
 class Jump(JumpBase):
     """Jump statement to another :class:`Block` within the same function"""
 
+    __slots__ = ()
+
     target = block_use("target")
 
     def __init__(self, target):
@@ -1410,6 +1698,8 @@ class Jump(JumpBase):
 class CJump(JumpBase):
     """Conditional jump to true or false labels."""
 
+    __slots__ = ("cond",)
+
     conditions = ["==", "<", ">", ">=", "<=", "!="]
     a = value_use("a")
     b = value_use("b")
@@ -1436,6 +1726,8 @@ class CJump(JumpBase):
 class SJump(CJump):
     """Conditional jump to true or false labels."""
 
+    __slots__ = ("pred_yes_id",)
+
     def __init__(self, a, cond, b, lab_yes, pred_yes):
         """
         pred_yes and pred_no are the *integer IDs* of the
@@ -1454,6 +1746,8 @@ class SJump(CJump):
 class PJump(CJump):
     """Conditional jump to true or false labels."""
 
+    __slots__ = ("pred_yes_id", "pred_no_id")
+
     def __init__(
         self, a, cond, b, lab_yes, lab_no, pred_yes, pred_no, pred_parent
     ):
@@ -1471,6 +1765,8 @@ class PJump(CJump):
 class BJump(CJump):
     """Conditional jump to true or false labels."""
 
+    __slots__ = ("pred_yes_id", "pred_no_id")
+
     def __init__(
         self, a, cond, b, lab_yes, lab_no, pred_yes, pred_no, pred_parent
     ):
@@ -1496,6 +1792,8 @@ class JumpTable(JumpBase):
     In the worst case, this is expanded to a whole bunch of CJump statements.
     """
 
+    __slots__ = ("table",)
+
     v = value_use("v")
     lab_default = block_use("lab_default")
 
@@ -249,6 +249,28 @@ class DictWriter:
                 "kind": "jump",
                 "target": self.write_block_ref(instruction.target),
             }
+        elif isinstance(instruction, ir.SJump):
+            json_instruction = {
+                "kind": "sjump",
+                "a": self.write_value_ref(instruction.a),
+                "b": self.write_value_ref(instruction.b),
+                "condition": instruction.cond,
+                "yes_block": self.write_block_ref(instruction.lab_yes),
+                "yes_pred": instruction.pred_yes_id,
+            }
+        elif isinstance(instruction, (ir.PJump, ir.BJump)):
+            json_instruction = {
+                "kind": (
+                    "pjump" if isinstance(instruction, ir.PJump) else "bjump"
+                ),
+                "a": self.write_value_ref(instruction.a),
+                "b": self.write_value_ref(instruction.b),
+                "condition": instruction.cond,
+                "yes_block": self.write_block_ref(instruction.lab_yes),
+                "no_block": self.write_block_ref(instruction.lab_no),
+                "yes_pred": instruction.pred_yes_id,
+                "no_pred": instruction.pred_no_id,
+            }
         elif isinstance(instruction, ir.CJump):
             json_instruction = {
                 "kind": "cjump",
@@ -258,6 +280,23 @@ class DictWriter:
                 "yes_block": self.write_block_ref(instruction.lab_yes),
                 "no_block": self.write_block_ref(instruction.lab_no),
             }
+        elif isinstance(instruction, ir.CompareSet):
+            json_instruction = {
+                "kind": "compareset",
+                "name": instruction.name,
+                "type": self.write_type(instruction.ty),
+                "a": self.write_value_ref(instruction.a),
+                "condition": instruction.cond,
+                "b": self.write_value_ref(instruction.b),
+            }
+        elif isinstance(instruction, ir.PredicateAnnotation):
+            json_instruction = {
+                "kind": "predicateannotation",
+                "pred": instruction.pred_reg,
+                "mask": instruction.pred_mask,
+                "context": instruction.context_name,
+                "parent_pred": instruction.parent_pred_reg,
+            }
         elif isinstance(instruction, ir.Cast):
             json_instruction = {
                 "kind": "cast",
@@ -317,6 +356,10 @@ class DictWriter:
             }
         else:  # pragma: no cover
             raise NotImplementedError(str(instruction))
+
+        # Predicate under which the instruction executes, if any
+        if instruction.pred:
+            json_instruction["guard"] = instruction.pred
         return json_instruction
 
     def write_type(self, ty):
@@ -541,6 +584,40 @@ class DictReader:
             lab_yes = self.get_block_ref(json_instruction["yes_block"])
             lab_no = self.get_block_ref(json_instruction["no_block"])
             instruction = ir.CJump(a, cond, b, lab_yes, lab_no)
+        elif itype == "sjump":
+            a = self.get_value_ref(json_instruction["a"])
+            cond = json_instruction["condition"]
+            b = self.get_value_ref(json_instruction["b"])
+            lab_yes = self.get_block_ref(json_instruction["yes_block"])
+            pred_yes = json_instruction["yes_pred"]
+            instruction = ir.SJump(a, cond, b, lab_yes, pred_yes)
+        elif itype in ("pjump", "bjump"):
+            a = self.get_value_ref(json_instruction["a"])
+            cond = json_instruction["condition"]
+            b = self.get_value_ref(json_instruction["b"])
+            lab_yes = self.get_block_ref(json_instruction["yes_block"])
+            lab_no = self.get_block_ref(json_instruction["no_block"])
+            pred_yes = json_instruction["yes_pred"]
+            pred_no = json_instruction["no_pred"]
+            cls = ir.PJump if itype == "pjump" else ir.BJump
+            instruction = cls(
+                a, cond, b, lab_yes, lab_no, pred_yes, pred_no, 0
+            )
+        elif itype == "compareset":
+            name = json_instruction["name"]
+            ty = self.get_type(json_instruction["type"])
+            a = self.get_value_ref(json_instruction["a"])
+            cond = json_instruction["condition"]
+            b = self.get_value_ref(json_instruction["b"])
+            instruction = ir.CompareSet(a, cond, b, name, ty)
+            self.register_value(instruction)
+        elif itype == "predicateannotation":
+            instruction = ir.PredicateAnnotation(
+                json_instruction["pred"],
+                json_instruction["mask"],
+                json_instruction["context"],
+                json_instruction["parent_pred"],
+            )
         elif itype == "procedurecall":
             callee = self.get_value_ref(json_instruction["callee"])
             arguments = []
@@ -563,6 +640,7 @@ class DictReader:
             instruction = ir.Return(result)
         else:  # pragma: no cover
             raise NotImplementedError(itype)
+        instruction.pred = json_instruction.get("guard", 0)
         return instruction
 
     def get_type(self, json_type):
@@ -113,13 +113,19 @@ class Verifier:
         for instruction in block:
             self.verify_instruction(instruction, block)
 
+        # Check that the instruction order can be queried:
+        instructions = block.instructions
+        assert len(instructions) == len(block)
+        for one, another in zip(instructions, instructions[1:]):
+            assert one.precedes(another)
+
     def verify_instruction(self, instruction, block):
         """Verify that instruction belongs to block and that all uses
         are preceeded by defs"""
 
         # Check that instruction is contained in block:
         assert instruction.block == block
-        assert instruction in block.instructions
+        assert instruction in self._ranks
 
         # Check if value has unique name string:
         if isinstance(instruction, ir.Value):
@@ -232,7 +238,7 @@ class Verifier:
         # All other instructions must have a containing block:
         if one.block is None:
             raise ValueError(f"{one} has no block")
-        assert one in one.block.instructions
+        assert one in self._ranks
 
         # Phis are special case:
         if isinstance(another, ir.Phi):
@@ -515,6 +515,13 @@ class CCodeGenerator:
             ir_function = self.builder.new_function(
                 function.name, binding, return_type
             )
+
+        if "noinline" in function.attributes:
+            ir_function.inline_hint = ir.InlineHint.NEVER
+        elif "always_inline" in function.attributes:
+            ir_function.inline_hint = ir.InlineHint.ALWAYS
+        elif function.inline:
+            ir_function.inline_hint = ir.InlineHint.INLINE
         self.ir_var_map[function] = ir_function
 
     def create_function_external(self, function):
@@ -955,6 +962,7 @@ class CCodeGenerator:
         body_block = self.builder.new_block()
         end_block = self.builder.new_block()
 
+        check_block.unroll = stmt.unroll
         self.break_block_stack.append(end_block)
         self.continue_block_stack.append(check_block)
         self.builder.emit_jump(check_block)
@@ -1019,6 +1027,7 @@ class CCodeGenerator:
         """Generate do-while-statement code"""
         body_block = self.builder.new_block()
         final_block = self.builder.new_block()
+        body_block.unroll = stmt.unroll
         self.break_block_stack.append(final_block)
         self.continue_block_stack.append(body_block)
         self.builder.emit_jump(body_block)
@@ -1045,6 +1054,7 @@ class CCodeGenerator:
         body_block = self.builder.new_block()
         final_block = self.builder.new_block()
         iterator_block = self.builder.new_block()
+        condition_block.unroll = stmt.unroll
         self.break_block_stack.append(final_block)
         self.continue_block_stack.append(iterator_block)
 
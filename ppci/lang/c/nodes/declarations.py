@@ -101,6 +101,11 @@ class FunctionDeclaration(CDeclaration):
         super().__init__(storage_class, typ, name, location)
         self.body = None
 
+        # Hints for the optimizer, from the inline keyword and attributes
+        # such as always_inline:
+        self.inline = False
+        self.attributes = set()
+
     def __repr__(self):
         return (
             f"Function storage={self.storage_class} "
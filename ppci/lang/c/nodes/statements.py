@@ -53,7 +53,21 @@ class Switch(CStatement):
         return "Switch"
 
 
-class While(CStatement):
+class Loop(CStatement):
+    """Base of the loop statements.
+
+    The unroll attribute holds the unroll factor requested with a pragma,
+    0 to unroll the loop completely, or None when nothing was requested.
+    """
+
+    __slots__ = ("unroll",)
+
+    def __init__(self, location):
+        super().__init__(location)
+        self.unroll = None
+
+
+class While(Loop):
     """While statement"""
 
     __slots__ = ("condition", "body")
@@ -67,7 +81,7 @@ class While(CStatement):
         return "While"
 
 
-class DoWhile(CStatement):
+class DoWhile(Loop):
     """Do-while statement"""
 
     __slots__ = ("condition", "body")
@@ -81,7 +95,7 @@ class DoWhile(CStatement):
         return "Do-while"
 
 
-class For(CStatement):
+class For(Loop):
     """For statement"""
 
     __slots__ = ("init", "condition", "post", "body")
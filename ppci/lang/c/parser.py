@@ -209,6 +209,7 @@ class CParser(RecursiveDescentParser):
         type_specifiers = []
         type_qualifiers = set()
         typ = None
+        inline = False
         attributes = []
 
         while True:
@@ -254,11 +255,10 @@ class CParser(RecursiveDescentParser):
                     type_qualifiers.add(type_qualifier.val)
             elif self.peek in ["inline"]:
                 self.consume("inline")
-                # inline is a compiler hint. For now, ignore this hint :)
-                self.logger.debug("Ignoring inline for now")
+                # inline is a hint for the optimizer:
+                inline = True
             elif self.peek in ["__attribute__"]:
-                attributes = self.parse_attributes()
-                self.logger.error("Ignoring %s", attributes)
+                attributes.extend(self.parse_attributes())
             else:
                 break
 
@@ -280,7 +280,7 @@ class CParser(RecursiveDescentParser):
             # self.error('Expected at least one type specifier')
 
         typ = self.semantics.on_type_qualifiers(type_qualifiers, typ)
-        decl_spec = DeclSpec(storage_class, typ)
+        decl_spec = DeclSpec(storage_class, typ, inline, attributes)
         return decl_spec
 
     def parse_struct_or_union(self):
@@ -466,6 +466,8 @@ class CParser(RecursiveDescentParser):
             declarator.name,
             declarator.type_modifiers,
             declarator.location,
+            inline=decl_spec.inline,
+            attributes=decl_spec.attributes,
         )
         self.semantics.enter_function(function)
         body = self.parse_compound_statement()
@@ -820,6 +822,7 @@ class CParser(RecursiveDescentParser):
             "asm": self.parse_asm_statement,
             "{": self.parse_compound_statement,
             ";": self.parse_empty_statement,
+            "PRAGMA": self.parse_pragma,
         }
         if self.peek in m:
             statement = m[self.peek]()
@@ -839,6 +842,12 @@ class CParser(RecursiveDescentParser):
         statement = self.parse_statement()
         return self.semantics.on_label(name.val, statement, name.loc)
 
+    def parse_pragma(self):
+        """Parse a loop pragma, and the loop statement it applies to"""
+        pragma = self.consume("PRAGMA")
+        statement = self.parse_statement()
+        return self.semantics.on_loop_pragma(pragma.val, statement, pragma.loc)
+
     def parse_empty_statement(self):
         """Parse a statement that does nothing!"""
         location = self.consume(";").loc
@@ -1251,9 +1260,13 @@ class CParser(RecursiveDescentParser):
 class DeclSpec:
     """Contains a type and a set of modifiers"""
 
-    def __init__(self, storage_class, typ):
+    def __init__(self, storage_class, typ, inline=False, attributes=()):
         self.storage_class = storage_class
         self.typ = typ  # The later determined type!
+        self.inline = inline
+        self.attributes = set()
+        for attribute in attributes:
+            self.attributes.update(attribute)
 
     def __repr__(self):
         return f"[decl-spec storage={self.storage_class}, type={self.typ}]"
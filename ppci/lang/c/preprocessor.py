@@ -939,8 +939,15 @@ class CPreProcessor:
     def handle_pragma_directive(self, directive_token):
         """Process `#pragma` directive."""
         # Pragma's must be handled, or ignored.
-        message = self.tokens_to_string(self.eat_line())
-        self.logger.warning("Ignoring pragma: %s", message)
+        line = self.eat_line()
+        message = self.tokens_to_string(line)
+        if line and line[0].val in ("unroll", "nounroll"):
+            # Loop pragmas are passed on to the parser:
+            yield CToken(
+                "PRAGMA", f"#pragma {message}", "", True, directive_token.loc
+            )
+        else:
+            self.logger.warning("Ignoring pragma: %s", message)
         new_line_token = CToken("WS", "", "", True, directive_token.loc)
         yield new_line_token
 
@@ -115,6 +115,14 @@ class CPrinter:
 
     def gen_statement(self, statement):
         """Render a single statement as text"""
+        if isinstance(statement, statements.Loop):
+            if statement.unroll == 0:
+                self._print("#pragma unroll")
+            elif statement.unroll == 1:
+                self._print("#pragma nounroll")
+            elif statement.unroll is not None:
+                self._print(f"#pragma unroll {statement.unroll}")
+
         if isinstance(statement, statements.Compound):
             self._print("{")
             with self._indented(1):
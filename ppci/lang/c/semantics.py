@@ -293,13 +293,22 @@ class CSemantics:
         return bool(self.compounds)
 
     def on_function_declaration(
-        self, storage_class, typ, name, modifiers, location
+        self,
+        storage_class,
+        typ,
+        name,
+        modifiers,
+        location,
+        inline=False,
+        attributes=(),
     ):
         """Handle function declaration"""
         typ = self.apply_type_modifiers(modifiers, typ)
         declaration = declarations.FunctionDeclaration(
             storage_class, typ, name, location
         )
+        declaration.inline = inline
+        declaration.attributes.update(attributes)
         self.register_declaration(declaration)
         return declaration
 
@@ -626,6 +635,26 @@ class CSemantics:
             condition = self.check_condition(condition)
         return statements.For(initial, condition, post, body, location)
 
+    def on_loop_pragma(self, pragma, statement, location):
+        """Apply an unroll pragma to the loop following it"""
+        if not isinstance(statement, statements.Loop):
+            self.error("Expected a loop after this pragma", location)
+        words = pragma.split()[1:]
+        if words == ["nounroll"]:
+            statement.unroll = 1
+        elif words == ["unroll"]:
+            statement.unroll = 0
+        elif (
+            len(words) == 2
+            and words[0] == "unroll"
+            and words[1].isdigit()
+            and int(words[1]) > 0
+        ):
+            statement.unroll = int(words[1])
+        else:
+            self.error(f"Invalid loop pragma: {pragma}", location)
+        return statement
+
     def on_return(self, value, location):
         """Check return statement"""
         return_type = self.current_function.typ.return_type
@@ -1,8 +1,14 @@
 from .clean import CleanPass
 from .constantfolding import ConstantFolder
 from .cse import CommonSubexpressionEliminationPass
+from .gvn import GlobalValueNumberingPass
+from .inline import InlinePass
+from .licm import LoopInvariantCodeMotionPass
 from .load_after_store import LoadAfterStorePass
 from .mem2reg import Mem2RegPromotor
+from .pipeline import PassManager, create_pipeline
+from .sccp import SparseConditionalConstantPropagationPass
+from .strength_reduction import StrengthReductionPass
 from .transform import (
     BlockPass,
     DeleteUnusedInstructionsPass,
@@ -11,17 +17,26 @@ from .transform import (
     ModulePass,
     RemoveAddZeroPass,
 )
+from .unroll import LoopUnrollPass
 
 __all__ = [
     "ModulePass",
     "FunctionPass",
     "BlockPass",
     "InstructionPass",
+    "PassManager",
+    "create_pipeline",
     "CleanPass",
     "CommonSubexpressionEliminationPass",
     "ConstantFolder",
     "DeleteUnusedInstructionsPass",
+    "GlobalValueNumberingPass",
+    "InlinePass",
     "LoadAfterStorePass",
+    "LoopInvariantCodeMotionPass",
+    "LoopUnrollPass",
     "Mem2RegPromotor",
     "RemoveAddZeroPass",
+    "SparseConditionalConstantPropagationPass",
+    "StrengthReductionPass",
 ]
@@ -5,9 +5,22 @@ from .transform import InstructionPass
 
 
 class CJumpPass(InstructionPass):
+    """Replace conditional jumps on two constants by a jump.
+
+    Only plain conditional jumps are folded. The predicated jumps derived
+    from it also set predicate registers, so they must stay.
+    """
+
+    def on_function(self, function):
+        changed = super().on_function(function)
+        if changed:
+            # The branches that are never taken may be unreachable now:
+            function.delete_unreachable()
+        return changed
+
     def on_instruction(self, instruction):
         if (
-            isinstance(instruction, ir.CJump)
+            type(instruction) is ir.CJump
             and isinstance(instruction.a, ir.Const)
             and isinstance(instruction.b, ir.Const)
         ):
@@ -22,10 +35,17 @@ class CJumpPass(InstructionPass):
                 "!=": operator.ne,
             }
             if mp[instruction.cond](a, b):
-                label = instruction.lab_yes
+                label, dropped = instruction.lab_yes, instruction.lab_no
             else:
-                label = instruction.lab_no
+                label, dropped = instruction.lab_no, instruction.lab_yes
             block = instruction.block
             block.remove_instruction(instruction)
             block.add_instruction(ir.Jump(label))
             instruction.delete()
+
+            # The block is no longer an incoming block of the dropped target
+            if dropped is not label:
+                for phi in dropped.phis:
+                    phi.del_incoming(block)
+            return True
+        return False
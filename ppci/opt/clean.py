@@ -25,8 +25,9 @@ class CleanPass(FunctionPass):
     """
 
     def on_function(self, function):
-        self.remove_empty_blocks(function)
-        self.remove_one_preds(function)
+        removed = self.remove_empty_blocks(function)
+        glued = self.remove_one_preds(function)
+        return removed > 0 or glued > 0
 
     def find_empty_blocks(self, function):
         """Look for all blocks containing only a jump in it"""
@@ -49,12 +50,17 @@ class CleanPass(FunctionPass):
             if block in predecessors:
                 continue
 
+            # A predecessor which also jumps to the target would come in
+            # twice, with the different values of the phis:
+            tgt = block.last_instruction.target
+            if tgt.phis and any(tgt in p.successors for p in predecessors):
+                continue
+
             # Update successor incoming blocks:
             for successor in successors:
                 successor.replace_incoming(block, predecessors)
 
             # Change the target of predecessors:
-            tgt = block.last_instruction.target
             for pred in predecessors:
                 pred.change_target(block, tgt)
 
@@ -64,6 +70,7 @@ class CleanPass(FunctionPass):
             stat += 1
         if stat > 0:
             self.logger.debug("Removed %s empty blocks", stat)
+        return stat
 
     def find_single_predecessor_block(self, function):
         """Find a block with a single predecessor"""
@@ -86,6 +93,7 @@ class CleanPass(FunctionPass):
 
     def remove_one_preds(self, function):
         """Remove basic blocks with only one predecessor"""
+        count = 0
         change = True
         while change:
             change = False
@@ -94,6 +102,8 @@ class CleanPass(FunctionPass):
                 (pred,) = block.predecessors  # Unpack 1 block
                 self.glue_blocks(pred, block)
                 change = True
+                count += 1
+        return count
 
     def glue_blocks(self, block1, block2):
         """Glue two blocks together into the first block"""
@@ -101,17 +111,24 @@ class CleanPass(FunctionPass):
             "Inserting %s at the end of %s", block2.name, block1.name
         )
 
+        # Phi nodes in block2 have a single incoming value, use it instead:
+        for phi in block2.phis:
+            phi.replace_by(phi.get_value(block1))
+            phi.remove_from_block()
+
         # Remove the last jump:
         last_jump = block1.last_instruction
         block1.remove_instruction(last_jump)
         last_jump.delete()
 
-        # Copy all instructions to block1:
-        for instruction in block2:
+        # Move all instructions to block1:
+        successors = block2.successors
+        for instruction in list(block2):
+            block2.remove_instruction(instruction)
             block1.add_instruction(instruction)
 
         # Replace incoming info:
-        for successor in block2.successors:
+        for successor in successors:
             successor.replace_incoming(block2, [block1])
 
         # Remove block from function:
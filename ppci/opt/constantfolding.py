@@ -32,6 +32,8 @@ def enhance(f):
 class ConstantFolder(BlockPass):
     """Try to fold common constant expressions"""
 
+    preserves_cfg = True
+
     def __init__(self):
         super().__init__()
         self.ops = {
@@ -136,3 +138,4 @@ class ConstantFolder(BlockPass):
                     count += 1
         if count > 0:
             self.logger.debug("Folded %i expressions", count)
+        return count > 0
@@ -7,6 +7,8 @@ class CommonSubexpressionEliminationPass(BlockPass):
     Replace common sub expressions (cse) with the previously defined one.
     """
 
+    preserves_cfg = True
+
     def on_block(self, block):
         ins_map = {}
         stats = 0
@@ -27,3 +29,4 @@ class CommonSubexpressionEliminationPass(BlockPass):
                 ins_map[k] = i
         if stats > 0:
             self.logger.debug("Replaced %i instructions", stats)
+        return stats > 0
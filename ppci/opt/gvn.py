@@ -0,0 +1,429 @@
+"""Global value numbering.
+
+Instructions computing the same value as an instruction in a dominating
+block are replaced by that instruction. The blocks are visited in
+dominator tree order, with a scoped table of the available values, so
+a value is reused in all blocks dominated by the block computing it.
+
+Loads are numbered too. A load is available until a store which may
+write the same memory, or a call with unknown side effects, kills it.
+A store makes the stored value available for loads of the same address.
+
+Blocks of SIMT code execute with a predicate mask, so a block dominating
+another block may have computed its values for fewer threads. Values are
+only reused in other blocks when they were computed under the root
+predicate, by all threads still running.
+
+Besides removing full redundancies, the pass hoists expressions that
+are computed in all successors of a branch into the branching block.
+Kernels compute the same thread id and address arithmetic in both arms
+of an if statement, and this computes it once before the branch.
+"""
+
+from .. import ir
+from .transform import FunctionPass
+
+# External functions without side effects. Their result depends on the
+# arguments, and on the thread executing them:
+PURE_BUILTINS = frozenset(
+    [
+        "sin",
+        "cos",
+        "isqrt",
+        "itof",
+        "ftoi",
+        "threadIdx",
+        "blockIdx",
+        "blockDim",
+        "argPtr",
+    ]
+)
+
+COMMUTATIVE = frozenset(["+", "*", "&", "|", "^", "==", "!="])
+
+# Size to assume for pointers, which is at most 8 bytes on all targets:
+POINTER_SIZE = 8
+
+
+def is_pure_call(instruction):
+    """Test if the instruction is a call to a builtin without side effects"""
+    return (
+        isinstance(instruction, ir.FunctionCall)
+        and isinstance(instruction.callee, ir.ExternalSubRoutine)
+        and instruction.callee.name in PURE_BUILTINS
+    )
+
+
+def clobbers_memory(instruction):
+    """Test if the instruction may write any memory location"""
+    if isinstance(instruction, ir.FunctionCall):
+        return not is_pure_call(instruction)
+    return isinstance(
+        instruction, (ir.ProcedureCall, ir.InlineAsm, ir.CopyBlob)
+    )
+
+
+def can_speculate(instruction):
+    """Test if the instruction can be executed when not needed"""
+    if isinstance(instruction, ir.Binop):
+        if instruction.operation in ("/", "%"):
+            # Do not introduce a division by zero:
+            divisor = instruction.b
+            return isinstance(divisor, ir.Const) and divisor.value != 0
+        return True
+    return isinstance(
+        instruction,
+        (ir.Const, ir.CompareSet, ir.Unop, ir.Cast, ir.AddressOf),
+    ) or is_pure_call(instruction)
+
+
+def split_address(address):
+    """Split an address into the object it points into, and an offset.
+
+    The object is an alloc or a global variable when known, otherwise the
+    address itself. The offset is None when it is not constant.
+    """
+    offset = 0
+    while isinstance(address, ir.Binop) and address.operation in ("+", "-"):
+        if isinstance(address.b, ir.Const):
+            if offset is not None:
+                if address.operation == "+":
+                    offset += address.b.value
+                else:
+                    offset -= address.b.value
+            address = address.a
+        elif address.operation == "+" and isinstance(address.a, ir.Const):
+            if offset is not None:
+                offset += address.a.value
+            address = address.b
+        else:
+            # Pointer arithmetic stays within the object pointed into, and
+            # the front-end places the pointer first:
+            offset = None
+            address = address.a
+
+    if isinstance(address, ir.AddressOf):
+        address = address.src
+    return address, offset
+
+
+def is_object(value):
+    """Test if the value is a memory object, distinct from all others"""
+    return isinstance(value, (ir.Alloc, ir.Variable))
+
+
+def access_size(ty):
+    return getattr(ty, "size", POINTER_SIZE)
+
+
+def may_alias(address1, ty1, address2, ty2):
+    """Test if two memory accesses may touch the same memory"""
+    base1, offset1 = split_address(address1)
+    base2, offset2 = split_address(address2)
+    if base1 is base2:
+        if offset1 is None or offset2 is None:
+            return True
+        starts_before_end2 = offset1 < offset2 + access_size(ty2)
+        starts_before_end1 = offset2 < offset1 + access_size(ty1)
+        return starts_before_end2 and starts_before_end1
+    else:
+        return not (is_object(base1) and is_object(base2))
+
+
+class GlobalValueNumberingPass(FunctionPass):
+    """Replace values computed before in a dominating block.
+
+    This handles constants, arithmetic, casts, comparisons, addresses,
+    loads and calls to builtins without side effects. Expressions that
+    are computed in all successors of a block are hoisted into the block.
+    """
+
+    preserves_cfg = True
+
+    def on_function(self, function):
+        self.analysis = function.analysis
+        self.expressions = {}
+        self.memory = {}
+        self.undo_log = []
+        self.replaced = 0
+        self.hoisted = 0
+
+        # Visit the dominator tree, and restore the tables of the parent
+        # when leaving a block:
+        worklist = [(function.entry, None)]
+        while worklist:
+            block, parent = worklist.pop()
+            if block is None:
+                self.restore(parent)
+                continue
+            worklist.append((None, len(self.undo_log)))
+            if parent is not None:
+                self.enter_block(block, parent)
+            self.number_block(block)
+            children = self.analysis.dominator_tree_children(block)
+            self.hoist_into(block, children)
+            worklist.extend((child, block) for child in reversed(children))
+
+        if self.replaced or self.hoisted:
+            self.logger.debug(
+                "Replaced %i instructions, hoisted %i",
+                self.replaced,
+                self.hoisted,
+            )
+        self.analysis = None
+        return bool(self.replaced or self.hoisted)
+
+    def set_value(self, table, key, value):
+        self.undo_log.append((table, key, table.get(key)))
+        table[key] = value
+
+    def del_value(self, table, key):
+        self.undo_log.append((table, key, table.pop(key)))
+
+    def restore(self, mark):
+        """Undo the changes to the tables made after the given mark"""
+        while len(self.undo_log) > mark:
+            table, key, old = self.undo_log.pop()
+            if old is None:
+                del table[key]
+            else:
+                table[key] = old
+
+    def enter_block(self, block, parent):
+        """Forget loads clobbered between the parent and this block.
+
+        All paths from the immediate dominator to the block pass only
+        the blocks which reach the block without passing the dominator.
+        """
+        visited = {parent}
+        worklist = list(block.predecessors)
+        while worklist and self.memory:
+            predecessor = worklist.pop()
+            if predecessor in visited:
+                continue
+            visited.add(predecessor)
+            for instruction in predecessor:
+                self.kill(instruction)
+            worklist.extend(predecessor.predecessors)
+
+    def kill(self, instruction):
+        """Forget the loads of memory written by the instruction"""
+        if isinstance(instruction, ir.Store):
+            for key in list(self.memory):
+                _, address, ty = key
+                if may_alias(
+                    instruction.address, instruction.value.ty, address, ty
+                ):
+                    self.del_value(self.memory, key)
+        elif clobbers_memory(instruction):
+            for key in list(self.memory):
+                self.del_value(self.memory, key)
+
+    def number_block(self, block):
+        """Replace instructions of which the value is already available"""
+        for instruction in block:
+            if isinstance(instruction, ir.Load):
+                if instruction.volatile:
+                    continue
+                table = self.memory
+                key = ("load", instruction.address, instruction.ty)
+            elif isinstance(instruction, ir.Store):
+                self.kill(instruction)
+                if not instruction.volatile:
+                    key = ("load", instruction.address, instruction.value.ty)
+                    self.set_value(
+                        self.memory, key, (instruction.value, instruction)
+                    )
+                continue
+            else:
+                self.kill(instruction)
+                table = self.expressions
+                key = self.make_key(instruction, self.value_key)
+                if key is None:
+                    continue
+
+            entry = table.get(key)
+            if entry is not None and self.is_reusable(entry[1], instruction):
+                instruction.replace_by(entry[0])
+                instruction.remove_from_block()
+                self.replaced += 1
+            else:
+                self.set_value(table, key, (instruction, instruction))
+
+    @staticmethod
+    def is_executed_for(source, instruction):
+        """Test if the source ran for all threads executing the instruction"""
+        if source.block is instruction.block:
+            return source.pred in (0, instruction.pred)
+        return source.pred == 0
+
+    def is_reusable(self, source, instruction):
+        """Test if the value of source can replace the instruction"""
+        if not self.is_executed_for(source, instruction):
+            return False
+
+        # Constants are cheaper to create again than to keep in a register:
+        return source.block is instruction.block or not isinstance(
+            source, ir.Const
+        )
+
+    def value_key(self, value):
+        """Number an operand, constants are numbered by their value"""
+        if isinstance(value, ir.Const):
+            return self.make_key(value, None)
+        return value
+
+    def make_key(self, instruction, number):
+        """Create the lookup key of the value the instruction computes.
+
+        The operands are looked up with the number function. Returns None
+        for instructions which are not numbered.
+        """
+        if isinstance(instruction, ir.Const):
+            value = instruction.value
+            # Keep 0.0 and -0.0, which compare equal, apart:
+            if isinstance(value, float):
+                value = value.hex()
+            return ("const", value, instruction.ty)
+        elif isinstance(instruction, ir.Binop):
+            a, b = number(instruction.a), number(instruction.b)
+            operation = instruction.operation
+            if operation in COMMUTATIVE:
+                operands = frozenset((a, b))
+            else:
+                operands = (a, b)
+            return ("binop", operation, operands, instruction.ty)
+        elif isinstance(instruction, ir.CompareSet):
+            a, b = number(instruction.a), number(instruction.b)
+            cond = instruction.cond
+            if cond in COMMUTATIVE:
+                operands = frozenset((a, b))
+            else:
+                operands = (a, b)
+            return ("compare", cond, operands, instruction.ty)
+        elif isinstance(instruction, ir.Unop):
+            return (
+                "unop",
+                instruction.operation,
+                number(instruction.a),
+                instruction.ty,
+            )
+        elif isinstance(instruction, ir.Cast):
+            return ("cast", number(instruction.src), instruction.ty)
+        elif isinstance(instruction, ir.AddressOf):
+            return ("address", number(instruction.src))
+        elif is_pure_call(instruction):
+            return (
+                "call",
+                instruction.callee,
+                tuple(map(number, instruction.arguments)),
+                instruction.ty,
+            )
+        else:
+            return None
+
+    def number_hoistable(self, block, numbers):
+        """Number the hoistable instructions in a block.
+
+        Returns the number of each instruction, and the first instruction
+        for each number.
+        """
+        local = {}
+        first = {}
+
+        def number(value):
+            if value in local:
+                return local[value]
+            return self.value_key(value)
+
+        for instruction in block:
+            if can_speculate(instruction):
+                key = self.make_key(instruction, number)
+                local[instruction] = numbers.setdefault(key, len(numbers))
+                first.setdefault(local[instruction], instruction)
+        return local, first
+
+    def is_available(self, value, terminator):
+        """Test if the value is defined for all threads at the terminator"""
+        if isinstance(value, ir.Instruction) and value.block is not None:
+            defining_block = value.block
+            return (
+                self.analysis.is_reachable(defining_block)
+                and self.analysis.dominates(defining_block, terminator.block)
+                and self.is_executed_for(value, terminator)
+            )
+        return True
+
+    def hoist_into(self, block, children):
+        """Hoist expressions computed in all successors into the block"""
+        successors = list(dict.fromkeys(block.successors))
+        if len(successors) < 2 or not all(s in children for s in successors):
+            return
+
+        # Number the hoistable instructions of the successors together, so
+        # that the same expression gets the same number in each of them:
+        numbers = {}
+        local_numbers = []
+        first_instructions = []
+        for successor in successors:
+            local, first = self.number_hoistable(successor, numbers)
+            local_numbers.append(local)
+            first_instructions.append(first)
+
+        common = set(first_instructions[0])
+        for first in first_instructions[1:]:
+            common.intersection_update(first)
+        if not common:
+            return
+
+        terminator = block.last_instruction
+        leaders = {}
+        local = local_numbers[0]
+        for instruction in list(successors[0]):
+            number = local.get(instruction)
+            if number not in common or number in leaders:
+                continue
+            if instruction is not first_instructions[0][number]:
+                continue
+
+            # All operands must be available in the block:
+            hoistable = True
+            for operand in list(instruction._operands) + list(
+                getattr(instruction, "arguments", ())
+            ):
+                if operand in local:
+                    if local[operand] in leaders:
+                        leader = leaders[local[operand]]
+                        if leader is not operand:
+                            instruction.replace_use(operand, leader)
+                    else:
+                        hoistable = False
+                elif not self.is_available(operand, terminator):
+                    hoistable = False
+            if not hoistable:
+                continue
+
+            # The value may already be available:
+            key = self.make_key(instruction, self.value_key)
+            entry = self.expressions.get(key)
+            if entry is None or not self.is_reusable(entry[1], terminator):
+                successors[0].remove_instruction(instruction)
+                instruction.pred = terminator.pred
+                block.insert_instruction(instruction, terminator)
+                self.set_value(
+                    self.expressions, key, (instruction, instruction)
+                )
+                leader = instruction
+                self.hoisted += 1
+            else:
+                leader = entry[0]
+                instruction.replace_by(leader)
+                instruction.remove_from_block()
+                self.replaced += 1
+            leaders[number] = leader
+
+            for first in first_instructions[1:]:
+                other = first[number]
+                other.replace_by(leader)
+                other.remove_from_block()
+                self.replaced += 1
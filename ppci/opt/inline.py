@@ -1,13 +1,471 @@
+"""Inline calls to small functions into their callers.
+
+A call costs more than the jump into the callee. The arguments are moved
+into place, the callee saves and restores registers, and on SIMT targets
+the caller saves and restores its predicate registers around the call.
+Inlining removes this overhead, and lets the optimizer specialize the
+callee for the arguments of the call.
+
+The functions of a module are visited bottom-up in the call graph, so a
+callee has received its own inlined calls before it is inlined itself.
+A cost model compares the size of the callee with the overhead of the
+call, and honours the inline hints given in the source.
+"""
+
 from .. import ir
+from ..graph.callgraph import mod_to_call_graph
+from ..irutils.builder import split_block
+from .transform import ModulePass
+
+# Instructions saved by not calling, besides one for each argument:
+CALL_COST = 12
+ARGUMENT_COST = 2
+
+# Constant arguments let the inlined code be folded further:
+CONSTANT_ARGUMENT_BONUS = 4
+
+# Net size increase allowed for a call, and for calls of functions which
+# are declared inline:
+INLINE_THRESHOLD = 25
+INLINE_HINT_THRESHOLD = 100
+
+# Stop inlining into functions when they have grown this large:
+MAX_CALLER_SIZE = 2000
+
+# The number of predicate registers of SIMT targets. This is the size of
+# the predicate register file of Twig, which is also the limit the C
+# front-end allocates against:
+NUM_PREDICATES = 32
+
+# The instructions which can be copied into a caller. Functions which
+# contain other instructions, such as jump tables, are not inlined:
+COPYABLE_INSTRUCTIONS = frozenset(
+    (
+        ir.Const,
+        ir.Binop,
+        ir.CompareSet,
+        ir.Unop,
+        ir.Cast,
+        ir.AddressOf,
+        ir.Undefined,
+        ir.LiteralData,
+        ir.Alloc,
+        ir.Load,
+        ir.Store,
+        ir.CopyBlob,
+        ir.FunctionCall,
+        ir.ProcedureCall,
+        ir.InlineAsm,
+        ir.Phi,
+        ir.PredicateAnnotation,
+        ir.Jump,
+        ir.CJump,
+        ir.SJump,
+        ir.PJump,
+        ir.BJump,
+        ir.Return,
+        ir.Exit,
+    )
+)
+
+
+def routine_size(function):
+    """Estimate the size of the code of a function"""
+    return sum(
+        1
+        for instruction in function.get_instructions()
+        if not isinstance(instruction, (ir.PredicateAnnotation, ir.Phi))
+    )
+
+
+def max_predicate(function):
+    """Get the highest predicate register number used in the function"""
+    highest = 0
+    for instruction in function.get_instructions():
+        highest = max(highest, instruction.pred)
+        if isinstance(instruction, ir.PredicateAnnotation):
+            highest = max(
+                highest, instruction.pred_reg, instruction.parent_pred_reg
+            )
+        elif isinstance(instruction, (ir.PJump, ir.BJump)):
+            highest = max(
+                highest, instruction.pred_yes_id, instruction.pred_no_id
+            )
+        elif isinstance(instruction, ir.SJump):
+            highest = max(highest, instruction.pred_yes_id)
+    return highest
+
+
+def is_predicated(function):
+    """Test if the function contains SIMT predicated code"""
+    return max_predicate(function) > 0
+
+
+def get_returns(function):
+    """Get the instructions which leave the function"""
+    return [
+        block.last_instruction
+        for block in function
+        if isinstance(block.last_instruction, (ir.Return, ir.Exit))
+    ]
+
+
+def can_inline(call, function, num_predicates=NUM_PREDICATES):
+    """Test if the function can be inlined at the given call"""
+    if not isinstance(function, ir.SubRoutine) or function.entry is None:
+        return False
+    if function is call.function:
+        return False
+    if len(call.arguments) != len(function.arguments):
+        return False
+
+    # Parameters passed by value are copied by the call:
+    if any(argument.ty.is_blob for argument in function.arguments):
+        return False
+
+    if any(
+        type(instruction) not in COPYABLE_INSTRUCTIONS
+        for instruction in function.get_instructions()
+    ):
+        return False
+
+    returns = get_returns(function)
+    if not returns:
+        return False
+
+    if is_predicated(function) or call.pred != 0:
+        # Threads leaving through an early return do not reconverge at
+        # the return point, so only the single return of a structured
+        # body can be turned into a jump:
+        if len(returns) > 1:
+            return False
+
+        # The predicate registers of the callee are renumbered after the
+        # ones of the caller:
+        base = max(max_predicate(call.function), call.pred)
+        if base + max_predicate(function) >= num_predicates:
+            return False
+
+    return True
+
+
+def inline_function(call, function):
+    """Replace the call instruction with the function implementation.
+
+    The blocks of the function are copied into the calling function, with
+    the parameters replaced by the arguments of the call. The block of
+    the call is split after the call, and the returns of the copy jump to
+    the second half. Returns the value of the call, if any.
+    """
+    caller = call.function
+    block, continuation = split_block(
+        call.block, pos=call.position + 1, newname=f"{function.name}_return"
+    )
+
+    # Predicates of the callee are placed after the ones of the caller,
+    # and the root predicate of the callee is the one active at the call:
+    base = max(max_predicate(caller), call.pred)
+
+    def map_pred(pred):
+        return call.pred if pred == 0 else base + pred
+
+    value_map = dict(zip(function.arguments, call.arguments))
+    block_map = {}
+    for original in function:
+        block_map[original] = caller.add_block(
+            ir.Block(f"{function.name}_{original.name}")
+        )
+        block_map[original].unroll = original.unroll
+
+    copies = []
+    results = []
+    for original, copy_block in block_map.items():
+        for instruction in original:
+            if isinstance(instruction, (ir.Return, ir.Exit)):
+                if isinstance(instruction, ir.Return):
+                    results.append((copy_block, instruction.result))
+                copy = ir.Jump(continuation)
+            else:
+                copy = copy_instruction(instruction, block_map, map_pred)
+            copy.pred = map_pred(instruction.pred)
+            if isinstance(copy, ir.Alloc):
+                # Stack slots are reserved at the start of the caller:
+                copy.pred = 0
+                caller.entry.insert_instruction(copy)
+            else:
+                copy_block.add_instruction(copy)
+            if isinstance(instruction, ir.Value):
+                value_map[instruction] = copy
+            copies.append(copy)
+
+    # Now that all values are copied, let the copies use each other:
+    for copy in copies:
+        for value in list(copy.uses):
+            if value in value_map:
+                copy.replace_use(value, value_map[value])
+
+    # Enter the copy instead of calling:
+    jump = block.last_instruction
+    jump.change_target(continuation, block_map[function.entry])
+    jump.pred = call.pred
+
+    # Pass the return value:
+    result = None
+    if len(results) == 1:
+        result = value_map.get(results[0][1], results[0][1])
+    elif results:
+        result = ir.Phi(f"{function.name}_result", function.return_ty)
+        result.pred = call.pred
+        for copy_block, value in results:
+            result.set_incoming(copy_block, value_map.get(value, value))
+        continuation.insert_instruction(result)
+
+    if isinstance(call, ir.FunctionCall):
+        call.replace_by(result)
+    call.remove_from_block()
+    return result
+
+
+def copy_instruction(instruction, block_map, map_pred):
+    """Create a copy of an instruction, using the same values.
+
+    Jump targets are taken from the block map, and predicate registers
+    are renumbered with the map_pred function. Only the instructions in
+    COPYABLE_INSTRUCTIONS are supported, which can_inline checks.
+    """
+    if isinstance(instruction, ir.Const):
+        return ir.Const(instruction.value, instruction.name, instruction.ty)
+    elif isinstance(instruction, ir.Binop):
+        return ir.Binop(
+            instruction.a,
+            instruction.operation,
+            instruction.b,
+            instruction.name,
+            instruction.ty,
+        )
+    elif isinstance(instruction, ir.CompareSet):
+        return ir.CompareSet(
+            instruction.a,
+            instruction.cond,
+            instruction.b,
+            instruction.name,
+            instruction.ty,
+        )
+    elif isinstance(instruction, ir.Unop):
+        return ir.Unop(
+            instruction.operation,
+            instruction.a,
+            instruction.name,
+            instruction.ty,
+        )
+    elif isinstance(instruction, ir.Cast):
+        return ir.Cast(instruction.src, instruction.name, instruction.ty)
+    elif isinstance(instruction, ir.AddressOf):
+        return ir.AddressOf(instruction.src, instruction.name)
+    elif isinstance(instruction, ir.Undefined):
+        return ir.Undefined(instruction.name, instruction.ty)
+    elif isinstance(instruction, ir.LiteralData):
+        return ir.LiteralData(instruction.data, instruction.name)
+    elif isinstance(instruction, ir.Alloc):
+        return ir.Alloc(
+            instruction.name, instruction.amount, instruction.alignment
+        )
+    elif isinstance(instruction, ir.Load):
+        return ir.Load(
+            instruction.address,
+            instruction.name,
+            instruction.ty,
+            volatile=instruction.volatile,
+        )
+    elif isinstance(instruction, ir.Store):
+        return ir.Store(
+            instruction.value,
+            instruction.address,
+            volatile=instruction.volatile,
+        )
+    elif isinstance(instruction, ir.CopyBlob):
+        return ir.CopyBlob(
+            instruction.dst, instruction.src, instruction.amount
+        )
+    elif isinstance(instruction, ir.FunctionCall):
+        return ir.FunctionCall(
+            instruction.callee,
+            list(instruction.arguments),
+            instruction.name,
+            instruction.ty,
+        )
+    elif isinstance(instruction, ir.ProcedureCall):
+        return ir.ProcedureCall(
+            instruction.callee, list(instruction.arguments)
+        )
+    elif isinstance(instruction, ir.InlineAsm):
+        copy = ir.InlineAsm(instruction.template, instruction.clobbers)
+        for value in instruction.input_values:
+            copy.add_input_variable(value)
+        for value in instruction.output_values:
+            copy.add_output_variable(value)
+        return copy
+    elif isinstance(instruction, ir.Phi):
+        copy = ir.Phi(instruction.name, instruction.ty)
+        for block, value in instruction.inputs.items():
+            copy.set_incoming(block_map[block], value)
+        return copy
+    elif isinstance(instruction, ir.PredicateAnnotation):
+        return ir.PredicateAnnotation(
+            map_pred(instruction.pred_reg),
+            instruction.pred_mask,
+            instruction.context_name,
+            map_pred(instruction.parent_pred_reg),
+        )
+    elif isinstance(instruction, ir.Jump):
+        return ir.Jump(block_map[instruction.target])
+    elif isinstance(instruction, ir.SJump):
+        return ir.SJump(
+            instruction.a,
+            instruction.cond,
+            instruction.b,
+            block_map[instruction.lab_yes],
+            map_pred(instruction.pred_yes_id),
+        )
+    elif isinstance(instruction, (ir.PJump, ir.BJump)):
+        return type(instruction)(
+            instruction.a,
+            instruction.cond,
+            instruction.b,
+            block_map[instruction.lab_yes],
+            block_map[instruction.lab_no],
+            map_pred(instruction.pred_yes_id),
+            map_pred(instruction.pred_no_id),
+            map_pred(instruction.pred),
+        )
+    elif isinstance(instruction, ir.CJump):
+        return ir.CJump(
+            instruction.a,
+            instruction.cond,
+            instruction.b,
+            block_map[instruction.lab_yes],
+            block_map[instruction.lab_no],
+        )
+    else:  # pragma: no cover
+        raise NotImplementedError(str(instruction))
+
+
+class InlinePass(ModulePass):
+    """Inline calls to functions when this is deemed beneficial.
+
+    Functions with the always inline hint are inlined where possible, and
+    functions with the never inline hint are not inlined. Other calls are
+    inlined when the callee is not much larger than the overhead of the
+    call. Functions declared inline get a larger budget. Local functions
+    of which all calls are inlined are removed from the module.
+
+    Args:
+        num_predicates: the number of predicate registers of the target.
+            Predicated calls are not inlined when the predicates of the
+            callee cannot be renumbered after the ones of the caller.
+    """
+
+    def __init__(self, num_predicates=NUM_PREDICATES):
+        super().__init__()
+        self.num_predicates = num_predicates
+
+    def run(self, ir_module):
+        call_graph = mod_to_call_graph(ir_module)
+        self.inlined = set()
+        self.sizes = {}
+        self.count = 0
+        for component in call_graph.strongly_connected_components():
+            # Recursive functions are not inlined into each other:
+            recursive = len(component) > 1 or any(
+                call_graph.has_edge(
+                    call_graph.get_node(routine), call_graph.get_node(routine)
+                )
+                for routine in component
+            )
+            for function in component:
+                if isinstance(function, ir.SubRoutine):
+                    self.inline_calls(function, component if recursive else ())
+
+        if self.count:
+            self.logger.debug("Inlined %i calls", self.count)
+            self.remove_unused(ir_module)
+        return bool(self.count)
+
+    def inline_calls(self, function, recursive):
+        """Inline the calls in the function to other functions"""
+        changed = False
+        for call in function.get_out_calls():
+            callee = call.callee
+            if callee in recursive:
+                continue
+            if not can_inline(call, callee, self.num_predicates):
+                continue
+            if not self.should_inline(call, callee):
+                continue
+            self.logger.debug(
+                "Inlining %s into %s", callee.name, function.name
+            )
+            inline_function(call, callee)
+            self.inlined.add(callee)
+            self.count += 1
+            self.sizes.pop(function, None)
+            changed = True
+
+        if changed:
+            function.analysis.invalidate()
+
+    def size(self, function):
+        if function not in self.sizes:
+            self.sizes[function] = routine_size(function)
+        return self.sizes[function]
+
+    def should_inline(self, call, callee):
+        """The cost model, decide if inlining the call is worth it"""
+        hint = callee.inline_hint
+        if hint == ir.InlineHint.NEVER:
+            return False
+        elif hint == ir.InlineHint.ALWAYS:
+            return True
+
+        size = self.size(callee)
+        if self.size(call.function) + size > MAX_CALLER_SIZE:
+            return False
+
+        cost = size - CALL_COST - ARGUMENT_COST * len(call.arguments)
+        cost -= CONSTANT_ARGUMENT_BONUS * sum(
+            isinstance(argument, ir.Const) for argument in call.arguments
+        )
 
+        # The only call of a local function, which can be removed:
+        if callee.binding == ir.Binding.LOCAL and callee.use_count == 1:
+            cost -= size
 
-def inline_function(call: ir.ProcedureCall, function: ir.SubRoutine):
-    """Replace the call instruction with the function implementation"""
-    dst_function = call.function
-    for block in function:
-        block_copy = block.copy
-        dst_function.add_block(block_copy)
+        if hint == ir.InlineHint.INLINE:
+            return cost <= INLINE_HINT_THRESHOLD
+        return cost <= INLINE_THRESHOLD
 
-    # TODO: implement function inlining.
-    # for value, parameter in zip(call.arguments, function.arguments):
-    #    block
+    def remove_unused(self, ir_module):
+        """Remove local functions which are no longer called"""
+        referenced = {
+            part[1]
+            for variable in ir_module.variables
+            if variable.value
+            for part in variable.value
+            if isinstance(part, tuple)
+        }
+        changed = True
+        while changed:
+            changed = False
+            for function in list(ir_module.functions):
+                if (
+                    function in self.inlined
+                    and function.binding == ir.Binding.LOCAL
+                    and not function.is_used
+                    and function.name not in referenced
+                ):
+                    self.logger.debug("Removing %s", function.name)
+                    for block in function:
+                        for instruction in block:
+                            instruction.delete()
+                    ir_module.remove_function(function)
+                    changed = True
@@ -0,0 +1,172 @@
+"""Loop invariant code motion.
+
+Instructions in a loop that compute the same value on every iteration
+are moved into the preheader of the loop, the block through which the
+loop is entered, so that they are computed once. Kernels load their
+arguments and scale thread ids into addresses inside loops, and the
+invariant part of that work moves out of the loop.
+
+Blocks of SIMT code execute with a predicate mask. An if statement in a
+loop body is a divergent region, which runs for the threads taking the
+branch only. Instructions are only hoisted from the blocks that run on
+every iteration of the loop, never out of a divergent region. In the
+SIMT layout the then arm of a BJump falls through into the else arm, so
+the else arm dominates the rest of the loop body although it runs under
+a predicate of its own. Blocks with instructions under the predicate of
+a BJump arm in the loop are therefore skipped as well. A hoisted
+instruction runs under the predicate of the preheader, for all threads
+entering the loop, so it may run for threads that never needed it. Only
+instructions without side effects that cannot trap are hoisted.
+
+Loads are hoisted from the loop header only, which runs for the same
+threads as the preheader, and only when no store or call in the loop may
+write the loaded memory.
+"""
+
+from .. import ir
+from .gvn import can_speculate, clobbers_memory, may_alias
+from .transform import FunctionPass
+
+
+class LoopInvariantCodeMotionPass(FunctionPass):
+    """Move loop invariant computations out of loops.
+
+    Inner loops are handled before outer loops, so that values invariant
+    in both loops move out of both.
+    """
+
+    preserves_cfg = True
+
+    def on_function(self, function):
+        self.analysis = function.analysis
+        hoisted = 0
+        for loop in reversed(self.analysis.loops):
+            hoisted += self.hoist_loop(loop)
+
+        if hoisted:
+            self.logger.debug(
+                "Hoisted %i instructions out of loops in %s",
+                hoisted,
+                function.name,
+            )
+        self.analysis = None
+        return bool(hoisted)
+
+    def hoist_loop(self, loop):
+        """Hoist the invariant instructions of a loop into its preheader"""
+        preheader = self.analysis.loop_preheader(loop)
+        if preheader is None:
+            return 0
+
+        body = {loop.header}
+        body.update(loop.rest)
+        terminator = preheader.last_instruction
+        arm_predicates = self.arm_predicates(body)
+        hoisted = 0
+        for block in self.blocks_run_every_iteration(loop, body):
+            if any(
+                instruction.pred in arm_predicates for instruction in block
+            ):
+                continue
+            for instruction in block:
+                if self.is_invariant(instruction, body) and self.can_hoist(
+                    instruction, loop, body, terminator
+                ):
+                    self.hoist(instruction, body, terminator)
+                    hoisted += 1
+        return hoisted
+
+    def blocks_run_every_iteration(self, loop, body):
+        """Get the blocks of the loop that run on every iteration.
+
+        These are the blocks dominating all back edges, which form a chain
+        in the dominator tree starting at the header.
+        """
+        latches = [p for p in loop.header.predecessors if p in body]
+        block = loop.header
+        while block is not None:
+            yield block
+            block = next(
+                (
+                    child
+                    for child in self.analysis.dominator_tree_children(block)
+                    if child in body
+                    and all(
+                        self.analysis.dominates(child, latch)
+                        for latch in latches
+                    )
+                ),
+                None,
+            )
+
+    @staticmethod
+    def arm_predicates(body):
+        """Get the predicates of the BJump arms in the loop"""
+        predicates = set()
+        for block in body:
+            jump = block.last_instruction
+            if isinstance(jump, ir.BJump):
+                predicates.update((jump.pred_yes_id, jump.pred_no_id))
+        return predicates
+
+    @staticmethod
+    def is_loop_value(value, body):
+        """Test if the value is computed in the loop"""
+        return (
+            isinstance(value, ir.Instruction)
+            and not isinstance(value, ir.Const)
+            and value.block in body
+        )
+
+    def is_invariant(self, instruction, body):
+        """Test if the instruction computes the same value each iteration"""
+        if isinstance(instruction, (ir.Const, ir.Phi)):
+            return False
+        if not isinstance(instruction, ir.Value) or not instruction.is_used:
+            return False
+        return not any(
+            self.is_loop_value(value, body) for value in instruction.uses
+        )
+
+    def can_hoist(self, instruction, loop, body, terminator):
+        """Test if the instruction can be moved to the preheader"""
+        if isinstance(instruction, ir.Load):
+            return (
+                not instruction.volatile
+                and instruction.block is loop.header
+                and instruction.pred == terminator.pred
+                and not self.is_written_in_loop(instruction, body)
+            )
+        return can_speculate(instruction)
+
+    @staticmethod
+    def is_written_in_loop(load, body):
+        """Test if the loop may write the memory the load reads"""
+        for block in body:
+            for instruction in block:
+                if clobbers_memory(instruction):
+                    return True
+                if isinstance(instruction, ir.Store) and may_alias(
+                    instruction.address,
+                    instruction.value.ty,
+                    load.address,
+                    load.ty,
+                ):
+                    return True
+        return False
+
+    def hoist(self, instruction, body, terminator):
+        """Move the instruction in front of the preheader terminator"""
+        preheader = terminator.block
+
+        # Constants are not shared between blocks, create them again:
+        for value in list(instruction.uses):
+            if isinstance(value, ir.Const) and value.block in body:
+                constant = ir.Const(value.value, value.name, value.ty)
+                constant.pred = terminator.pred
+                preheader.insert_instruction(constant, terminator)
+                instruction.replace_use(value, constant)
+
+        instruction.block.remove_instruction(instruction)
+        instruction.pred = terminator.pred
+        preheader.insert_instruction(instruction, terminator)
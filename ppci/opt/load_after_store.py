@@ -19,15 +19,14 @@ class LoadAfterStorePass(BlockPass):
         c = a + 2
     """
 
+    preserves_cfg = True
+
     def find_store_backwards(
         self, i, ty, stop_on=(ir.FunctionCall, ir.ProcedureCall, ir.Store)
     ):
         """Go back from this instruction to beginning"""
-        block = i.block
-        instructions = block.instructions
-        pos = instructions.index(i)
-        for x in range(pos - 1, 0, -1):
-            i2 = instructions[x]
+        i2 = i.previous_instruction
+        while i2 is not None:
             if isinstance(i2, ir.Store) and ty is i2.value.ty:
                 # Got first store!
                 if i2.address is i.address:
@@ -37,11 +36,13 @@ class LoadAfterStorePass(BlockPass):
             elif isinstance(i2, stop_on):
                 # A call can change memory, store not found..
                 return None
+            i2 = i2.previous_instruction
         return None
 
     def on_block(self, block):
-        self.replace_load_after_store(block)
-        self.remove_redundant_stores(block)
+        replaced = self.replace_load_after_store(block)
+        removed = self.remove_redundant_stores(block)
+        return replaced > 0 or removed > 0
 
     def replace_load_after_store(self, block):
         """Replace load after store with the value of the store"""
@@ -65,6 +66,7 @@ class LoadAfterStorePass(BlockPass):
                 # reload of instructions required?
         if count > 0:
             self.logger.debug("Replaced %s loads after store", count)
+        return count
 
     def remove_redundant_stores(self, block):
         """From two stores to the same address remove the previous one"""
@@ -83,6 +85,8 @@ class LoadAfterStorePass(BlockPass):
             )
             if store_prev is not None and not store_prev.volatile:
                 store_prev.remove_from_block()
+                count += 1
 
         if count > 0:
             self.logger.debug("Replaced %s redundant stores", count)
+        return count
@@ -5,7 +5,6 @@ also be stored into a register, to improve performance.
 """
 
 from .. import ir
-from ..graph.domtree import CfgInfo
 from .transform import FunctionPass
 
 
@@ -58,6 +57,8 @@ class Mem2RegPromotor(FunctionPass):
     """Tries to find alloc instructions only used by load and store
     instructions and replace them with values and phi nodes"""
 
+    preserves_cfg = True
+
     def place_phi_nodes(self, stores, phi_ty, name, cfg_info):
         """
         Step 1: place phi-functions where required:
@@ -94,6 +95,7 @@ class Mem2RegPromotor(FunctionPass):
         statements
         """
         stack = [initial_value]
+        phi_set, load_set, store_set = set(phis), set(loads), set(stores)
 
         def search(tree_node):
             # Get the cfg node and block from the dominator tree node
@@ -106,15 +108,15 @@ class Mem2RegPromotor(FunctionPass):
             # Crawl down block:
             defs = 0
             for instruction in block:
-                if instruction in phis:
+                if instruction in phi_set:
                     stack.append(instruction)
                     defs += 1
 
-                if instruction in stores:
+                if instruction in store_set:
                     stack.append(instruction.value)
                     defs += 1
 
-                if instruction in loads:
+                if instruction in load_set:
                     # Replace all uses of a with cur_V
                     instruction.replace_by(stack[-1])
                     alloc = instruction.address
@@ -216,9 +218,12 @@ class Mem2RegPromotor(FunctionPass):
         alloc.remove_from_block()
 
     def on_function(self, function):
-        cfg_info = CfgInfo(function)
+        cfg_info = function.analysis.cfg_info
+        changed = False
         for block in function.blocks:
             allocs = [i for i in block if isinstance(i, ir.Alloc)]
             for alloc in allocs:
                 if is_alloc_promotable(alloc):
                     self.promote(alloc, cfg_info)
+                    changed = True
+        return changed
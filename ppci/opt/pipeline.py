@@ -0,0 +1,239 @@
+"""Run optimization passes until they no longer change the code.
+
+The passes of a pipeline run in order over every function. A pass that
+changed a function may have created work for other passes, so those are
+scheduled again, for that function only. Which passes are worth
+rerunning is described by the :data:`ENABLES` table. Passes that are not
+in the table schedule all passes of the pipeline again.
+"""
+
+import logging
+
+from .. import ir
+from .cjmp import CJumpPass
+from .clean import CleanPass
+from .constantfolding import ConstantFolder
+from .cse import CommonSubexpressionEliminationPass
+from .gvn import GlobalValueNumberingPass
+from .licm import LoopInvariantCodeMotionPass
+from .load_after_store import LoadAfterStorePass
+from .mem2reg import Mem2RegPromotor
+from .sccp import SparseConditionalConstantPropagationPass
+from .strength_reduction import StrengthReductionPass
+from .tailcall import TailCallOptimization
+from .transform import (
+    DeleteUnusedInstructionsPass,
+    FunctionPass,
+    RemoveAddZeroPass,
+)
+from .unroll import LoopUnrollPass
+
+# For each pass, the passes that can find new work after it changed code:
+ENABLES = {
+    RemoveAddZeroPass: (
+        ConstantFolder,
+        CommonSubexpressionEliminationPass,
+        GlobalValueNumberingPass,
+        LoopInvariantCodeMotionPass,
+        StrengthReductionPass,
+        CJumpPass,
+        DeleteUnusedInstructionsPass,
+    ),
+    ConstantFolder: (
+        RemoveAddZeroPass,
+        ConstantFolder,
+        CommonSubexpressionEliminationPass,
+        GlobalValueNumberingPass,
+        LoopInvariantCodeMotionPass,
+        StrengthReductionPass,
+        CJumpPass,
+        DeleteUnusedInstructionsPass,
+    ),
+    CommonSubexpressionEliminationPass: (
+        LoadAfterStorePass,
+        DeleteUnusedInstructionsPass,
+    ),
+    GlobalValueNumberingPass: (
+        LoopInvariantCodeMotionPass,
+        LoadAfterStorePass,
+        DeleteUnusedInstructionsPass,
+    ),
+    LoopInvariantCodeMotionPass: (
+        ConstantFolder,
+        GlobalValueNumberingPass,
+        StrengthReductionPass,
+        LoopUnrollPass,
+        DeleteUnusedInstructionsPass,
+    ),
+    StrengthReductionPass: (
+        RemoveAddZeroPass,
+        ConstantFolder,
+        GlobalValueNumberingPass,
+        LoopUnrollPass,
+        DeleteUnusedInstructionsPass,
+    ),
+    LoopUnrollPass: (
+        ConstantFolder,
+        GlobalValueNumberingPass,
+        LoadAfterStorePass,
+        DeleteUnusedInstructionsPass,
+    ),
+    SparseConditionalConstantPropagationPass: (
+        RemoveAddZeroPass,
+        ConstantFolder,
+        GlobalValueNumberingPass,
+        LoopInvariantCodeMotionPass,
+        StrengthReductionPass,
+        LoopUnrollPass,
+        DeleteUnusedInstructionsPass,
+        CleanPass,
+    ),
+    LoadAfterStorePass: (
+        SparseConditionalConstantPropagationPass,
+        RemoveAddZeroPass,
+        ConstantFolder,
+        CommonSubexpressionEliminationPass,
+        GlobalValueNumberingPass,
+        LoopInvariantCodeMotionPass,
+        LoadAfterStorePass,
+        CJumpPass,
+        DeleteUnusedInstructionsPass,
+    ),
+    CJumpPass: (CleanPass, DeleteUnusedInstructionsPass),
+    DeleteUnusedInstructionsPass: (
+        Mem2RegPromotor,
+        LoadAfterStorePass,
+        CleanPass,
+    ),
+    CleanPass: (
+        CommonSubexpressionEliminationPass,
+        GlobalValueNumberingPass,
+        LoopInvariantCodeMotionPass,
+        StrengthReductionPass,
+        LoopUnrollPass,
+        TailCallOptimization,
+        LoadAfterStorePass,
+    ),
+}
+
+
+def create_pipeline(level, unroll_factor=None):
+    """Create the list of passes for the given optimization level.
+
+    - 1: cheap cleanups, promote memory to registers and fold constants.
+    - 2: all passes, including the loop optimizations.
+    - s: all passes that do not grow the code.
+
+    Loops are unrolled by unroll_factor at level 2, or by the default
+    factor of :class:`~ppci.opt.LoopUnrollPass` when it is None.
+    """
+    level = str(level)
+    if level == "0":
+        return []
+    elif level == "1":
+        return [
+            Mem2RegPromotor(),
+            RemoveAddZeroPass(),
+            ConstantFolder(),
+            DeleteUnusedInstructionsPass(),
+            CleanPass(),
+        ]
+    elif level in ("2", "s"):
+        passes = [
+            Mem2RegPromotor(),
+            SparseConditionalConstantPropagationPass(),
+            RemoveAddZeroPass(),
+            ConstantFolder(),
+            GlobalValueNumberingPass(),
+        ]
+        if level == "2":
+            passes += [
+                LoopInvariantCodeMotionPass(),
+                StrengthReductionPass(),
+                LoopUnrollPass(unroll_factor),
+            ]
+        passes += [
+            TailCallOptimization(),
+            LoadAfterStorePass(),
+            CJumpPass(),
+            DeleteUnusedInstructionsPass(),
+            CleanPass(),
+        ]
+        return passes
+    else:  # pragma: no cover
+        raise ValueError(f"Invalid optimization level {level}")
+
+
+class PassManager:
+    """Run function passes over a module until a fixpoint is reached.
+
+    Args:
+        passes: the function passes to run, in order.
+        enables: table of which passes to rerun after a pass changed code.
+        max_rounds: limit on the number of rounds over a single function.
+    """
+
+    logger = logging.getLogger("passmanager")
+
+    def __init__(self, passes, enables=ENABLES, max_rounds=10):
+        for opt_pass in passes:
+            if not isinstance(opt_pass, FunctionPass):
+                raise TypeError(f"{opt_pass} is not a function pass")
+        self.passes = passes
+        self.max_rounds = max_rounds
+        self.invocations = 0
+
+        # Translate the table into pass indices:
+        everything = set(range(len(passes)))
+        self._enables = []
+        for opt_pass in passes:
+            if type(opt_pass) in enables:
+                enabled = enables[type(opt_pass)]
+                self._enables.append(
+                    {
+                        index
+                        for index, other in enumerate(passes)
+                        if isinstance(other, enabled)
+                    }
+                )
+            else:
+                self._enables.append(everything)
+
+    def run(self, ir_module: ir.Module):
+        """Optimize all functions in the module, returns whether it changed"""
+        for opt_pass in self.passes:
+            opt_pass.prepare()
+            opt_pass.debug_db = ir_module.debug_db
+
+        changed = False
+        for function in ir_module.functions:
+            # The function may have been changed since it was analyzed:
+            function.analysis.invalidate()
+            if self.run_on_function(function):
+                changed = True
+
+        for opt_pass in self.passes:
+            opt_pass.debug_db = None
+        return changed
+
+    def run_on_function(self, function: ir.SubRoutine):
+        """Optimize a single function, returns whether it changed"""
+        pending = set(range(len(self.passes)))
+        changed = False
+        rounds = 0
+        while pending and rounds < self.max_rounds:
+            rounds += 1
+            for index, opt_pass in enumerate(self.passes):
+                if index not in pending:
+                    continue
+                pending.discard(index)
+                self.invocations += 1
+                if opt_pass.run_on_function(function):
+                    changed = True
+                    pending.update(self._enables[index])
+
+        if pending:
+            self.logger.warning(
+                "No fixpoint for %s after %s rounds", function.name, rounds
+            )
+        return changed
@@ -0,0 +1,512 @@
+"""Sparse conditional constant propagation.
+
+Constants are propagated over the SSA graph, along the control flow edges
+that can be taken only. A phi merges the values of its executable
+incoming edges, so a variable assigned in a branch that is never taken
+does not spoil the constant assigned on the other path. Instructions
+found constant are replaced by a constant, conditional jumps on a
+constant condition by a jump, and the blocks no longer reached are
+deleted.
+
+In SIMT code, both arms of an if statement run in turn, each under its
+own predicate. The ``bjmp`` sets the predicates of the arms and continues
+with the then arm, which jumps to the else arm if there is one. When the
+condition is constant, one arm runs for all threads of the parent
+predicate, and the other for none. The first arm is changed to run under
+the parent predicate, and the second is removed, together with the
+``bjmp`` setting the predicates.
+
+A loop header tests the loop condition with a ``sjmp``, which always
+enters the body. If the condition is false on entry, the body runs for
+no thread, and the header jumps to the exit of the loop instead.
+"""
+
+import operator
+
+from .. import ir
+from .constantfolding import cast, correct
+from .transform import FunctionPass
+
+# Lattice value of an instruction that is not a constant. Instructions
+# without a lattice value are not known to be executed yet:
+OVERDEFINED = object()
+
+OPERATIONS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "&": operator.and_,
+    "|": operator.or_,
+    "^": operator.xor,
+    "<<": operator.lshift,
+    ">>": operator.rshift,
+}
+
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+
+def meet(one, other):
+    """Combine the lattice values of two incoming edges"""
+    if one is None:
+        return other
+    if other is None:
+        return one
+    # Compare the representations, to keep 0 and 0.0 or -0.0 apart:
+    if one is not OVERDEFINED and repr(one) == repr(other):
+        return one
+    return OVERDEFINED
+
+
+class SparseConditionalConstantPropagationPass(FunctionPass):
+    """Propagate constants along the executable paths of a function.
+
+    Conditional jumps on a constant condition are replaced by jumps, and
+    the arms of SIMT branches that run for no thread are removed.
+    """
+
+    def on_function(self, function):
+        self.values = {}
+        self.edges = set()
+        self.executable = {function.entry}
+        self.exits = self.find_loop_exits(function)
+        self.propagate(function)
+
+        replaced = self.replace_constants(function)
+        analysis = function.analysis
+        plans = []
+        for block in function:
+            if block in self.executable:
+                plan = self.plan_jump(block.last_instruction, analysis)
+                if plan is not None:
+                    plans.append(plan)
+        for apply, *args in plans:
+            apply(*args)
+        if plans:
+            function.delete_unreachable()
+
+        if replaced or plans:
+            self.logger.debug(
+                "Propagated %i constants, resolved %i jumps",
+                replaced,
+                len(plans),
+            )
+        self.values = self.edges = self.executable = self.exits = None
+        return bool(replaced or plans)
+
+    @staticmethod
+    def find_loop_exits(function):
+        """Find the block reached when leaving the loop of each header.
+
+        The body of a loop jumps back to the header with a ``pjmp``, its
+        other target is the exit of the loop. Only exits without phis are
+        used, which can be reached from the header directly.
+        """
+        exits = {}
+        for block in function:
+            jump = block.last_instruction
+            if isinstance(jump, ir.PJump):
+                exits.setdefault(jump.lab_yes, []).append(jump.lab_no)
+        return {
+            header: targets[0]
+            for header, targets in exits.items()
+            if len(targets) == 1 and not targets[0].phis
+        }
+
+    def propagate(self, function):
+        """Find the lattice values and the executable edges"""
+        self.block_worklist = [function.entry]
+        self.instruction_worklist = []
+        while self.block_worklist or self.instruction_worklist:
+            while self.block_worklist:
+                for instruction in self.block_worklist.pop():
+                    self.visit(instruction)
+            while self.instruction_worklist:
+                instruction = self.instruction_worklist.pop()
+                if instruction.block in self.executable:
+                    self.visit(instruction)
+
+    def visit(self, instruction):
+        if isinstance(instruction, ir.FinalInstruction):
+            for target in self.taken_targets(instruction):
+                self.mark_edge(instruction.block, target)
+        elif isinstance(instruction, ir.Value):
+            # Values only go down the lattice, from not executed to a
+            # constant to overdefined:
+            value = self.evaluate(instruction)
+            old = self.values.get(instruction)
+            if value is not None and (
+                old is None or (value is OVERDEFINED) != (old is OVERDEFINED)
+            ):
+                self.values[instruction] = value
+                self.instruction_worklist.extend(instruction.used_by)
+
+    def mark_edge(self, source, target):
+        edge = (source, target)
+        if edge in self.edges:
+            return
+        self.edges.add(edge)
+        if target in self.executable:
+            # Merge the values of the new edge into the phis:
+            self.instruction_worklist.extend(target.phis)
+        else:
+            self.executable.add(target)
+            self.block_worklist.append(target)
+
+    def lookup(self, value):
+        """Get the lattice value of an operand"""
+        if isinstance(value, ir.Const):
+            return self.evaluate(value)
+        elif isinstance(value, ir.Instruction) and not isinstance(
+            value, ir.Parameter
+        ):
+            return self.values.get(value)
+        else:
+            # Parameters and global values:
+            return OVERDEFINED
+
+    def evaluate(self, instruction):
+        """Determine the lattice value of an instruction from its operands"""
+        if isinstance(instruction, ir.Const):
+            if instruction.ty.is_integer and isinstance(
+                instruction.value, int
+            ):
+                return correct(instruction.value, instruction.ty)
+            elif isinstance(instruction.value, (int, float)):
+                return instruction.value
+            return OVERDEFINED
+        elif isinstance(instruction, ir.Phi):
+            value = None
+            for block, incoming in instruction.inputs.items():
+                if (block, instruction.block) in self.edges:
+                    value = meet(value, self.lookup(incoming))
+            return value
+        elif isinstance(instruction, ir.Binop):
+            if not (
+                instruction.ty.is_integer
+                and instruction.operation in OPERATIONS
+            ):
+                return OVERDEFINED
+            a, b = self.lookup(instruction.a), self.lookup(instruction.b)
+            if OVERDEFINED in (a, b):
+                return OVERDEFINED
+            elif a is None or b is None:
+                return None
+            if instruction.operation in ("<<", ">>") and not (
+                0 <= b < instruction.ty.bits
+            ):
+                return OVERDEFINED
+            operation = OPERATIONS[instruction.operation]
+            return correct(operation(a, b), instruction.ty)
+        elif isinstance(instruction, ir.Unop):
+            a = self.lookup(instruction.a)
+            if not instruction.ty.is_integer:
+                return OVERDEFINED
+            elif a is None or a is OVERDEFINED:
+                return a
+            elif instruction.operation == "-":
+                return correct(-a, instruction.ty)
+            else:
+                return correct(~a, instruction.ty)
+        elif isinstance(instruction, ir.Cast):
+            src = self.lookup(instruction.src)
+            if src is None or src is OVERDEFINED:
+                return src
+            try:
+                value = cast(src, instruction.ty)
+            except (ValueError, OverflowError):
+                # Infinity or not a number converted to an integer:
+                return OVERDEFINED
+            if isinstance(instruction.ty, ir.FloatingPointTyp):
+                value = float(value)
+            return value
+        else:
+            return OVERDEFINED
+
+    def condition(self, jump):
+        """Evaluate the condition of a conditional jump"""
+        a, b = self.lookup(jump.a), self.lookup(jump.b)
+        if OVERDEFINED in (a, b):
+            return OVERDEFINED
+        elif a is None or b is None:
+            return None
+        return COMPARISONS[jump.cond](a, b)
+
+    def taken_targets(self, jump):
+        """Get the targets of a jump that can be taken"""
+        if isinstance(jump, ir.PJump):
+            # Loops are left when no thread is left, which is not known:
+            return jump.targets
+        elif isinstance(jump, ir.SJump):
+            condition = self.condition(jump)
+            if condition is None:
+                return []
+            elif condition is False and jump.block in self.exits:
+                return [self.exits[jump.block]]
+            return [jump.lab_yes]
+        elif isinstance(jump, ir.CJump):
+            # Plain conditional jumps, and branches in SIMT code:
+            condition = self.condition(jump)
+            if condition is None:
+                return []
+            elif condition is OVERDEFINED:
+                return [jump.lab_yes, jump.lab_no]
+            return [jump.lab_yes if condition else jump.lab_no]
+        else:
+            return jump.targets
+
+    def replace_constants(self, function):
+        """Replace the instructions with a constant value by constants"""
+        count = 0
+        for block in function:
+            if block not in self.executable:
+                continue
+            for instruction in list(block):
+                value = self.values.get(instruction)
+                if (
+                    value is None
+                    or value is OVERDEFINED
+                    or isinstance(instruction, ir.Const)
+                    or not instruction.used_by
+                ):
+                    continue
+                constant = ir.Const(value, instruction.name, instruction.ty)
+                constant.pred = instruction.pred
+                if isinstance(instruction, ir.Phi):
+                    before = next(i for i in block if not i.is_phi)
+                else:
+                    before = instruction
+                block.insert_instruction(constant, before)
+                instruction.replace_by(constant)
+                count += 1
+        return count
+
+    def plan_jump(self, jump, analysis):
+        """Find out how to resolve a jump on a constant condition.
+
+        The control flow graph is analyzed for all jumps before changing
+        it. Returns the method to resolve the jump with its arguments, or
+        None when the jump stays.
+        """
+        if isinstance(jump, ir.PJump):
+            return None
+        elif isinstance(jump, ir.SJump):
+            if self.condition(jump) is False and jump.block in self.exits:
+                return self.plan_loop(jump, analysis)
+        elif isinstance(jump, ir.CJump) and jump.lab_yes is not jump.lab_no:
+            condition = self.condition(jump)
+            if condition is None or condition is OVERDEFINED:
+                return None
+            elif isinstance(jump, ir.BJump):
+                return self.plan_branch(jump, condition, analysis)
+            elif condition:
+                return self.resolve_jump, jump, jump.lab_yes, jump.lab_no
+            else:
+                return self.resolve_jump, jump, jump.lab_no, jump.lab_yes
+        return None
+
+    def resolve_jump(self, jump, target, dropped):
+        """Replace a conditional jump by a jump to one of its targets"""
+        for phi in dropped.phis:
+            phi.del_incoming(jump.block)
+        self.replace_jump(jump, target)
+
+    @staticmethod
+    def replace_jump(jump, target):
+        block = jump.block
+        block.remove_instruction(jump)
+        jump.delete()
+        block.add_instruction(ir.Jump(target))
+
+    def plan_loop(self, jump, analysis):
+        """Skip a loop whose body runs for no thread.
+
+        After a loop, the variables of the loop are used by the values
+        the body passes to the phis of the header. The loop ran zero
+        times, so the phis are used instead. Other values of the body
+        must not be used after the loop.
+        """
+        header = jump.block
+        loop = next(
+            (loop for loop in analysis.loops if loop.header is header), None
+        )
+        if loop is None:
+            return None
+        body = set(loop.rest)
+        phis = {}
+        for phi in header.phis:
+            for block, value in phi.inputs.items():
+                if block in body:
+                    phis.setdefault(value, phi)
+
+        replacements = []
+        for block in body:
+            for instruction in block:
+                if not isinstance(instruction, ir.Value):
+                    continue
+                for user in instruction.used_by:
+                    if user.block in body or user.block is header:
+                        continue
+                    elif instruction not in phis:
+                        return None
+                    replacements.append((user, instruction, phis[instruction]))
+        return self.skip_loop, jump, replacements
+
+    def skip_loop(self, jump, replacements):
+        for user, value, phi in replacements:
+            user.replace_use(value, phi)
+        self.replace_jump(jump, self.exits[jump.block])
+
+    def plan_branch(self, jump, condition, analysis):
+        """Find the arm of a SIMT branch to keep and the arm to remove.
+
+        The arms are recognized by their predicate annotations. The arm
+        that is kept is the region dominated by its first block, up to the
+        block running under the next predicate. Returns None when the
+        regions of the arms are not clear.
+        """
+        then_block, else_block = jump.lab_yes, jump.lab_no
+        then_arm = self.arm(
+            then_block,
+            jump.pred_yes_id,
+            (jump.pred_no_id, jump.pred),
+            analysis,
+        )
+        if then_arm is None or then_arm[1] is not else_block:
+            return None
+        then_arm = then_arm[0]
+        if self.annotation_pred(else_block) == jump.pred_no_id:
+            else_arm = self.arm(
+                else_block, jump.pred_no_id, (jump.pred,), analysis
+            )
+            if else_arm is None:
+                return None
+            else_arm, reconvergence = else_arm
+        else:
+            # There is no else arm, the no target is the reconvergence:
+            else_arm = []
+
+        if not condition:
+            return (
+                self.keep_arm,
+                jump,
+                else_block,
+                else_arm,
+                jump.pred_no_id,
+            )
+
+        if not else_arm:
+            return self.keep_arm, jump, then_block, then_arm, jump.pred_yes_id
+
+        # The phis of the else arm merge the values of the arms, which are
+        # the values of the then arm now:
+        values = {}
+        for phi in else_block.phis:
+            incoming = {
+                value
+                for block, value in phi.inputs.items()
+                if block is not jump.block
+            }
+            if len(incoming) != 1:
+                return None
+            (values[phi],) = incoming
+
+        # The values computed in the else arm must not be used after it:
+        region = set(else_arm)
+        for block in else_arm:
+            for successor in block.successors:
+                if successor not in region and (
+                    successor is not reconvergence or successor.phis
+                ):
+                    return None
+            for instruction in block:
+                if (
+                    isinstance(instruction, ir.Value)
+                    and instruction not in values
+                    and any(
+                        user.block not in region
+                        for user in instruction.used_by
+                    )
+                ):
+                    return None
+        return (
+            self.remove_else_arm,
+            jump,
+            then_arm,
+            values,
+            reconvergence,
+        )
+
+    def arm(self, block, pred, ends, analysis):
+        """Get the blocks of an arm of a branch, starting at a block.
+
+        The arm ends at the first block post dominating it, which runs
+        under one of the given predicates. Returns the blocks of the arm
+        and the block after it.
+        """
+        if self.annotation_pred(block) != pred:
+            return None
+        end = analysis.immediate_post_dominator(block)
+        while end is not None and self.annotation_pred(end) not in ends:
+            end = analysis.immediate_post_dominator(end)
+        if end is None:
+            return None
+        blocks = [
+            b
+            for b in block.function
+            if analysis.dominates(block, b) and not analysis.dominates(end, b)
+        ]
+
+        # The arm may be glued to the block after it:
+        for b in blocks:
+            if any(
+                isinstance(instruction, ir.PredicateAnnotation)
+                and instruction.pred_reg in ends
+                for instruction in b
+            ):
+                return None
+        return blocks, end
+
+    @staticmethod
+    def annotation_pred(block):
+        """Get the predicate a block runs under, from its annotation"""
+        for instruction in block:
+            if isinstance(instruction, ir.PredicateAnnotation):
+                return instruction.pred_reg
+        return None
+
+    def keep_arm(self, jump, target, blocks, pred):
+        """Jump to an arm of a branch, which runs for all threads now"""
+        self.rename_pred(blocks, pred, jump.pred)
+        dropped = jump.lab_no if target is jump.lab_yes else jump.lab_yes
+        self.resolve_jump(jump, target, dropped)
+
+    def remove_else_arm(self, jump, then_arm, values, reconvergence):
+        """Run the then arm for all threads, and skip the else arm"""
+        else_block = jump.lab_no
+        self.rename_pred(then_arm, jump.pred_yes_id, jump.pred)
+        for phi, value in values.items():
+            phi.replace_by(value)
+        for block in else_block.predecessors:
+            if block is not jump.block:
+                block.change_target(else_block, reconvergence)
+        self.replace_jump(jump, jump.lab_yes)
+
+    @staticmethod
+    def rename_pred(blocks, old, new):
+        """Let the instructions predicated by old use the predicate new"""
+        for block in blocks:
+            for instruction in block:
+                if instruction.pred == old:
+                    instruction.pred = new
+                if isinstance(instruction, ir.PredicateAnnotation):
+                    if instruction.pred_reg == old:
+                        instruction.pred_reg = new
+                    if instruction.parent_pred_reg == old:
+                        instruction.parent_pred_reg = new
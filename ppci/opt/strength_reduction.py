@@ -0,0 +1,323 @@
+"""Strength reduction of induction variables.
+
+An induction variable is a phi in a loop header which is incremented by a
+constant step on each iteration. Index arithmetic in loops multiplies an
+induction variable, or a value derived from it, by a constant, such as
+the element size when indexing an array. Such a product grows by a
+constant amount each iteration as well, so it is replaced by a new
+induction variable, which is incremented by an addition instead.
+
+For example, this loop computes ``i * 4`` on each iteration:
+
+.. code::
+
+    header: i = phi preheader: 0, latch: i_next
+            x = i * 4
+    latch:  i_next = i + 1
+
+After the pass, the product is kept in its own induction variable:
+
+.. code::
+
+    header: i = phi preheader: 0, latch: i_next
+            iv = phi preheader: 0 * 4, latch: iv_next
+    latch:  i_next = i + 1
+            iv_next = iv + 4
+
+The new variable is incremented right after the variable it is derived
+from, in the same block and under the same predicate, so the two stay in
+step for each thread of SIMT code, even for threads which already left
+the loop.
+"""
+
+from .. import ir
+from .transform import FunctionPass
+
+# Each phi in a loop header keeps a register busy for the whole loop, no
+# induction variables are added to headers with this many phis:
+MAX_INDUCTION_VARIABLES = 8
+
+
+class InductionVariable:
+    """A phi in a loop header incremented by a constant on each iteration"""
+
+    def __init__(self, phi, init, increment, step):
+        self.phi = phi
+        self.init = init
+        self.increment = increment
+        self.step = step
+
+
+def is_index_type(ty):
+    """Test if the type is an integer or pointer type"""
+    return ty.is_integer or ty is ir.ptr
+
+
+def is_linear_cast(cast):
+    """Test if a cast keeps a value a linear function of its source.
+
+    Truncation is, and so is widening of signed values, assuming the
+    signed arithmetic before the cast does not overflow.
+    """
+    source, target = cast.src.ty, cast.ty
+    if not source.is_integer:
+        return False
+    if target.is_integer:
+        return target.size <= source.size or source.is_signed
+    return target is ir.ptr and source.is_signed
+
+
+def find_induction_variables(loop, body, preheader, latch):
+    """Find the induction variables of a loop.
+
+    Returns a dictionary mapping the phis of the loop header to their
+    induction variable.
+    """
+    induction_variables = {}
+    for phi in loop.header.phis:
+        if set(phi.inputs) != {preheader, latch}:
+            continue
+        if not is_index_type(phi.ty):
+            continue
+        increment = phi.get_value(latch)
+        if not (
+            isinstance(increment, ir.Binop)
+            and increment.block in body
+            and increment.operation in ("+", "-")
+        ):
+            continue
+        if increment.a is phi and isinstance(increment.b, ir.Const):
+            step = increment.b.value
+            if increment.operation == "-":
+                step = -step
+        elif (
+            increment.b is phi
+            and increment.operation == "+"
+            and isinstance(increment.a, ir.Const)
+        ):
+            step = increment.a.value
+        else:
+            continue
+        if isinstance(step, int):
+            induction_variables[phi] = InductionVariable(
+                phi, phi.get_value(preheader), increment, step
+            )
+    return induction_variables
+
+
+def step_operation(step, ty):
+    """Get the operation and constant that add step to a value of type ty.
+
+    Negative steps, and steps that wrap around to a negative value, are
+    subtracted.
+    """
+    operation = "+"
+    if ty.is_integer:
+        step %= 1 << ty.bits
+        if step >= 1 << (ty.bits - 1):
+            step = (1 << ty.bits) - step
+            operation = "-"
+    elif step < 0:
+        step = -step
+        operation = "-"
+    return operation, step
+
+
+class StrengthReductionPass(FunctionPass):
+    """Replace multiplications of induction variables by additions"""
+
+    preserves_cfg = True
+
+    def on_function(self, function):
+        self.analysis = function.analysis
+        self.order = {block: index for index, block in enumerate(function)}
+        reduced = 0
+        for loop in self.analysis.loops:
+            preheader = self.analysis.loop_preheader(loop)
+            if preheader is not None:
+                reduced += self.reduce_loop(loop, preheader)
+
+        if reduced:
+            self.logger.debug(
+                "Reduced %i multiplications in %s", reduced, function.name
+            )
+        self.analysis = None
+        return bool(reduced)
+
+    def reduce_loop(self, loop, preheader):
+        """Reduce the multiplications in a single loop"""
+        body = {loop.header}
+        body.update(loop.rest)
+        latches = [p for p in loop.header.predecessors if p in body]
+        if len(latches) != 1:
+            return 0
+        (latch,) = latches
+
+        reduced = 0
+        while len(loop.header.phis) < MAX_INDUCTION_VARIABLES:
+            induction_variables = find_induction_variables(
+                loop, body, preheader, latch
+            )
+            candidate = self.find_candidate(body, induction_variables)
+            if candidate is None:
+                break
+            self.reduce(candidate, loop, preheader, latch, body)
+            reduced += 1
+
+        if reduced:
+            self.remove_unused(
+                find_induction_variables(loop, body, preheader, latch)
+            )
+        return reduced
+
+    @staticmethod
+    def remove_unused(induction_variables):
+        """Remove induction variables only used to increment themselves"""
+        for induction_variable in induction_variables.values():
+            phi = induction_variable.phi
+            increment = induction_variable.increment
+            only_incremented = set(phi.used_by) == {increment}
+            only_fed_back = set(increment.used_by) == {phi}
+            if only_incremented and only_fed_back:
+                phi.remove_from_block()
+                increment.remove_from_block()
+
+    def find_candidate(self, body, induction_variables):
+        """Find a multiplication of an induction variable by a constant"""
+        self.linear = {}
+        for block in sorted(body, key=self.order.__getitem__):
+            for instruction in block:
+                if (
+                    isinstance(instruction, ir.Binop)
+                    and instruction.operation == "*"
+                    and is_index_type(instruction.ty)
+                    and instruction.is_used
+                    and self.analyze(instruction, body, induction_variables)
+                ):
+                    return instruction
+
+    def is_invariant(self, value, body):
+        """Test if the value is computed outside the loop, or a constant"""
+        return (
+            not isinstance(value, ir.Instruction)
+            or isinstance(value, ir.Const)
+            or value.block not in body
+        )
+
+    def analyze(self, value, body, induction_variables):
+        """Express a value as a linear function of an induction variable.
+
+        Returns the induction variable and the factor it is multiplied
+        by, or None when the value is not such a function.
+        """
+        if value in self.linear:
+            return self.linear[value]
+        self.linear[value] = None
+
+        if value in induction_variables:
+            result = (induction_variables[value], 1)
+        elif isinstance(value, ir.Cast) and value.block in body:
+            result = (
+                self.analyze(value.src, body, induction_variables)
+                if is_linear_cast(value)
+                else None
+            )
+        elif isinstance(value, ir.Binop) and value.block in body:
+            result = self.analyze_binop(value, body, induction_variables)
+        else:
+            result = None
+        self.linear[value] = result
+        return result
+
+    def analyze_binop(self, binop, body, induction_variables):
+        """Express a binary operation as a linear function"""
+        a, b = binop.a, binop.b
+        if binop.operation in ("+", "-"):
+            if self.is_invariant(b, body):
+                return self.analyze(a, body, induction_variables)
+            elif self.is_invariant(a, body):
+                result = self.analyze(b, body, induction_variables)
+                if result and binop.operation == "-":
+                    return result[0], -result[1]
+                return result
+        elif binop.operation == "*":
+            if isinstance(b, ir.Const) and isinstance(b.value, int):
+                result = self.analyze(a, body, induction_variables)
+                return result and (result[0], result[1] * b.value)
+            elif isinstance(a, ir.Const) and isinstance(a.value, int):
+                result = self.analyze(b, body, induction_variables)
+                return result and (result[0], result[1] * a.value)
+        return None
+
+    def reduce(self, product, loop, preheader, latch, body):
+        """Replace the product by a new induction variable"""
+        induction_variable, factor = self.linear[product]
+        ty = product.ty
+        pred = induction_variable.increment.pred
+
+        # Compute the start value in the preheader:
+        terminator = preheader.last_instruction
+        init = self.evaluate_at_entry(
+            product, induction_variable, terminator, body, {}
+        )
+
+        phi = ir.Phi("iv", ty)
+        phi.pred = induction_variable.phi.pred
+        loop.header.insert_instruction(phi)
+
+        # Increment next to the variable it is derived from:
+        operation, step = step_operation(induction_variable.step * factor, ty)
+        after = induction_variable.increment.next_instruction
+        block = induction_variable.increment.block
+        step = ir.Const(step, "iv_step", ty)
+        increment = ir.Binop(phi, operation, step, "iv_next", ty)
+        for instruction in (step, increment):
+            instruction.pred = pred
+            block.insert_instruction(instruction, after)
+
+        phi.set_incoming(preheader, init)
+        phi.set_incoming(latch, increment)
+        product.replace_by(phi)
+        self.remove_if_unused(product, body)
+
+    def remove_if_unused(self, value, body):
+        """Remove the computation of a value no longer needed in the loop"""
+        if (
+            isinstance(value, (ir.Binop, ir.Cast, ir.Const))
+            and value.block in body
+            and not value.is_used
+        ):
+            operands = list(value.uses)
+            value.remove_from_block()
+            for operand in operands:
+                self.remove_if_unused(operand, body)
+
+    def evaluate_at_entry(
+        self, value, induction_variable, terminator, body, copies
+    ):
+        """Compute a value for the first iteration, in the preheader"""
+        if value is induction_variable.phi:
+            return induction_variable.init
+        if value in copies:
+            return copies[value]
+        if isinstance(value, ir.Const):
+            copy = ir.Const(value.value, value.name, value.ty)
+        elif self.is_invariant(value, body):
+            return value
+        elif isinstance(value, ir.Cast):
+            src = self.evaluate_at_entry(
+                value.src, induction_variable, terminator, body, copies
+            )
+            copy = ir.Cast(src, value.name, value.ty)
+        else:
+            a, b = (
+                self.evaluate_at_entry(
+                    operand, induction_variable, terminator, body, copies
+                )
+                for operand in (value.a, value.b)
+            )
+            copy = ir.Binop(a, value.operation, b, value.name, value.ty)
+        copy.pred = terminator.pred
+        terminator.block.insert_instruction(copy, terminator)
+        copies[value] = copy
+        return copy
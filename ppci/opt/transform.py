@@ -10,8 +10,18 @@ class ModulePass(abc.ABC):
     """Base class of all optimizing passes.
 
     Subclass this class to implement your own optimization pass.
+
+    Passes report whether they changed the code, so that a
+    :class:`~ppci.opt.pipeline.PassManager` can rerun only the passes that
+    may find new work. Returning None means the pass does not know, and
+    counts as a change.
+
+    Set preserves_cfg for passes that never change the control flow
+    graph, so that the cached analysis of the function stays valid.
     """
 
+    preserves_cfg = False
+
     def __init__(self):
         self.logger = logging.getLogger(str(self.__class__.__name__))
 
@@ -23,7 +33,7 @@ class ModulePass(abc.ABC):
 
     @abc.abstractmethod
     def run(self, ir_module):  # pragma: no cover
-        """Run this pass over a module"""
+        """Run this pass over a module, returns whether it changed"""
         raise NotImplementedError()
 
 
@@ -31,17 +41,29 @@ class FunctionPass(ModulePass):
     """Base pass that loops over all functions in a module"""
 
     def run(self, ir_module: ir.Module):
-        """Main entry point for the pass"""
+        """Main entry point for the pass, returns whether it changed"""
         self.prepare()
         self.debug_db = ir_module.debug_db
         assert isinstance(ir_module, ir.Module)
+        changed = False
         for function in ir_module.functions:
-            self.on_function(function)
+            # The function may have been changed since it was analyzed:
+            function.analysis.invalidate()
+            if self.run_on_function(function):
+                changed = True
         self.debug_db = None
+        return changed
+
+    def run_on_function(self, function: ir.SubRoutine):
+        """Run the pass over a single function, returns whether it changed"""
+        changed = self.on_function(function) is not False
+        if changed and not self.preserves_cfg:
+            function.analysis.invalidate()
+        return changed
 
     @abc.abstractmethod
     def on_function(self, function: ir.SubRoutine):  # pragma: no cover
-        """Override this virtual method"""
+        """Override this virtual method, return whether it changed"""
         raise NotImplementedError()
 
 
@@ -50,12 +72,15 @@ class BlockPass(FunctionPass):
 
     def on_function(self, function):
         """Loops over each block in the function"""
+        changed = False
         for block in function.blocks:
-            self.on_block(block)
+            if self.on_block(block) is not False:
+                changed = True
+        return changed
 
     @abc.abstractmethod
     def on_block(self, block: ir.Block):  # pragma: no cover
-        """Override this virtual method"""
+        """Override this virtual method, return whether it changed"""
         raise NotImplementedError()
 
 
@@ -64,12 +89,15 @@ class InstructionPass(BlockPass):
 
     def on_block(self, block):
         """Loops over each instruction in the block"""
+        changed = False
         for instruction in block:
-            self.on_instruction(instruction)
+            if self.on_instruction(instruction) is not False:
+                changed = True
+        return changed
 
     @abc.abstractmethod
     def on_instruction(self, instruction):  # pragma: no cover
-        """Override this virtual method"""
+        """Override this virtual method, return whether it changed"""
         raise NotImplementedError()
 
 
@@ -78,6 +106,8 @@ class RemoveAddZeroPass(InstructionPass):
     Replace multiplication by 1 with value itself.
     """
 
+    preserves_cfg = True
+
     def on_instruction(self, instruction):
         if type(instruction) is ir.Binop:
             if instruction.operation == "+":
@@ -86,34 +116,60 @@ class RemoveAddZeroPass(InstructionPass):
                     and instruction.b.value == 0
                 ):
                     instruction.replace_by(instruction.a)
+                    return True
                 elif (
                     type(instruction.a) is ir.Const
                     and instruction.a.value == 0
                 ):
                     instruction.replace_by(instruction.b)
+                    return True
             elif instruction.operation == "*":
                 if (
                     type(instruction.b) is ir.Const
                     and instruction.b.value == 1
                 ):
                     instruction.replace_by(instruction.a)
+                    return True
+        return False
 
 
-class DeleteUnusedInstructionsPass(BlockPass):
-    """Remove unused variables from a block"""
+class DeleteUnusedInstructionsPass(FunctionPass):
+    """Remove unused variables from a function.
 
-    def on_block(self, block):
-        unused_instructions = [
-            i
-            for i in block
-            if (
-                isinstance(i, ir.Value)
-                and (not isinstance(i, ir.FunctionCall))
-                and (not i.is_used)
-            )
+    Removing a value can leave the values it used unused, so these are
+    removed as well in the same run.
+    """
+
+    preserves_cfg = True
+
+    def on_function(self, function):
+        worklist = [
+            i for i in function.get_instructions() if self.is_unused(i)
         ]
-        count = len(unused_instructions)
-        for instruction in unused_instructions:
+        count = 0
+        while worklist:
+            instruction = worklist.pop()
+            if instruction.block is None or not self.is_unused(instruction):
+                # Removed already, or entered the list twice:
+                continue
+            operands = list(instruction.uses)
             instruction.remove_from_block()
+            count += 1
+            worklist.extend(
+                value
+                for value in operands
+                if isinstance(value, ir.Instruction)
+                and value.block is not None
+                and self.is_unused(value)
+            )
         if count > 0:
             self.logger.debug("Deleted %i unused instructions", count)
+        return count > 0
+
+    @staticmethod
+    def is_unused(instruction):
+        return (
+            isinstance(instruction, ir.Value)
+            and not isinstance(instruction, ir.FunctionCall)
+            and not instruction.is_used
+        )
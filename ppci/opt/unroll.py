@@ -0,0 +1,354 @@
+"""Unroll loops with a constant trip count.
+
+The Twig packetizer fills instruction packets from within a basic block
+only, so the few instructions of a small loop body leave most slots of
+its packets empty. Unrolling copies the body a number of times into the
+same block, which gives the packetizer independent instructions to
+combine, and leaves fewer exit tests and jumps to run.
+
+A loop in SIMT code is a header, which narrows the loop predicate to the
+threads for which the loop condition holds, and a body, which runs under
+the loop predicate and jumps back to the header while any thread is left.
+Only loops with a constant trip count are unrolled. All threads entering
+such a loop leave it after the same iteration, so the copies of the body
+need no exit tests in between, and the remaining iterations of a count
+that is not a multiple of the unroll factor run before the loop.
+
+Loops with a bound that is only known at run time are not unrolled. The
+threads may then leave such a loop after different iterations, so each
+copy of the body would need a predicate of its own. An SJump only sets a
+predicate at the end of a block, so every copy would end up in a block of
+its own, which gives the packetizer nothing to combine. A loop over whole
+unrolled iterations followed by the original loop for the remaining ones
+would need an exit test for several iterations at once, which can
+overflow near the bound. Such loops are left as they are, and a loop
+pragma on them is reported.
+
+For example, this loop runs ten times:
+
+.. code::
+
+    header: i = phi preheader: 0, body: i_next
+            sjmp i < 10 : body (p1)
+    body:   ...
+            i_next = i + 1
+            pjmp p1 == 0 ? header : exit
+
+Unrolled four times, the first two iterations run in the preheader, and
+the loop runs twice with four copies of the body:
+
+.. code::
+
+    preheader: ...
+               ...
+               jmp header
+    header: i = phi preheader: 2, body: i_4
+            sjmp i < 10 : body (p1)
+    body:   ...
+            i_1 = i + 1
+            ...
+            i_4 = i + 4
+            pjmp p1 == 0 ? header : exit
+
+The loop predicate is only set by the header, so the iterations in the
+preheader run under the predicate of the preheader, for all threads that
+enter the loop.
+
+The unroll factor is given per loop with ``#pragma unroll``, other loops
+are unrolled when their body is small.
+"""
+
+from .. import ir
+from .inline import copy_instruction
+from .strength_reduction import find_induction_variables, step_operation
+from .transform import FunctionPass
+
+# Unroll factor of loops without an unroll pragma:
+UNROLL_FACTOR = 4
+
+# Loops without an unroll pragma are unrolled as long as the unrolled body
+# stays this small:
+MAX_UNROLLED_SIZE = 64
+
+# Limit on the size of a body unrolled because of a pragma:
+MAX_PRAGMA_UNROLLED_SIZE = 1024
+
+# The condition that holds when the operands are swapped:
+MIRRORED = {
+    "<": ">",
+    ">": "<",
+    "<=": ">=",
+    ">=": "<=",
+    "==": "==",
+    "!=": "!=",
+}
+
+
+def trip_count(init, cond, bound, step, ty):
+    """Count the iterations of a counted loop.
+
+    The loop runs while ``iv cond bound`` holds, with the induction
+    variable starting at init, and incremented by step on each iteration.
+    Returns None when the count is not known, or when the variable would
+    wrap around before the loop ends.
+    """
+    if cond == "<" and step > 0:
+        count = -((init - bound) // step)
+    elif cond == "<=" and step > 0:
+        count = (bound - init) // step + 1
+    elif cond == ">" and step < 0:
+        count = -((bound - init) // -step)
+    elif cond == ">=" and step < 0:
+        count = (init - bound) // -step + 1
+    elif cond == "!=" and step != 0 and (bound - init) % step == 0:
+        count = (bound - init) // step
+    else:
+        return None
+    count = max(count, 0)
+
+    if ty.is_signed:
+        low, high = -(1 << (ty.bits - 1)), (1 << (ty.bits - 1)) - 1
+    else:
+        low, high = 0, (1 << ty.bits) - 1
+    if not (low <= init <= high and low <= init + count * step <= high):
+        return None
+    return count
+
+
+class LoopUnrollPass(FunctionPass):
+    """Unroll loops with a constant trip count.
+
+    Loops with an unroll pragma are unrolled by the factor of the pragma,
+    other loops by the given factor, if their body is small enough.
+    """
+
+    preserves_cfg = True
+
+    def __init__(self, factor=None):
+        super().__init__()
+        self.factor = UNROLL_FACTOR if factor is None else factor
+
+        # Loops with a pragma that could not be unrolled, reported once
+        # although the pass runs again:
+        self.reported = set()
+
+    def on_function(self, function):
+        analysis = function.analysis
+        unrolled = 0
+        for loop in analysis.loops:
+            preheader = analysis.loop_preheader(loop)
+            if preheader is not None and self.unroll_loop(loop, preheader):
+                unrolled += 1
+
+        if unrolled:
+            self.logger.debug(
+                "Unrolled %i loops in %s", unrolled, function.name
+            )
+        return bool(unrolled)
+
+    def unroll_loop(self, loop, preheader):
+        """Unroll a loop made of a header and a single body block"""
+        header = loop.header
+        if header.unroll == 1 or len(loop.rest) != 1:
+            return False
+        (latch,) = loop.rest
+        check, jump = header.last_instruction, latch.last_instruction
+        if not (
+            isinstance(check, ir.SJump)
+            and check.lab_yes is latch
+            and isinstance(jump, ir.PJump)
+            and jump.lab_yes is header
+            and jump.lab_no not in (header, latch)
+        ):
+            return False
+
+        # The header only tests the loop condition, the copies of the body
+        # do not repeat its instructions:
+        phis = set(header.phis)
+        for instruction in header:
+            if not isinstance(
+                instruction, (ir.Phi, ir.SJump)
+            ) and not phis.isdisjoint(instruction.uses):
+                return False
+
+        iteration = []
+        for instruction in latch:
+            if instruction is jump or isinstance(
+                instruction, ir.PredicateAnnotation
+            ):
+                continue
+            if (
+                isinstance(instruction, (ir.Phi, ir.Alloc))
+                or instruction.pred != check.pred_yes_id
+            ):
+                return False
+            iteration.append(instruction)
+
+        induction_variables = find_induction_variables(
+            loop, {header, latch}, preheader, latch
+        )
+        counter = self.find_counter(check, jump, induction_variables)
+        count = None
+        if counter is not None:
+            induction_variable, cond, bound = counter
+            count = trip_count(
+                induction_variable.init.value,
+                cond,
+                bound,
+                induction_variable.step,
+                induction_variable.phi.ty,
+            )
+        if count is None:
+            if header.unroll is not None and header not in self.reported:
+                self.reported.add(header)
+                self.logger.warning(
+                    "Loop %s not unrolled, its trip count is not constant",
+                    header.name,
+                )
+            return False
+
+        size = len(iteration)
+        if header.unroll is None:
+            factor = min(self.factor, MAX_UNROLLED_SIZE // size)
+        elif header.unroll == 0:
+            factor = count
+        else:
+            factor = header.unroll
+        factor = min(factor, count, MAX_PRAGMA_UNROLLED_SIZE // size)
+        if factor < 2:
+            return False
+
+        self.iteration = iteration
+        self.increments = {
+            variable.increment: variable
+            for variable in induction_variables.values()
+        }
+        self.latch_values = {phi: phi.get_value(latch) for phi in header.phis}
+        self.unroll(preheader, latch, count, factor)
+        header.unroll = 1
+        return True
+
+    @staticmethod
+    def find_counter(check, jump, induction_variables):
+        """Find the induction variable that counts the iterations.
+
+        The header compares the variable with a constant, and the jump
+        back compares the increment of the variable with the same
+        constant. Returns the variable, the condition with the variable
+        on the left, and the constant.
+        """
+        if check.a in induction_variables:
+            induction_variable = induction_variables[check.a]
+            cond, bound, increment, jump_bound = (
+                check.cond,
+                check.b,
+                jump.a,
+                jump.b,
+            )
+        elif check.b in induction_variables:
+            induction_variable = induction_variables[check.b]
+            cond, bound, increment, jump_bound = (
+                MIRRORED[check.cond],
+                check.a,
+                jump.b,
+                jump.a,
+            )
+        else:
+            return None
+
+        if not (
+            jump.cond == check.cond
+            and increment is induction_variable.increment
+            and induction_variable.phi.ty.is_integer
+            and is_integer_constant(induction_variable.init)
+            and is_integer_constant(bound)
+            and is_integer_constant(jump_bound)
+            and bound.value == jump_bound.value
+        ):
+            return None
+        return induction_variable, cond, bound.value
+
+    def unroll(self, preheader, latch, count, factor):
+        """Run the first iterations in the preheader, and copy the body of
+        the loop for the remaining iterations"""
+        header = latch.last_instruction.lab_yes
+        jump = latch.last_instruction
+
+        # The loop predicate is set by the header, run the first iterations
+        # for all threads entering the loop instead:
+        terminator = preheader.last_instruction
+        state = {phi: phi.get_value(preheader) for phi in self.latch_values}
+        bases = dict(state)
+        for index in range(count % factor):
+            _, state = self.copy_iteration(
+                state, bases, index, terminator, terminator.pred
+            )
+        for phi, value in state.items():
+            phi.set_incoming(preheader, value)
+
+        # The first copy is the body itself, the others are added to it:
+        values = {instruction: instruction for instruction in self.iteration}
+        state = dict(self.latch_values)
+        bases = {phi: phi for phi in self.latch_values}
+        for index in range(1, factor):
+            values, state = self.copy_iteration(state, bases, index, jump)
+        for phi, value in state.items():
+            phi.set_incoming(latch, value)
+
+        # The jump back and the code after the loop use the values of the
+        # last copy:
+        for instruction in self.iteration:
+            if isinstance(instruction, ir.Value):
+                for user in list(instruction.used_by):
+                    if user is jump or user.block not in (header, latch):
+                        user.replace_use(instruction, values[instruction])
+
+    def copy_iteration(self, state, bases, index, before, pred=None):
+        """Copy the body of the loop in front of the given instruction.
+
+        The phis of the loop header are replaced by their values in the
+        state, and the induction variables are incremented from their
+        values in bases, which breaks the chain of increments between the
+        copies. Returns the values of the copy and the state after it.
+        """
+        value_map = dict(state)
+        for instruction in self.iteration:
+            if instruction in self.increments:
+                induction_variable = self.increments[instruction]
+                ty = induction_variable.phi.ty
+                operation, step = step_operation(
+                    induction_variable.step * (index + 1), ty
+                )
+                step = ir.Const(step, "unroll_step", ty)
+                copies = [
+                    step,
+                    ir.Binop(
+                        bases[induction_variable.phi],
+                        operation,
+                        step,
+                        instruction.name,
+                        ty,
+                    ),
+                ]
+            else:
+                copy = copy_instruction(instruction, {}, None)
+                for value in list(copy.uses):
+                    if value in value_map:
+                        copy.replace_use(value, value_map[value])
+                copies = [copy]
+
+            for copy in copies:
+                copy.pred = instruction.pred if pred is None else pred
+                before.block.insert_instruction(copy, before)
+            value_map[instruction] = copies[-1]
+
+        state = {
+            phi: value_map.get(value, value)
+            for phi, value in self.latch_values.items()
+        }
+        return value_map, state
+
+
+def is_integer_constant(value):
+    """Test if the value is an integer constant"""
+    return isinstance(value, ir.Const) and isinstance(value.value, int)
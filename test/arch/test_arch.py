@@ -2,6 +2,7 @@
 
 import unittest
 
+from ppci.arch import get_arch
 from ppci.arch.stack import Frame, FramePointerLocation
 
 
@@ -21,5 +22,18 @@ class FrameTestCase(unittest.TestCase):
         self.assertEqual(5, frame.stacksize)
 
 
+class GetArchTestCase(unittest.TestCase):
+    """Test the lookup of architectures"""
+
+    def test_shared(self):
+        self.assertIs(get_arch("arm"), get_arch("arm"))
+
+    def test_option_order(self):
+        arch = get_arch("arm:thumb:neon")
+        self.assertIs(arch, get_arch("arm:neon:thumb"))
+        self.assertTrue(arch.has_option("thumb"))
+        self.assertIsNot(arch, get_arch("arm"))
+
+
 if __name__ == "__main__":
     unittest.main()
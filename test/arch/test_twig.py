@@ -0,0 +1,238 @@
+import io
+import unittest
+
+from ppci.api import asm
+from ppci.arch.stack import Frame
+from ppci.arch.twig.arch import TwigArch, build_dependency_graph
+from ppci.arch.twig.instructions import (
+    Add,
+    Addi,
+    Bl,
+    Cos,
+    Csrr,
+    Lli,
+    Lui,
+    Lw,
+    Prlw,
+    Sin,
+    Sw,
+)
+from ppci.arch.twig.registers import FP, LR, R0, R4, R5, R6, R7, R9
+from ppci.binutils.disasm import Disassembler
+
+
+def packets(instructions):
+    """Split packetized instructions at the packet end markers"""
+    result = []
+    current = []
+    for instruction in instructions:
+        current.append(instruction)
+        if instruction.is_packet_end:
+            result.append(current)
+            current = []
+    return result
+
+
+class PacketizeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.arch = TwigArch()
+
+    def test_dependency_kinds(self):
+        block = [
+            Add(R5, R6, R7, 0),
+            Add(R9, R5, R5, 0),  # RAW on x5
+            Add(R6, R9, R9, 0),  # RAW on x9, WAR on x6
+            Add(R5, R7, R7, 0),  # WAR on x5
+        ]
+        edges = build_dependency_graph(block)
+        self.assertEqual({}, edges[0])
+        self.assertEqual({0: "RAW"}, edges[1])
+        self.assertEqual({0: "WAR", 1: "RAW"}, edges[2])
+        self.assertEqual({0: "WAW", 1: "WAR"}, edges[3])
+
+    def test_zero_register_has_no_hazard(self):
+        block = [Add(R0, R5, R6, 0), Add(R7, R0, R0, 0)]
+        self.assertEqual([{}, {}], build_dependency_graph(block))
+
+    def test_memory_order(self):
+        block = [
+            Lw(R5, 0, R6, 0),
+            Lw(R7, 4, R6, 0),
+            Sw(R6, 8, R9, 0),
+            Lw(R4, 8, R6, 0),
+        ]
+        edges = build_dependency_graph(block)
+        self.assertEqual({}, edges[1])
+        self.assertEqual({0: "MEM_WRITE", 1: "MEM_WRITE"}, edges[2])
+        self.assertEqual({2: "MEM_READ"}, edges[3])
+
+    def test_predicate_dependency(self):
+        # prlw sets p1, which guards the add after it
+        block = [Prlw(1, R6, 0), Add(R5, R7, R7, 1), Add(R9, R7, R7, 0)]
+        edges = build_dependency_graph(block)
+        self.assertEqual({0: "RAW"}, edges[1])
+        self.assertEqual({}, edges[2])
+
+    def test_independent_instructions_share_packet(self):
+        block = [
+            Add(R5, R6, R6, 0),
+            Add(R7, R6, R6, 0),
+            Add(R9, R5, R7, 0),
+        ]
+        instructions = list(block)
+        self.arch.packetize(instructions)
+        self.assertEqual(
+            [[block[0], block[1]], [block[2]]], packets(instructions)
+        )
+
+    def test_max_packet_size(self):
+        block = [Add(r, R6, R6, 0) for r in (R5, R7, R9)]
+        instructions = list(block)
+        self.arch.packetize(instructions, max_packet_size=2)
+        self.assertEqual(
+            [[block[0], block[1]], [block[2]]], packets(instructions)
+        )
+
+    def test_unit_limits(self):
+        block = [
+            Lw(R5, 0, R6, 0),
+            Lw(R7, 4, R6, 0),
+            Sin(R9, R6, 0),
+            Cos(R4, R6, 0),
+        ]
+        instructions = list(block)
+        self.arch.packetize(instructions)
+        self.assertEqual(
+            [[block[0], block[2]], [block[1], block[3]]],
+            packets(instructions),
+        )
+
+    def test_load_use_latency_is_filled(self):
+        # The add after the load is scheduled after independent work
+        block = [
+            Lw(R5, 0, R6, 0),
+            Add(R7, R5, R5, 0),
+            Lw(R9, 4, R6, 0),
+        ]
+        instructions = list(block)
+        self.arch.packetize(instructions)
+        self.assertEqual(
+            [[block[0]], [block[2]], [block[1]]], packets(instructions)
+        )
+
+    def test_branch_ends_block(self):
+        block = [
+            Add(R5, R6, R6, 0),
+            Bl(LR, "f"),
+            Add(R7, R6, R6, 0),
+        ]
+        instructions = list(block)
+        self.arch.packetize(instructions)
+        self.assertEqual(
+            [[block[0]], [block[1]], [block[2]]], packets(instructions)
+        )
+
+    def test_large_block(self):
+        # A long chain mixed with independent work must stay ordered
+        block = []
+        for i in range(2000):
+            block.append(Add(R5, R5, R6, 0))
+            block.append(Add(R7, R6, R6, 0))
+        instructions = list(block)
+        self.arch.packetize(instructions)
+        self.assertEqual(block[0::2], [p[0] for p in packets(instructions)])
+
+
+class SpillTestCase(unittest.TestCase):
+    def setUp(self):
+        self.arch = TwigArch()
+
+    def test_spill_cost(self):
+        """Spill slot offsets are scaled by the number of threads"""
+        frame = Frame("f")
+        self.assertEqual(4, self.arch.spill_cost(frame, 4))
+        frame.stacksize = 256
+        self.assertEqual(5, self.arch.spill_cost(frame, 4))
+
+    def test_rematerialize_constant(self):
+        code = self.arch.rematerialize(
+            [Addi(R4, R0, 0, 2), Lui(R4, 18, 2), Lli(R4, 1656, 2)], R5
+        )
+        self.assertEqual(
+            ["addi x5, x0, 0, 0", "lui x5, 18, 0", "lli x5, 1656, 0"],
+            [str(ins) for ins in code],
+        )
+
+    def test_rematerialize_address(self):
+        address = Addi(R4, FP, -8, 0)
+        address.fprel = True
+        (code,) = self.arch.rematerialize([address], R5)
+        self.assertEqual("addi x5, x8, -8, 0", str(code))
+        self.assertTrue(code.fprel)
+
+    def test_rematerialize_thread_id(self):
+        (code,) = self.arch.rematerialize([Csrr(R4, 0, 1)], R5)
+        self.assertEqual("csrr x5, 0, 0", str(code))
+
+    def test_no_rematerialize(self):
+        for definitions in (
+            [],
+            [Add(R4, R6, R7, 0)],
+            [Addi(R4, R6, 1, 0)],
+            [Addi(R4, R0, 1, 0), Addi(R4, R0, 2, 0)],
+        ):
+            self.assertIsNone(self.arch.rematerialize(definitions, R5))
+
+
+class AssemblerTestCase(unittest.TestCase):
+    def test_lazy_assembler(self):
+        arch = TwigArch()
+        self.assertNotIn("assembler", vars(arch))
+        obj = asm(io.StringIO("sin x5, x6, 0"), arch)
+        self.assertIs(arch.assembler, arch.assembler)
+        self.assertEqual(Sin(R5, R6, 0).encode(), obj.get_section("code").data)
+
+
+class DisassemblerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.disassembler = Disassembler(TwigArch())
+
+    def test_decode_table(self):
+        data = Sin(R9, R6, 0).encode()
+        candidates = self.disassembler.decode_table.candidates(data)
+        self.assertEqual([Sin], candidates)
+
+    def test_decode(self):
+        data = Sin(R5, R6, 0).encode() + Lw(R9, 8, R6, 0).encode()
+        instructions = list(self.disassembler.decode(data, address=0x100))
+        self.assertEqual(
+            ["sin x5, x6, 0", "lw x9, 8(x6), 0"],
+            [str(i) for i in instructions],
+        )
+        self.assertEqual([0x100, 0x104], [i.address for i in instructions])
+
+    def test_unknown_word_is_data(self):
+        data = bytes([0x7E, 0, 0, 0, 0x55])
+        instructions = list(self.disassembler.decode(data))
+        self.assertEqual(
+            ["dd 126", ".byte 85"], [str(i) for i in instructions]
+        )
+
+    def test_jal_offset_is_signed(self):
+        data = (0x1FFFC << 13 | 0b1100000).to_bytes(4, "little")
+        (instruction,) = self.disassembler.decode(data)
+        self.assertEqual("jal x0, -4", str(instruction))
+
+    def test_decode_stream(self):
+        self.disassembler.chunk_size = 6
+        data = b"".join(Lw(r, 4, R6, 0).encode() for r in (R4, R5, R7))
+        instructions = list(self.disassembler.decode_stream(io.BytesIO(data)))
+        self.assertEqual(
+            [str(i) for i in self.disassembler.decode(data)],
+            [str(i) for i in instructions],
+        )
+        self.assertEqual([0, 4, 8], [i.address for i in instructions])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,12 +7,14 @@ from ppci import ir
 from ppci.api import get_arch
 from ppci.arch.example import ExampleArch
 from ppci.binutils.debuginfo import DebugDb
+from ppci.codegen import CodeGenerator
 from ppci.codegen.irdag import (
     FunctionInfo,
     SelectionGraphBuilder,
     prepare_function_info,
 )
 from ppci.irutils import Builder, Writer
+from ppci.utils.reporting import DummyReportGenerator
 
 
 def print_module(m):
@@ -199,5 +201,19 @@ class IrDagTestCase(unittest.TestCase):
         # self.assertTrue(sg_value.vreg)
 
 
+class InstructionSelectorTestCase(unittest.TestCase):
+    def test_shared_rules(self):
+        """Selectors for the same architecture share the rule table"""
+        arch = ExampleArch()
+        reporter = DummyReportGenerator()
+        selector1 = CodeGenerator(arch, reporter).instruction_selector
+        selector2 = CodeGenerator(arch, reporter).instruction_selector
+        self.assertIs(selector1.sys, selector2.sys)
+        selector3 = CodeGenerator(
+            arch, reporter, optimize_for="speed"
+        ).instruction_selector
+        self.assertIsNot(selector1.sys, selector3.sys)
+
+
 if __name__ == "__main__":
     unittest.main()
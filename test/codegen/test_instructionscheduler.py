@@ -0,0 +1,53 @@
+import unittest
+
+from ppci.codegen.instructionscheduler import ListScheduler
+
+
+class ListSchedulerTestCase(unittest.TestCase):
+    def test_independent(self):
+        scheduler = ListScheduler()
+        packets = scheduler.schedule([{}, {}, {}], ["alu"] * 3, [1] * 3)
+        self.assertEqual([(0, [0, 1, 2])], packets)
+
+    def test_width(self):
+        scheduler = ListScheduler(width=2)
+        packets = scheduler.schedule([{}, {}, {}], ["alu"] * 3, [1] * 3)
+        self.assertEqual([(0, [0, 1]), (1, [2])], packets)
+
+    def test_unit_limit(self):
+        scheduler = ListScheduler(unit_limits={"mem": 1})
+        units = ["mem", "mem", "alu"]
+        packets = scheduler.schedule([{}, {}, {}], units, [1] * 3)
+        self.assertEqual([(0, [0, 2]), (1, [1])], packets)
+
+    def test_latency_stall(self):
+        # A load followed by its use: the use waits for the load latency
+        scheduler = ListScheduler()
+        packets = scheduler.schedule([{}, {0: "RAW"}], ["mem", "alu"], [4, 1])
+        self.assertEqual([(0, [0]), (4, [1])], packets)
+
+    def test_ordering_edges_take_one_cycle(self):
+        scheduler = ListScheduler()
+        edges = [{}, {0: "WAR"}, {0: "MEM_WRITE"}]
+        packets = scheduler.schedule(edges, ["mem"] * 3, [4] * 3)
+        self.assertEqual([(0, [0]), (1, [1, 2])], packets)
+
+    def test_critical_path_first(self):
+        # 0 and 1 are independent, but 1 heads a long chain and is issued
+        # first when only one slot is free. Ties go to the lowest index.
+        scheduler = ListScheduler(width=1)
+        edges = [{}, {}, {1: "RAW"}, {2: "RAW"}]
+        packets = scheduler.schedule(edges, ["alu"] * 4, [1] * 4)
+        self.assertEqual([1, 2, 0, 3], [p[0] for _, p in packets])
+
+    def test_fill_latency_gap(self):
+        # Independent work is issued while a load is outstanding
+        scheduler = ListScheduler(width=1)
+        edges = [{}, {0: "RAW"}, {}, {}]
+        units = ["mem", "alu", "alu", "alu"]
+        packets = scheduler.schedule(edges, units, [4, 1, 1, 1])
+        self.assertEqual([(0, [0]), (1, [2]), (2, [3]), (4, [1])], packets)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from ppci.api import get_arch
 from ppci.arch.arch import Frame
@@ -14,17 +14,96 @@ from ppci.arch.example import (
     Mov,
     R10l,
     Use,
+    Use3,
     UseHalf,
 )
+from ppci.arch.generic_instructions import Nop
 from ppci.arch.x86_64.registers import (
     XmmRegisterDouble,
     XmmRegisterSingle,
     xmm6,
 )
+from ppci.codegen.linearscan import LinearScanRegisterAllocator, LiveInterval
 from ppci.codegen.registerallocator import GraphColoringRegisterAllocator
 
 
-class GraphColoringRegisterAllocatorTestCase(unittest.TestCase):
+class SpillTestMixin:
+    """Spill tests shared by the register allocators.
+
+    The test case sets self.register_allocator in its setUp.
+    """
+
+    def make_loop_frame(self):
+        """Create a frame with one value more than there are registers.
+
+        The value used in the loop has the fewest uses, but the loop makes
+        its use count most.
+        """
+        f = Frame("tst")
+        vregs = [ExampleRegister(f"t{i}") for i in range(6)]
+        loop = Nop()
+        back = Nop(jumps=[loop, Nop()])
+        exit = back.jumps[1]
+        f.instructions.extend(Def(vreg) for vreg in vregs)
+        f.instructions.append(Use3(*vregs[1:4]))
+        f.instructions.append(Use3(vregs[4], vregs[5], vregs[1]))
+        f.instructions.append(Use3(*vregs[2:5]))
+        f.instructions.append(Use(vregs[5]))
+        f.instructions.append(Nop(jumps=[loop]))
+        f.instructions.extend([loop, Use(vregs[0]), back, exit])
+        return f, loop, back
+
+    def make_spill_gen(self):
+        """Create spill code with the example instructions"""
+        spill_gen = MagicMock()
+        spill_gen.gen_load.side_effect = lambda frame, vreg, slot: [Def(vreg)]
+        spill_gen.gen_store.side_effect = lambda frame, vreg, slot: [Use(vreg)]
+        return spill_gen
+
+    def make_rematerialize(self, constant):
+        """Compute the register defined by the given instruction again"""
+
+        def rematerialize(definitions, vreg):
+            if definitions == [constant]:
+                return [Def(vreg)]
+            return None
+
+        return rematerialize
+
+    def test_spill_outside_loop(self):
+        """Spill code is kept out of loops"""
+        f, loop, back = self.make_loop_frame()
+        self.register_allocator.spill_gen = self.make_spill_gen()
+        self.register_allocator.alloc_frame(f)
+        body = f.instructions.index(back) - f.instructions.index(loop)
+        self.assertEqual(2, body)
+
+    def test_rematerialize(self):
+        """A constant is computed again instead of spilled"""
+        f = Frame("tst")
+        vregs = [ExampleRegister(f"t{i}") for i in range(6)]
+        for vreg in vregs:
+            f.instructions.append(Def(vreg))
+        constant = f.instructions[0]
+        f.instructions.append(Use3(*vregs[1:4]))
+        f.instructions.append(Use3(vregs[0], *vregs[4:]))
+        self.register_allocator.spill_gen = self.make_spill_gen()
+        arch = self.register_allocator.arch
+        rematerialize = self.make_rematerialize(constant)
+        with patch.object(arch, "rematerialize", rematerialize):
+            self.register_allocator.alloc_frame(f)
+        self.assertEqual(0, f.stacksize)
+        self.assertNotIn(constant, f.instructions)
+        self.assertEqual(8, len(f.instructions))
+        self.assertIs(
+            f.instructions[6].defined_registers[0],
+            f.instructions[7].used_registers[0],
+        )
+
+
+class GraphColoringRegisterAllocatorTestCase(
+    SpillTestMixin, unittest.TestCase
+):
     """Use the example target to test the different cases of the register
     allocator.
     Possible cases: freeze of move, spill of register
@@ -188,5 +267,111 @@ class GraphColoringRegisterAllocatorTestCase(unittest.TestCase):
         assert frame.is_used(xmm6, arch.info.alias)
 
 
+class LiveIntervalTestCase(unittest.TestCase):
+    def make_interval(self, *positions):
+        interval = LiveInterval(ExampleRegister("t1"))
+        for position in positions:
+            interval.add_position(position)
+        return interval
+
+    def test_lifetime_hole(self):
+        interval = self.make_interval(2, 3, 4, 9, 10)
+        self.assertEqual([2, 9], interval.starts)
+        self.assertEqual([4, 10], interval.ends)
+        self.assertEqual(5, interval.size)
+        self.assertTrue(interval.covers(3))
+        self.assertFalse(interval.covers(6))
+        self.assertTrue(interval.covers(10))
+
+    def test_next_intersection(self):
+        interval = self.make_interval(2, 3, 4, 9, 10)
+        self.assertIsNone(interval.next_intersection(self.make_interval(6)))
+        self.assertEqual(
+            10, interval.next_intersection(self.make_interval(6, 7, 10))
+        )
+
+
+class LinearScanRegisterAllocatorTestCase(SpillTestMixin, unittest.TestCase):
+    def setUp(self):
+        arch = get_arch("example")
+        self.register_allocator = LinearScanRegisterAllocator(arch, None, None)
+
+    def conflict(self, ta, tb):
+        self.assertIsNot(ta.get_real(), tb.get_real())
+
+    def test_register_allocation(self):
+        f = Frame("tst")
+        t1 = ExampleRegister("t1")
+        t2 = ExampleRegister("t2")
+        t3 = ExampleRegister("t3")
+        t4 = ExampleRegister("t4")
+        t5 = ExampleRegister("t5")
+        f.instructions.append(Def(t1))
+        f.instructions.append(Def(t2))
+        f.instructions.append(Def(t3))
+        f.instructions.append(Add(t4, t1, t2))
+        f.instructions.append(Add(t5, t4, t3))
+        f.instructions.append(Use(t5))
+        self.register_allocator.alloc_frame(f)
+        self.conflict(t1, t2)
+        self.conflict(t2, t3)
+        self.conflict(t1, t3)
+        self.conflict(t3, t4)
+
+    def test_fixed_register(self):
+        """Registers used by the code block their aliases"""
+        f = Frame("tst")
+        t1 = ExampleRegister("t1")
+        t2 = ExampleRegister("t2")
+        f.instructions.append(Def(R0))
+        f.instructions.append(DefHalf(R10l))
+        f.instructions.append(Def(t1))
+        f.instructions.append(Def(t2))
+        f.instructions.append(Use(R0))
+        f.instructions.append(UseHalf(R10l))
+        f.instructions.append(Use(t1))
+        f.instructions.append(Use(t2))
+        self.register_allocator.alloc_frame(f)
+        for vreg in (t1, t2):
+            self.assertNotIn(vreg.get_real(), (R0, R10))
+        self.conflict(t1, t2)
+        self.assertIn(R10l, f.used_regs)
+
+    def test_move_removal(self):
+        """A move hints the same register, so it can be removed"""
+        f = Frame("tst")
+        t1 = ExampleRegister("t1")
+        t2 = ExampleRegister("t2")
+        f.instructions.append(Def(R1))
+        f.instructions.append(Mov(t1, R1, ismove=True))
+        f.instructions.append(Mov(t2, t1, ismove=True))
+        f.instructions.append(Use(t2))
+        self.register_allocator.alloc_frame(f)
+        self.assertIs(R1, t1.get_real())
+        self.assertIs(R1, t2.get_real())
+        self.assertEqual(2, len(f.instructions))
+
+    def test_spill(self):
+        """Spill a register when more values are live than registers"""
+        f = Frame("tst")
+        vregs = [ExampleRegister(f"t{i}") for i in range(6)]
+        for vreg in vregs:
+            f.instructions.append(Def(vreg))
+        f.instructions.append(Use3(*vregs[:3]))
+        f.instructions.append(Use3(*vregs[3:]))
+        spill_gen = self.make_spill_gen()
+        self.register_allocator.spill_gen = spill_gen
+        self.register_allocator.alloc_frame(f)
+        self.assertEqual(1, spill_gen.gen_load.call_count)
+        self.assertEqual(1, spill_gen.gen_store.call_count)
+        self.assertEqual(4, f.stacksize)
+        self.assertEqual(10, len(f.instructions))
+        for ins in f.instructions:
+            if len(ins.used_registers) == 3:
+                self.assertEqual(
+                    3, len({vreg.get_real() for vreg in ins.used_registers})
+                )
+
+
 if __name__ == "__main__":
     unittest.main()
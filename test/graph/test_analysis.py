@@ -0,0 +1,101 @@
+"""Test the cached control flow analysis of ir functions"""
+
+import unittest
+
+from ppci import ir, irutils
+from ppci.opt import CleanPass, ConstantFolder
+
+
+class AnalysisManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        """Create a function with a loop nested in another loop"""
+        self.builder = irutils.Builder()
+        self.module = ir.Module("test")
+        self.builder.set_module(self.module)
+        self.function = self.builder.new_procedure(
+            "testfunction", ir.Binding.GLOBAL
+        )
+        self.builder.set_function(self.function)
+        self.entry, self.outer, self.inner = [
+            self.builder.new_block() for _ in range(3)
+        ]
+        self.latch, self.tail, self.exit = [
+            self.builder.new_block() for _ in range(3)
+        ]
+        self.function.entry = self.entry
+        self.builder.set_block(self.entry)
+        one = self.builder.emit(ir.Const(1, "one", ir.i32))
+        self.builder.emit(ir.add(one, one, "two", ir.i32))
+        self.builder.emit(ir.Jump(self.outer))
+        self.builder.set_block(self.outer)
+        self.builder.emit(ir.Jump(self.inner))
+        self.builder.set_block(self.inner)
+        self.builder.emit(ir.CJump(one, "==", one, self.inner, self.latch))
+        self.builder.set_block(self.latch)
+        self.builder.emit(ir.CJump(one, "==", one, self.outer, self.tail))
+        self.builder.set_block(self.tail)
+        self.builder.emit(ir.Jump(self.exit))
+        self.builder.set_block(self.exit)
+        self.builder.emit(ir.Exit())
+        self.analysis = self.function.analysis
+
+    def test_dominators(self):
+        analysis = self.analysis
+        self.assertIs(analysis, self.function.analysis)
+        self.assertTrue(analysis.dominates(self.outer, self.latch))
+        self.assertFalse(analysis.dominates(self.latch, self.outer))
+        self.assertIs(self.inner, analysis.immediate_dominator(self.latch))
+        self.assertIsNone(analysis.immediate_dominator(self.entry))
+        self.assertEqual(
+            [self.inner], analysis.dominator_tree_children(self.outer)
+        )
+        self.assertEqual({self.outer}, analysis.dominance_frontier[self.latch])
+        self.assertEqual([], analysis.dominator_tree_children(self.exit))
+
+    def test_post_dominators(self):
+        analysis = self.analysis
+        self.assertTrue(analysis.post_dominates(self.tail, self.outer))
+        self.assertIs(self.exit, analysis.immediate_post_dominator(self.tail))
+        self.assertIsNone(analysis.immediate_post_dominator(self.exit))
+
+    def test_loops(self):
+        analysis = self.analysis
+        self.assertEqual(
+            [self.outer, self.inner], [loop.header for loop in analysis.loops]
+        )
+        self.assertEqual([self.inner, self.latch], analysis.loops[0].rest)
+        self.assertEqual(0, analysis.loop_depth(self.entry))
+        self.assertEqual(1, analysis.loop_depth(self.latch))
+        self.assertEqual(2, analysis.loop_depth(self.inner))
+
+    def test_loop_preheader(self):
+        outer, inner = self.analysis.loops
+        self.assertIs(self.entry, self.analysis.loop_preheader(outer))
+        self.assertIs(self.outer, self.analysis.loop_preheader(inner))
+
+        # A conditional jump into the loop is no preheader:
+        one = self.entry.first_instruction
+        self.entry.last_instruction.remove_from_block()
+        self.entry.add_instruction(
+            ir.CJump(one, "==", one, self.outer, self.tail)
+        )
+        self.analysis.invalidate()
+        self.assertIsNone(self.analysis.loop_preheader(outer))
+
+    def test_cached(self):
+        cfg_info = self.analysis.cfg_info
+        self.assertIs(cfg_info, self.analysis.cfg_info)
+
+        # Folding constants keeps the control flow graph:
+        self.assertTrue(ConstantFolder().run_on_function(self.function))
+        self.assertIs(cfg_info, self.analysis.cfg_info)
+
+    def test_invalidated_by_cfg_change(self):
+        cfg_info = self.analysis.cfg_info
+        self.assertTrue(CleanPass().run_on_function(self.function))
+        self.assertIsNot(cfg_info, self.analysis.cfg_info)
+        self.assertNotIn(self.tail, self.function.blocks)
+
+
+if __name__ == "__main__":
+    unittest.main()
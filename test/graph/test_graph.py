@@ -307,6 +307,64 @@ class InterferenceGraphTestCase(unittest.TestCase):
         self.assertEqual({x}, b2.live_out)
         self.assertEqual({x}, b3.live_out)
 
+    def test_update_after_spill(self):
+        """Spill x in a loop like in test_loop_variable, and update the
+        liveness instead of calculating it again."""
+        x = ExampleRegister("x")
+        label = Nop()
+        i1 = Def(x)
+        jump = Nop(jumps=[label])
+        i2 = Use(x)
+        i3 = Def(x)
+        i5 = Nop(jumps=[label])
+        i4 = Nop(jumps=[i5])
+        instrs = [i1, jump, label, i2, i3, i4, i5]
+        cfg = FlowGraph(instrs)
+        cfg.calculate_liveness()
+
+        # Store x after its definitions, and load it before its use:
+        x1, x2, x3 = (ExampleRegister(f"x{n}") for n in range(1, 4))
+        store1, load2, store3 = Use(x1), Def(x2), Use(x3)
+        for ins, new in ((i1, x1), (i2, x2), (i3, x3)):
+            ins.replace_register(x, new)
+            cfg.instruction_changed(ins)
+        cfg.insert_code_after(i1, [store1])
+        cfg.insert_code_before(i2, [load2])
+        cfg.insert_code_after(i3, [store3])
+        cfg.update_liveness([x])
+
+        b1 = cfg.get_node(i1)
+        b2 = cfg.get_node(label)
+        self.assertEqual([i1, store1, jump], b1.instructions)
+        self.assertEqual([label, load2, i2, i3, store3, i4], b2.instructions)
+        self.assertEqual(set(), b1.live_out)
+        self.assertEqual(set(), b2.live_in)
+        self.assertEqual({x2}, load2.live_out)
+        self.assertEqual({x3}, i3.live_out)
+
+        # The same as calculating liveness again:
+        instrs = [i1, store1, jump, label, load2, i2, i3, store3, i4, i5]
+        expected = [(ins.live_in, ins.live_out) for ins in instrs]
+        FlowGraph(instrs).calculate_liveness()
+        self.assertEqual(
+            expected, [(ins.live_in, ins.live_out) for ins in instrs]
+        )
+
+    def test_loop_depth(self):
+        """Nodes in nested loops run more often"""
+        outer = Nop()
+        inner = Nop()
+        exit = Nop()
+        latch = Nop(jumps=[outer, exit])
+        inner.jumps = [inner, latch]
+        entry = Nop(jumps=[outer])
+        outer.jumps = [inner]
+        instrs = [entry, outer, inner, latch, exit]
+        cfg = FlowGraph(instrs)
+        self.assertEqual(
+            [1, 10, 100, 10, 1], [cfg.frequency(ins) for ins in instrs]
+        )
+
     def test_combine(self):
         t1 = ExampleRegister("t1")
         t2 = ExampleRegister("t2")
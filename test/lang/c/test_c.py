@@ -29,6 +29,7 @@ class CFrontendTestCase(unittest.TestCase):
             raise
         assert isinstance(ir_module, ir.Module)
         verify_module(ir_module)
+        return ir_module
 
     def _print_ast(self, src):
         # Try to parse ast as well:
@@ -932,6 +933,62 @@ class CFrontendTestCase(unittest.TestCase):
         """
         self.do(src)
 
+    def test_inline_hints(self):
+        """Test that inline hints are passed to the optimizer."""
+        src = """
+        static inline int a(int x) { return x; }
+        __attribute__((always_inline)) int b(int x) { return x; }
+        __attribute__((noinline)) int c(int x) { return x; }
+        int d(int x) { return x; }
+        """
+        ir_module = self._do_compile(src)
+        hints = {f.name: f.inline_hint for f in ir_module.functions}
+        self.assertEqual(
+            {
+                "a": ir.InlineHint.INLINE,
+                "b": ir.InlineHint.ALWAYS,
+                "c": ir.InlineHint.NEVER,
+                "d": ir.InlineHint.DEFAULT,
+            },
+            hints,
+        )
+
+    def test_loop_pragmas(self):
+        """Test that loop unroll pragmas are passed to the optimizer."""
+        src = """
+        void f(int *a) {
+          int i;
+          #pragma unroll
+          for (i = 0; i < 4; i++) a[i] = i;
+          #pragma unroll 2
+          while (a[0]) a[0]--;
+          #pragma nounroll
+          do { a[1]++; } while (a[1] < 10);
+          for (i = 0; i < 4; i++) a[i] = i;
+        }
+        """
+        ir_module = self._do_compile(src)
+        self._print_ast(src)
+        (function,) = ir_module.functions
+        unroll = [b.unroll for b in function.blocks if b.unroll is not None]
+        self.assertEqual([0, 1, 2], sorted(unroll))
+
+    def test_invalid_loop_pragmas(self):
+        src = """
+        void f(int *a) {
+          #pragma unroll 0
+          while (a[0]) a[0]--;
+        }
+        """
+        self.expect_error(src, 3, "Invalid loop pragma")
+        src = """
+        void f(int *a) {
+          #pragma unroll
+          a[0]--;
+        }
+        """
+        self.expect_error(src, 3, "Expected a loop after this pragma")
+
     def test_inline_asm(self):
         """Test inline assembly code."""
         src = """
@@ -0,0 +1,96 @@
+"""Benchmark the memory use and construction time of a large IR module.
+
+Builds a module with many generated functions, like a whole program
+build of a kernel library, and reports the construction time, the
+memory allocated for the IR and the peak resident set size.
+
+Usage: python run_ir_benchmark.py [--functions N] [--blocks N]
+"""
+
+import argparse
+import resource
+import sys
+import time
+import tracemalloc
+
+from ppci import ir, irutils
+
+
+def build_module(n_functions, n_blocks, n_instructions):
+    """Generate a module with loops of loads, arithmetic and stores"""
+    builder = irutils.Builder()
+    module = ir.Module("benchmark")
+    builder.set_module(module)
+    for f_nr in range(n_functions):
+        function = builder.new_procedure(f"f{f_nr}", ir.Binding.GLOBAL)
+        builder.set_function(function)
+        data = ir.Parameter("data", ir.ptr)
+        function.add_parameter(data)
+        count = ir.Parameter("count", ir.i32)
+        function.add_parameter(count)
+        entry = builder.new_block()
+        function.entry = entry
+        builder.set_block(entry)
+        zero = builder.emit(ir.Const(0, "zero", ir.i32))
+        one = builder.emit(ir.Const(1, "one", ir.i32))
+        previous = entry
+        for _ in range(n_blocks):
+            header = builder.new_block()
+            body = builder.new_block()
+            done = builder.new_block()
+            builder.emit(ir.Jump(header))
+            builder.set_block(header)
+            i = builder.emit(ir.Phi("i", ir.i32))
+            i.set_incoming(previous, zero)
+            builder.emit(ir.CJump(i, "<", count, body, done))
+            builder.set_block(body)
+            value = builder.emit(ir.Load(data, "value", ir.i32))
+            for _ in range(n_instructions):
+                value = builder.emit(ir.add(value, i, "value", ir.i32))
+                value = builder.emit(ir.mul(value, value, "value", ir.i32))
+            builder.emit(ir.Store(value, data))
+            i_next = builder.emit(ir.add(i, one, "i_next", ir.i32))
+            i.set_incoming(body, i_next)
+            builder.emit(ir.Jump(header))
+            builder.set_block(done)
+            previous = done
+        builder.emit(ir.Exit())
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--functions", type=int, default=2000)
+    parser.add_argument("--blocks", type=int, default=4)
+    parser.add_argument("--instructions", type=int, default=16)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    module = build_module(args.functions, args.blocks, args.instructions)
+    duration = time.perf_counter() - start
+
+    # Linux reports the peak resident set size in kilobytes:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss //= 1024
+
+    # Build again while tracing, to see what the IR itself takes:
+    del module
+    tracemalloc.start()
+    module = build_module(args.functions, args.blocks, args.instructions)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    n_instructions = sum(
+        len(block) for function in module.functions for block in function
+    )
+    print(f"functions:         {len(module.functions)}")
+    print(f"instructions:      {n_instructions}")
+    print(f"construction time: {duration:.2f} s")
+    print(f"IR memory:         {current / 2**20:.1f} MiB")
+    print(f"bytes/instruction: {current / n_instructions:.0f}")
+    print(f"peak RSS:          {peak_rss / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from ppci import ir
+from ppci.build.cache import CompileCache
+
+
+class CompileCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CompileCache(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key(self):
+        key = self.cache.key("a.c", "int x;", 2)
+        self.assertEqual(key, self.cache.key("a.c", "int x;", 2))
+        self.assertNotEqual(key, self.cache.key("a.c", "int x;", 0))
+
+    def test_hit_and_miss(self):
+        key = self.cache.key("a")
+        self.assertIsNone(self.cache.get(key, "txt"))
+        self.cache.put(key, "txt", "hello")
+        self.assertEqual("hello", self.cache.get(key, "txt"))
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_evict_least_recently_used(self):
+        cache = self.cache
+        keys = [cache.key(i) for i in range(3)]
+        for age, key in enumerate(keys):
+            cache.put(key, "txt", "x" * 4)
+            path = cache._path(key, "txt")
+            os.utime(path, (age, age))
+
+        # Using the first entry makes the second the oldest
+        cache.get(keys[0], "txt")
+        cache.max_size = 10
+        cache.evict()
+        self.assertIsNotNone(cache.get(keys[0], "txt"))
+        self.assertIsNone(cache.get(keys[1], "txt"))
+        self.assertIsNotNone(cache.get(keys[2], "txt"))
+
+    def test_ir(self):
+        module = ir.Module("mod1")
+        key = self.cache.key("mod1")
+        self.cache.store_ir(key, module)
+        self.assertEqual("mod1", self.cache.load_ir(key).name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,6 +20,7 @@ from ppci.cli.objdump import objdump
 from ppci.cli.ocaml import ocaml
 from ppci.cli.opt import opt
 from ppci.cli.pascal import pascal
+from ppci.cli.twig import twig
 from ppci.cli.yacc import yacc
 from ppci.common import DiagnosticsManager, SourceLocation
 
@@ -110,6 +111,14 @@ class CcTestCase(unittest.TestCase):
         oj_file = new_temp_file(".oj")
         cc(["-m", "arm", "-S", self.c_file, "-o", oj_file])
 
+    @patch("sys.stdout", new_callable=io.StringIO)
+    @patch("sys.stderr", new_callable=io.StringIO)
+    def test_cc_command_regalloc(self, mock_stdout, mock_stderr):
+        """Select the linear scan register allocator at -O2"""
+        oj_file = new_temp_file(".oj")
+        args = ["-m", "arm", "-O2", "-fregalloc=linear", "-o", oj_file]
+        cc(args + [self.c_file])
+
     @patch("sys.stdout", new_callable=io.StringIO)
     @patch("sys.stderr", new_callable=io.StringIO)
     def test_cc_command_e(self, mock_stdout, mock_stderr):
@@ -132,6 +141,43 @@ class CcTestCase(unittest.TestCase):
         self.assertIn("compiler", mock_stdout.getvalue())
 
 
+class TwigTestCase(unittest.TestCase):
+    """Test the twig command-line utility"""
+
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_help(self, mock_stdout):
+        with self.assertRaises(SystemExit) as cm:
+            twig(["-h"])
+        self.assertEqual(0, cm.exception.code)
+        self.assertIn("--jobs", mock_stdout.getvalue())
+
+    @patch("sys.stdout", new_callable=io.StringIO)
+    @patch("sys.stderr", new_callable=io.StringIO)
+    def test_jobs(self, mock_stdout, mock_stderr):
+        """Compile two translation units in parallel and link them"""
+        sources = []
+        for text in [
+            "int helper(int x);\nint main(int x) { return helper(x) + 1; }\n",
+            "int helper(int x) { return x * 2; }\n",
+        ]:
+            filename = new_temp_file(".c")
+            with open(filename, "w") as f:
+                f.write(text)
+            sources.append(filename)
+        obj_file = new_temp_file(".oj")
+        hex_file = new_temp_file(".bin")
+        twig(
+            sources
+            + ["-j", "2", "--entry", "main", "-o", obj_file]
+            + ["--hex-output", hex_file]
+        )
+        with open(obj_file, "r") as f:
+            obj = ObjectFile.load(f)
+        names = [symbol.name for symbol in obj.symbols]
+        self.assertIn("main", names)
+        self.assertIn("helper", names)
+
+
 class PascalTestCase(unittest.TestCase):
     """Test the pascal command-line program"""
 
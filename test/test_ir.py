@@ -34,6 +34,69 @@ class IrCodeTestCase(unittest.TestCase):
         self.assertEqual(c4, add.b)
 
 
+class BlockTestCase(unittest.TestCase):
+    def setUp(self):
+        self.function = ir.Procedure("f", ir.Binding.GLOBAL)
+        self.block = ir.Block("b")
+        self.function.add_block(self.block)
+        self.consts = [ir.Const(i, f"c{i}", ir.i32) for i in range(4)]
+
+    def test_insert_and_remove(self):
+        c0, c1, c2, c3 = self.consts
+        self.block.add_instruction(c1)
+        self.block.add_instruction(c3)
+        self.block.insert_instruction(c0)
+        self.block.insert_instruction(c2, before_instruction=c3)
+        self.assertEqual([c0, c1, c2, c3], self.block.instructions)
+        self.assertEqual(4, len(self.block))
+        self.assertIs(c2, self.block[2])
+        self.assertIs(c3, self.block[-1])
+        self.assertEqual(2, c2.position)
+        self.assertTrue(c1.precedes(c2))
+        self.assertFalse(c3.precedes(c0))
+
+        self.block.remove_instruction(c2)
+        self.assertEqual([c0, c1, c3], self.block.instructions)
+        self.assertIs(c3, c1.next_instruction)
+        self.assertIsNone(c2.block)
+
+    def test_renumber(self):
+        """Many inserts at the same place exhaust the sequence numbers"""
+        c0, c1 = self.consts[:2]
+        self.block.add_instruction(c0)
+        self.block.add_instruction(c1)
+        inserted = []
+        for i in range(20):
+            cnst = ir.Const(i, "x", ir.i32)
+            self.block.insert_instruction(cnst, before_instruction=c1)
+            inserted.append(cnst)
+        instructions = self.block.instructions
+        self.assertEqual([c0] + inserted + [c1], instructions)
+        for one, another in zip(instructions, instructions[1:]):
+            self.assertTrue(one.precedes(another))
+
+    def test_remove_while_iterating(self):
+        for cnst in self.consts:
+            self.block.add_instruction(cnst)
+        visited = []
+        for instruction in self.block:
+            visited.append(instruction)
+            if instruction.value % 2 == 0:
+                self.block.remove_instruction(instruction)
+        self.assertEqual(self.consts, visited)
+        self.assertEqual(self.consts[1::2], self.block.instructions)
+
+    def test_split_block(self):
+        for cnst in self.consts:
+            self.block.add_instruction(cnst)
+        self.block.add_instruction(ir.Exit())
+        _, block2 = irutils.split_block(self.block, pos=2)
+        self.assertEqual(self.consts[:2], self.block.instructions[:2])
+        self.assertIsInstance(self.block.last_instruction, ir.Jump)
+        self.assertEqual(self.consts[2:], block2.instructions[:2])
+        self.assertIs(block2, self.consts[3].block)
+
+
 class IrBuilderTestCase(unittest.TestCase):
     def setUp(self):
         self.b = irutils.Builder()
@@ -113,6 +176,51 @@ class TestWriter(unittest.TestCase):
         self.assertEqual(f3.getvalue(), f.getvalue())
 
 
+class JsonTestCase(unittest.TestCase):
+    def test_predicated_roundtrip(self):
+        """Predicate annotations, predicated jumps and guards survive"""
+        module = ir.Module("mod1")
+        function = ir.Procedure("func1", ir.Binding.GLOBAL)
+        module.add_function(function)
+        entry = ir.Block("entry")
+        then = ir.Block("then")
+        done = ir.Block("done")
+        for block in (entry, then, done):
+            function.add_block(block)
+        function.entry = entry
+        one = ir.Const(1, "one", ir.i32)
+        two = ir.Const(2, "two", ir.i32)
+        cmp = ir.CompareSet(one, "<", two, "cmp", ir.i32)
+        add = ir.add(one, two, "add", ir.i32)
+        add.pred = 1
+        for instruction in (
+            ir.PredicateAnnotation(0, "11111"),
+            one,
+            two,
+            cmp,
+            ir.BJump(cmp, "!=", one, then, done, 1, 2, 0),
+        ):
+            entry.add_instruction(instruction)
+        then.add_instruction(ir.PredicateAnnotation(1, "1", "if_then", 0))
+        then.add_instruction(add)
+        then.add_instruction(ir.SJump(one, "==", two, done, 3))
+        done.add_instruction(ir.Exit())
+
+        txt = irutils.to_json(module)
+        module2 = irutils.from_json(txt)
+        self.assertEqual(txt, irutils.to_json(module2))
+        entry2, then2, _ = module2.functions[0].blocks
+        self.assertIsInstance(entry2.instructions[0], ir.PredicateAnnotation)
+        self.assertIsInstance(entry2.instructions[3], ir.CompareSet)
+        bjump = entry2.instructions[4]
+        self.assertIsInstance(bjump, ir.BJump)
+        self.assertEqual((1, 2), (bjump.pred_yes_id, bjump.pred_no_id))
+        self.assertEqual("if_then", then2.instructions[0].context_name)
+        self.assertEqual(1, then2.instructions[1].pred)
+        self.assertEqual(3, then2.instructions[2].pred_yes_id)
+        self.assertEqual(0, entry2.instructions[3].pred)
+
+
 class TestReader(unittest.TestCase):
     def test_add_example(self):
         sample = test_path / "data" / "add.pi"
@@ -7,13 +7,42 @@ import sys
 import unittest
 
 from ppci import ir, irutils
+from ppci.api import c3_to_ir, ir_to_python, optimize
 from ppci.binutils.debuginfo import DebugDb
 from ppci.irutils import verify_module
-from ppci.opt import CleanPass, Mem2RegPromotor
+from ppci.opt import (
+    CleanPass,
+    DeleteUnusedInstructionsPass,
+    GlobalValueNumberingPass,
+    InlinePass,
+    LoopInvariantCodeMotionPass,
+    LoopUnrollPass,
+    Mem2RegPromotor,
+    PassManager,
+    SparseConditionalConstantPropagationPass,
+    StrengthReductionPass,
+    create_pipeline,
+)
 from ppci.opt.constantfolding import correct
 from ppci.opt.tailcall import TailCallOptimization
 
 
+def execute(module, name, *args):
+    """Translate the module to python and call one of its functions"""
+    f = io.StringIO()
+    ir_to_python([module], f)
+    namespace = {}
+    exec(f.getvalue(), namespace)
+    return namespace[name](*args)
+
+
+def compile_c3(source, level):
+    """Compile a c3 module to ir, optimized at the given level"""
+    module = c3_to_ir([io.StringIO(source)], [], "arm")
+    optimize(module, level=level)
+    return module
+
+
 class OptTestCase(unittest.TestCase):
     """Base testcase that prepares a module, builder and verifier"""
 
@@ -80,6 +109,56 @@ class CleanTestCase(OptTestCase):
         self.clean_pass.run(self.module)
         self.assertNotIn(block4, self.function)
 
+    def test_keep_jump_to_phi(self):
+        """A jump only block stays when its predecessor also jumps to the
+        target, since the phi takes a different value from each"""
+        self.builder.emit(ir.Exit())
+        function = self.builder.new_function(
+            "select", ir.Binding.GLOBAL, ir.i32
+        )
+        x = ir.Parameter("x", ir.i32)
+        function.add_parameter(x)
+        self.builder.set_function(function)
+        function.entry = self.builder.new_block()
+        negative = self.builder.new_block()
+        final = self.builder.new_block()
+        self.builder.set_block(function.entry)
+        zero = self.builder.emit_const(0, ir.i32)
+        self.builder.emit(ir.CJump(x, "<", zero, negative, final))
+        self.builder.set_block(negative)
+        self.builder.emit(ir.Jump(final))
+        self.builder.set_block(final)
+        phi = self.builder.emit(ir.Phi("result", ir.i32))
+        phi.set_incoming(function.entry, x)
+        phi.set_incoming(negative, zero)
+        self.builder.emit(ir.Return(phi))
+
+        self.clean_pass.run(self.module)
+        self.assertIn(negative, function)
+        self.assertEqual(
+            [5, 0], [execute(self.module, "select", v) for v in (5, -5)]
+        )
+
+
+class DeleteUnusedTestCase(OptTestCase):
+    """Test the removal of unused values"""
+
+    def test_chain(self):
+        """Values only used by removed values are removed in the same run"""
+        block = self.builder.new_block()
+        one = self.builder.emit_const(1, ir.i32)
+        two = self.builder.emit(ir.add(one, one, "two", ir.i32))
+        self.builder.emit(ir.Jump(block))
+        self.builder.set_block(block)
+        self.builder.emit(ir.add(two, two, "four", ir.i32))
+        self.builder.emit(ir.Exit())
+
+        delete_unused = DeleteUnusedInstructionsPass()
+        self.assertTrue(delete_unused.run(self.module))
+        self.assertEqual(1, len(self.function.entry.instructions))
+        self.assertEqual(1, len(block.instructions))
+        self.assertFalse(delete_unused.run(self.module))
+
 
 class Mem2RegTestCase(OptTestCase):
     """Test the memory to register lifter"""
@@ -95,7 +174,7 @@ class Mem2RegTestCase(OptTestCase):
         self.builder.emit(ir.Store(cnst, addr))
         self.builder.emit(ir.Load(addr, "Ld", ir.i32))
         self.builder.emit(ir.Exit())
-        self.mem2reg.run(self.module)
+        self.assertTrue(self.mem2reg.run(self.module))
         self.assertNotIn(alloc, self.function.entry.instructions)
 
     def test_byte_lift(self):
@@ -117,7 +196,7 @@ class Mem2RegTestCase(OptTestCase):
         self.builder.emit(ir.Store(cnst, addr))
         self.builder.emit(ir.Load(addr, "Ld", ir.i8, volatile=True))
         self.builder.emit(ir.Exit())
-        self.mem2reg.run(self.module)
+        self.assertFalse(self.mem2reg.run(self.module))
         self.assertIn(alloc, self.function.entry.instructions)
 
     def test_different_type_not_lifted(self):
@@ -142,6 +221,665 @@ class Mem2RegTestCase(OptTestCase):
         self.assertIn(alloc, self.function.entry.instructions)
 
 
+class PassManagerTestCase(OptTestCase):
+    """Test running a pipeline of passes until nothing changes"""
+
+    def test_fixpoint(self):
+        # if (1 == 2) x = 3 else x = 4; with the decision made on constants
+        yes = self.builder.new_block()
+        no = self.builder.new_block()
+        final = self.builder.new_block()
+        one = self.builder.emit(ir.Const(1, "one", ir.i32))
+        two = self.builder.emit(ir.Const(2, "two", ir.i32))
+        self.builder.emit(ir.CJump(one, "==", two, yes, no))
+        self.builder.set_block(yes)
+        three = self.builder.emit(ir.Const(3, "three", ir.i32))
+        self.builder.emit(ir.Jump(final))
+        self.builder.set_block(no)
+        four = self.builder.emit(ir.Const(4, "four", ir.i32))
+        self.builder.emit(ir.Jump(final))
+        self.builder.set_block(final)
+        phi = self.builder.emit(ir.Phi("x", ir.i32))
+        phi.set_incoming(yes, three)
+        phi.set_incoming(no, four)
+        alloc = self.builder.emit(ir.Alloc("A", 4, 4))
+        addr = self.builder.emit(ir.AddressOf(alloc, "addr"))
+        self.builder.emit(ir.Store(phi, addr))
+        self.builder.emit(ir.Exit())
+        verify_module(self.module)
+
+        pass_manager = PassManager(create_pipeline(2))
+        self.assertTrue(pass_manager.run(self.module))
+
+        # The jump is folded, the taken branch glued into the entry and the
+        # stored phi promoted and removed:
+        self.assertIsInstance(self.function.entry.last_instruction, ir.Exit)
+        self.assertNotIn(alloc, self.function.entry.instructions)
+
+        # Running the pipeline again finds nothing more to do:
+        invocations = pass_manager.invocations
+        self.assertFalse(pass_manager.run(self.module))
+        self.assertEqual(
+            invocations + len(pass_manager.passes), pass_manager.invocations
+        )
+
+    def test_levels_differ(self):
+        self.builder.emit(ir.Exit())
+        self.assertEqual([], create_pipeline(0))
+        self.assertLess(len(create_pipeline(1)), len(create_pipeline(2)))
+
+
+class SparseConditionalConstantPropagationTestCase(OptTestCase):
+    """Test the propagation of constants along executable paths"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = ir.Variable("data", ir.Binding.GLOBAL, 4, 4)
+        self.module.add_variable(self.data)
+        self.sccp = SparseConditionalConstantPropagationPass()
+
+    def stored_values(self):
+        return [
+            instruction.value
+            for block in self.function
+            for instruction in block
+            if isinstance(instruction, ir.Store)
+        ]
+
+    def test_branch_not_taken(self):
+        yes, no, final = [self.builder.new_block() for _ in range(3)]
+        one = self.builder.emit(ir.Const(1, "one", ir.i32))
+        self.builder.emit(ir.CJump(one, "==", one, yes, no))
+        self.builder.set_block(yes)
+        five = self.builder.emit(ir.Const(5, "five", ir.i32))
+        self.builder.emit(ir.Jump(final))
+        self.builder.set_block(no)
+        six = self.builder.emit(ir.Const(6, "six", ir.i32))
+        self.builder.emit(ir.Jump(final))
+        self.builder.set_block(final)
+        phi = self.builder.emit(ir.Phi("phi", ir.i32))
+        phi.set_incoming(yes, five)
+        phi.set_incoming(no, six)
+        self.builder.emit(ir.Store(phi, self.data))
+        self.builder.emit(ir.Exit())
+
+        self.assertTrue(self.sccp.run(self.module))
+        self.assertNotIn(no, self.function.blocks)
+        self.assertIsInstance(self.function.entry.last_instruction, ir.Jump)
+        (value,) = self.stored_values()
+        self.assertIsInstance(value, ir.Const)
+        self.assertEqual(5, value.value)
+
+    def test_loop_carried_constant(self):
+        header, body, final = [self.builder.new_block() for _ in range(3)]
+        three = self.builder.emit(ir.Const(3, "three", ir.i32))
+        self.builder.emit(ir.Jump(header))
+        self.builder.set_block(header)
+        x = self.builder.emit(ir.Phi("x", ir.i32))
+        bound = self.builder.emit(ir.Load(self.data, "bound", ir.i32))
+        self.builder.emit(ir.CJump(bound, ">", three, body, final))
+        self.builder.set_block(body)
+        x_next = self.builder.emit(ir.Binop(x, "&", x, "x_next", ir.i32))
+        self.builder.emit(ir.Store(x_next, self.data))
+        self.builder.emit(ir.Jump(header))
+        x.set_incoming(self.function.entry, three)
+        x.set_incoming(body, x_next)
+        self.builder.set_block(final)
+        self.builder.emit(ir.Exit())
+
+        self.assertTrue(self.sccp.run(self.module))
+        (value,) = self.stored_values()
+        self.assertIsInstance(value, ir.Const)
+        self.assertEqual(3, value.value)
+        self.assertIn(body, self.function.blocks)
+
+    def emit_branch(self, a, b):
+        """Create an if statement with an else arm in SIMT form"""
+        entry = self.function.entry
+        self.then_block, self.else_block, self.final = [
+            self.builder.new_block() for _ in range(3)
+        ]
+        entry.add_instruction(ir.PredicateAnnotation(0, "", "root"))
+        a = self.builder.emit(ir.Const(a, "a", ir.i32))
+        b = self.builder.emit(ir.Const(b, "b", ir.i32))
+        self.builder.emit(
+            ir.BJump(a, ">", b, self.then_block, self.else_block, 1, 2, 0)
+        )
+        for block, pred, value, target in (
+            (self.then_block, 1, 1, self.else_block),
+            (self.else_block, 2, 2, self.final),
+        ):
+            self.builder.set_block(block)
+            context = "if_then" if pred == 1 else "if_else"
+            block.add_instruction(ir.PredicateAnnotation(pred, "", context))
+            value = self.builder.emit(ir.Const(value, "value", ir.i32))
+            store = self.builder.emit(ir.Store(value, self.data))
+            value.pred = store.pred = pred
+            self.builder.emit(ir.Jump(target))
+        self.builder.set_block(self.final)
+        self.final.add_instruction(ir.PredicateAnnotation(0, "", "reconverge"))
+        self.builder.emit(ir.Exit())
+
+    def test_then_arm_taken(self):
+        self.emit_branch(4, 2)
+        self.assertTrue(self.sccp.run(self.module))
+        self.assertNotIn(self.else_block, self.function.blocks)
+        self.assertIs(self.final, self.then_block.last_instruction.target)
+        (value,) = self.stored_values()
+        self.assertEqual(1, value.value)
+        for instruction in self.then_block:
+            self.assertEqual(0, instruction.pred)
+
+    def test_else_arm_taken(self):
+        self.emit_branch(2, 4)
+        self.assertTrue(self.sccp.run(self.module))
+        self.assertNotIn(self.then_block, self.function.blocks)
+        jump = self.function.entry.last_instruction
+        self.assertIs(self.else_block, jump.target)
+        (value,) = self.stored_values()
+        self.assertEqual(2, value.value)
+        for instruction in self.else_block:
+            self.assertEqual(0, instruction.pred)
+
+    def test_skip_loop(self):
+        header, body, final = [self.builder.new_block() for _ in range(3)]
+        zero = self.builder.emit(ir.Const(0, "zero", ir.i32))
+        self.builder.emit(ir.Jump(header))
+        self.builder.set_block(header)
+        i = self.builder.emit(ir.Phi("i", ir.i32))
+        ten = self.builder.emit(ir.Const(10, "ten", ir.i32))
+        self.builder.emit(ir.SJump(i, ">", ten, body, 1))
+        self.builder.set_block(body)
+        one = self.builder.emit(ir.Const(1, "one", ir.i32))
+        i_next = self.builder.emit(ir.add(i, one, "i_next", ir.i32))
+        self.builder.emit(ir.PJump(i_next, ">", ten, header, final, 1, 0, 0))
+        for instruction in body:
+            instruction.pred = 1
+        i.set_incoming(self.function.entry, zero)
+        i.set_incoming(body, i_next)
+        self.builder.set_block(final)
+        self.builder.emit(ir.Store(i_next, self.data))
+        self.builder.emit(ir.Exit())
+
+        self.assertTrue(self.sccp.run(self.module))
+        self.assertNotIn(body, self.function.blocks)
+        self.assertIs(final, header.last_instruction.target)
+        (value,) = self.stored_values()
+        self.assertIs(i, value)
+
+
+class GlobalValueNumberingTestCase(OptTestCase):
+    """Test the replacement of values computed in dominating blocks"""
+
+    def setUp(self):
+        super().setUp()
+        self.gvn = GlobalValueNumberingPass()
+        self.data = ir.Variable("data", ir.Binding.GLOBAL, 16, 4)
+        self.module.add_variable(self.data)
+
+    def test_dominating_block(self):
+        one = self.builder.emit(ir.Const(1, "one", ir.i32))
+        load = self.builder.emit(ir.Load(self.data, "value", ir.i32))
+        total = self.builder.emit(ir.add(load, one, "total", ir.i32))
+        block = self.builder.new_block()
+        self.builder.emit(ir.Jump(block))
+        self.builder.set_block(block)
+        one2 = self.builder.emit(ir.Const(1, "one2", ir.i32))
+        load2 = self.builder.emit(ir.Load(self.data, "value2", ir.i32))
+        total2 = self.builder.emit(ir.add(one2, load2, "total2", ir.i32))
+        store = self.builder.emit(ir.Store(total2, self.data))
+        self.builder.emit(ir.Exit())
+
+        # The constant is not kept alive from the entry block, but the
+        # expression using it is still found:
+        self.assertTrue(self.gvn.run(self.module))
+        self.assertEqual(
+            [one2, store, block.last_instruction], block.instructions
+        )
+        self.assertIs(total, store.value)
+        self.assertFalse(self.gvn.run(self.module))
+
+    def test_store_kills_load(self):
+        four = self.builder.emit(ir.Const(4, "four", ir.ptr))
+        field = self.builder.emit(ir.add(self.data, four, "field", ir.ptr))
+        load = self.builder.emit(ir.Load(self.data, "value", ir.i32))
+        block = self.builder.new_block()
+        self.builder.emit(ir.Jump(block))
+        self.builder.set_block(block)
+        self.builder.emit(ir.Store(load, field))
+        load2 = self.builder.emit(ir.Load(self.data, "value2", ir.i32))
+        self.builder.emit(ir.Store(load2, self.data))
+        load3 = self.builder.emit(ir.Load(self.data, "value3", ir.i32))
+        store = self.builder.emit(ir.Store(load3, field))
+        self.builder.emit(ir.Exit())
+
+        # The store to the field does not write the first word, the store
+        # to the first word makes the stored value available:
+        self.assertTrue(self.gvn.run(self.module))
+        self.assertNotIn(load2, block.instructions)
+        self.assertNotIn(load3, block.instructions)
+        self.assertIs(load, store.value)
+
+    def test_hoist_from_branches(self):
+        yes = self.builder.new_block()
+        no = self.builder.new_block()
+        final = self.builder.new_block()
+        callee = ir.ExternalFunction("threadIdx", [], ir.i32)
+        self.module.add_external(callee)
+        zero = self.builder.emit(ir.Const(0, "zero", ir.i32))
+        self.builder.emit(ir.CJump(zero, "==", zero, yes, no))
+        values = []
+        for block in (yes, no):
+            self.builder.set_block(block)
+            thread = self.builder.emit(
+                ir.FunctionCall(callee, [], "thread", ir.i32)
+            )
+            four = self.builder.emit(ir.Const(4, "four", ir.i32))
+            offset = self.builder.emit(ir.mul(thread, four, "offset", ir.i32))
+            values.append(offset)
+            self.builder.emit(ir.Jump(final))
+        self.builder.set_block(final)
+        phi = self.builder.emit(ir.Phi("offset", ir.i32))
+        phi.set_incoming(yes, values[0])
+        phi.set_incoming(no, values[1])
+        self.builder.emit(ir.Exit())
+
+        self.assertTrue(self.gvn.run(self.module))
+        self.assertEqual(1, len(yes))
+        self.assertEqual(1, len(no))
+        self.assertIs(self.function.entry, values[0].block)
+        self.assertIs(values[0], phi.get_value(no))
+
+
+class LoopOptimizationTestCase(OptTestCase):
+    """Test the loop invariant code motion and strength reduction"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = ir.Variable("data", ir.Binding.GLOBAL, 64, 4)
+        self.module.add_variable(self.data)
+        self.header = self.builder.new_block()
+        self.body = self.builder.new_block()
+        self.final = self.builder.new_block()
+        self.zero = self.builder.emit(ir.Const(0, "zero", ir.i32))
+        self.builder.emit(ir.Jump(self.header))
+        self.builder.set_block(self.header)
+        self.i = self.builder.emit(ir.Phi("i", ir.i32))
+        self.builder.set_block(self.final)
+        self.builder.emit(ir.Exit())
+
+    def close_loop(self, condition=None):
+        """Increment i at the end of the loop body, test it in the header"""
+        one = self.builder.emit(ir.Const(1, "one", ir.i32))
+        i_next = self.builder.emit(ir.add(self.i, one, "i_next", ir.i32))
+        latch = self.builder.block
+        self.builder.emit(ir.Jump(self.header))
+        self.builder.set_block(self.header)
+        if condition is None:
+            condition = self.builder.emit(ir.Const(10, "ten", ir.i32))
+        self.builder.emit(
+            ir.CJump(self.i, "<", condition, self.body, self.final)
+        )
+        self.i.set_incoming(self.function.entry, self.zero)
+        self.i.set_incoming(latch, i_next)
+
+    def test_hoist_invariant(self):
+        self.builder.set_block(self.body)
+        eight = self.builder.emit(ir.Const(8, "eight", ir.ptr))
+        field = self.builder.emit(ir.add(self.data, eight, "field", ir.ptr))
+        self.builder.emit(ir.Store(self.i, field))
+        self.close_loop()
+
+        pass_ = LoopInvariantCodeMotionPass()
+        self.assertTrue(pass_.run(self.module))
+        self.assertIs(self.function.entry, field.block)
+        self.assertIs(self.function.entry, field.b.block)
+        self.assertFalse(pass_.run(self.module))
+
+    def test_keep_divergent_region(self):
+        # An if statement in the loop only runs for some threads:
+        then = self.builder.new_block()
+        latch = self.builder.new_block()
+        self.builder.set_block(self.body)
+        self.builder.emit(ir.CJump(self.i, "==", self.zero, then, latch))
+        self.builder.set_block(then)
+        eight = self.builder.emit(ir.Const(8, "eight", ir.ptr))
+        field = self.builder.emit(ir.add(self.data, eight, "field", ir.ptr))
+        self.builder.emit(ir.Store(self.i, field))
+        self.builder.emit(ir.Jump(latch))
+        self.builder.set_block(latch)
+        self.close_loop()
+
+        self.assertFalse(LoopInvariantCodeMotionPass().run(self.module))
+        self.assertIs(then, field.block)
+
+    def test_keep_predicated_else(self):
+        # The then arm of an if/else falls through into the else arm, which
+        # dominates the latch but only runs for the threads in p2:
+        then = self.builder.new_block()
+        other = self.builder.new_block()
+        latch = self.builder.new_block()
+        self.builder.set_block(self.body)
+        self.builder.emit(
+            ir.BJump(self.i, "==", self.zero, then, other, 1, 2, 0)
+        )
+        self.builder.set_block(then)
+        self.builder.emit(ir.Jump(other))
+        self.builder.set_block(other)
+        eight = self.builder.emit(ir.Const(8, "eight", ir.ptr))
+        field = self.builder.emit(ir.add(self.data, eight, "field", ir.ptr))
+        store = self.builder.emit(ir.Store(self.i, field))
+        for instruction in (eight, field, store):
+            instruction.pred = 2
+        self.builder.emit(ir.Jump(latch))
+        self.builder.set_block(latch)
+        four = self.builder.emit(ir.Const(4, "four", ir.ptr))
+        offset = self.builder.emit(ir.add(self.data, four, "offset", ir.ptr))
+        self.builder.emit(ir.Store(self.i, offset))
+        self.close_loop()
+
+        self.assertTrue(LoopInvariantCodeMotionPass().run(self.module))
+        self.assertIs(other, field.block)
+        self.assertIs(self.function.entry, offset.block)
+
+    def test_hoist_load(self):
+        # The loop bound is loaded in the header, and the loop does not
+        # write it:
+        self.builder.set_block(self.header)
+        bound = self.builder.emit(ir.Load(self.data, "bound", ir.i32))
+        self.builder.set_block(self.body)
+        self.close_loop(bound)
+
+        self.assertTrue(LoopInvariantCodeMotionPass().run(self.module))
+        self.assertIs(self.function.entry, bound.block)
+
+    def test_keep_written_load(self):
+        self.builder.set_block(self.header)
+        bound = self.builder.emit(ir.Load(self.data, "bound", ir.i32))
+        self.builder.set_block(self.body)
+        self.builder.emit(ir.Store(self.i, self.data))
+        self.close_loop(bound)
+
+        self.assertFalse(LoopInvariantCodeMotionPass().run(self.module))
+        self.assertIs(self.header, bound.block)
+
+    def test_strength_reduction(self):
+        self.builder.set_block(self.body)
+        index = self.builder.emit(ir.Cast(self.i, "index", ir.ptr))
+        four = self.builder.emit(ir.Const(4, "four", ir.ptr))
+        offset = self.builder.emit(ir.mul(index, four, "offset", ir.ptr))
+        address = self.builder.emit(
+            ir.add(self.data, offset, "address", ir.ptr)
+        )
+        self.builder.emit(ir.Store(self.i, address))
+        self.close_loop()
+
+        pass_ = StrengthReductionPass()
+        self.assertTrue(pass_.run(self.module))
+        self.assertNotIn(offset, self.body.instructions)
+        iv = address.b
+        self.assertIsInstance(iv, ir.Phi)
+        self.assertIs(self.header, iv.block)
+
+        # The new induction variable is incremented by four:
+        increment = iv.get_value(self.body)
+        self.assertEqual("+", increment.operation)
+        self.assertEqual(4, increment.b.value)
+        self.assertFalse(pass_.run(self.module))
+
+
+class LoopUnrollTestCase(OptTestCase):
+    """Test the unrolling of SIMT loops with a constant trip count"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = ir.Variable("data", ir.Binding.GLOBAL, 64, 4)
+        self.module.add_variable(self.data)
+        self.header = self.builder.new_block()
+        self.body = self.builder.new_block()
+        self.final = self.builder.new_block()
+        zero = self.builder.emit(ir.Const(0, "zero", ir.i32))
+        self.builder.emit(ir.Jump(self.header))
+
+        # for (i = 0; i < 10; i++) data = i;
+        self.builder.set_block(self.header)
+        self.i = self.builder.emit(ir.Phi("i", ir.i32))
+        ten = self.builder.emit(ir.Const(10, "ten", ir.i32))
+        self.builder.emit(ir.SJump(self.i, "<", ten, self.body, 1))
+        self.builder.set_block(self.body)
+        self.builder.emit(ir.Store(self.i, self.data))
+        one = self.builder.emit(ir.Const(1, "one", ir.i32))
+        i_next = self.builder.emit(ir.add(self.i, one, "i_next", ir.i32))
+        ten = self.builder.emit(ir.Const(10, "ten", ir.i32))
+        self.builder.emit(
+            ir.PJump(i_next, "<", ten, self.header, self.final, 1, 0, 0)
+        )
+        for instruction in self.body:
+            instruction.pred = 1
+        self.i.set_incoming(self.function.entry, zero)
+        self.i.set_incoming(self.body, i_next)
+        self.builder.set_block(self.final)
+        self.builder.emit(ir.Exit())
+
+    def stored_values(self, block):
+        return [
+            instruction.value
+            for instruction in block
+            if isinstance(instruction, ir.Store)
+        ]
+
+    def test_unroll(self):
+        pass_ = LoopUnrollPass()
+        self.assertTrue(pass_.run(self.module))
+
+        # Two iterations run before the loop, and the loop runs twice:
+        self.assertEqual(2, len(self.stored_values(self.function.entry)))
+        stored = self.stored_values(self.body)
+        self.assertEqual(4, len(stored))
+        self.assertIs(self.i, stored[0])
+        self.assertEqual(3, stored[3].b.value)
+        i_next = self.i.get_value(self.body)
+        self.assertIs(self.i, i_next.a)
+        self.assertEqual(4, i_next.b.value)
+        self.assertIs(i_next, self.body.last_instruction.a)
+        self.assertFalse(pass_.run(self.module))
+
+    def test_unroll_pragma(self):
+        # Unroll the loop completely:
+        self.header.unroll = 0
+        self.assertTrue(LoopUnrollPass().run(self.module))
+        self.assertEqual(0, len(self.stored_values(self.function.entry)))
+        self.assertEqual(10, len(self.stored_values(self.body)))
+
+    def test_nounroll_pragma(self):
+        self.header.unroll = 1
+        self.assertFalse(LoopUnrollPass().run(self.module))
+        self.assertEqual(1, len(self.stored_values(self.body)))
+
+    def test_variable_bound(self):
+        check = self.header.last_instruction
+        bound = ir.Load(self.data, "bound", ir.i32)
+        self.header.insert_instruction(bound, check)
+        check.b = bound
+        self.assertFalse(LoopUnrollPass().run(self.module))
+
+    def test_variable_bound_pragma(self):
+        check = self.header.last_instruction
+        bound = ir.Load(self.data, "bound", ir.i32)
+        self.header.insert_instruction(bound, check)
+        check.b = bound
+        self.header.unroll = 4
+        with self.assertLogs("LoopUnrollPass", "WARNING"):
+            self.assertFalse(LoopUnrollPass().run(self.module))
+        self.assertEqual(1, len(self.stored_values(self.body)))
+
+
+class InlineTestCase(OptTestCase):
+    """Test the inlining of calls"""
+
+    def setUp(self):
+        super().setUp()
+        self.inliner = InlinePass()
+        self.data = ir.Variable("data", ir.Binding.GLOBAL, 4, 4)
+        self.module.add_variable(self.data)
+        self.caller_block = self.builder.block
+
+    def new_function(self, name, binding=ir.Binding.LOCAL):
+        """Create a function with a single parameter"""
+        function = self.builder.new_function(name, binding, ir.i32)
+        parameter = ir.Parameter("x", ir.i32)
+        function.add_parameter(parameter)
+        self.builder.set_function(function)
+        function.entry = self.builder.new_block()
+        self.builder.set_block(function.entry)
+        return function, parameter
+
+    def emit_call(self, function):
+        """Call the function from the test function, store the result"""
+        self.builder.set_function(self.function)
+        self.builder.set_block(self.caller_block)
+        load = self.builder.emit(ir.Load(self.data, "value", ir.i32))
+        call = self.builder.emit(
+            ir.FunctionCall(function, [load], "result", ir.i32)
+        )
+        store = self.builder.emit(ir.Store(call, self.data))
+        self.builder.emit(ir.Exit())
+        return load, store
+
+    def test_inline_local_function(self):
+        square, x = self.new_function("square")
+        value = self.builder.emit(ir.mul(x, x, "square", ir.i32))
+        self.builder.emit(ir.Return(value))
+        _, store = self.emit_call(square)
+
+        self.assertTrue(self.inliner.run(self.module))
+        self.assertFalse(self.function.get_out_calls())
+        self.assertIsInstance(store.value, ir.Binop)
+        self.assertNotIn(square, self.module.functions)
+
+    def test_never_inline(self):
+        square, x = self.new_function("square")
+        square.inline_hint = ir.InlineHint.NEVER
+        value = self.builder.emit(ir.mul(x, x, "square", ir.i32))
+        self.builder.emit(ir.Return(value))
+        self.emit_call(square)
+
+        self.assertFalse(self.inliner.run(self.module))
+        self.assertEqual(1, len(self.function.get_out_calls()))
+
+    def test_multiple_returns(self):
+        absolute, x = self.new_function("absolute", ir.Binding.GLOBAL)
+        negative = self.builder.new_block()
+        positive = self.builder.new_block()
+        zero = self.builder.emit_const(0, ir.i32)
+        self.builder.emit(ir.CJump(x, "<", zero, negative, positive))
+        self.builder.set_block(negative)
+        minus_x = self.builder.emit(ir.Unop("-", x, "minus_x", ir.i32))
+        self.builder.emit(ir.Return(minus_x))
+        self.builder.set_block(positive)
+        self.builder.emit(ir.Return(x))
+        load, store = self.emit_call(absolute)
+
+        # The results are merged, the global function is kept:
+        self.assertTrue(self.inliner.run(self.module))
+        self.assertIsInstance(store.value, ir.Phi)
+        results = list(store.value.inputs.values())
+        self.assertEqual(2, len(results))
+        self.assertIn(load, results)
+        self.assertIn("-", [getattr(r, "operation", None) for r in results])
+        self.assertIn(absolute, self.module.functions)
+
+    def test_uncopyable_instruction(self):
+        class Special(ir.Binop):
+            pass
+
+        square, x = self.new_function("square")
+        value = self.builder.emit(Special(x, "*", x, "square", ir.i32))
+        self.builder.emit(ir.Return(value))
+        self.emit_call(square)
+
+        # The inliner does not know how to copy the instruction:
+        self.assertFalse(self.inliner.run(self.module))
+        self.assertEqual(1, len(self.function.get_out_calls()))
+
+    def test_recursive_function(self):
+        recurse, x = self.new_function("recurse")
+        result = self.builder.emit(
+            ir.FunctionCall(recurse, [x], "result", ir.i32)
+        )
+        self.builder.emit(ir.Return(result))
+        self.emit_call(recurse)
+
+        # The function is inlined into the caller, but not into itself:
+        self.assertTrue(self.inliner.run(self.module))
+        self.assertIn(recurse, self.module.functions)
+        self.assertEqual(
+            [recurse], [call.callee for call in recurse.get_out_calls()]
+        )
+        self.assertEqual(
+            [recurse], [call.callee for call in self.function.get_out_calls()]
+        )
+
+
+class ExecutionTestCase(unittest.TestCase):
+    """Compare the results of optimized code with unoptimized code"""
+
+    levels = ("0", "1", "2", "s")
+
+    def results(self, source, name, inputs):
+        """Get the results of a function at each optimization level"""
+        results = {}
+        for level in self.levels:
+            module = compile_c3(source, level)
+            results[level] = [execute(module, name, *x) for x in inputs]
+        return results
+
+    def test_inline_multiple_returns(self):
+        """Inlined functions with several returns give the same results"""
+        source = """
+        module main;
+        function int absv(int x) {
+          if (x < 0) { return -x; }
+          return x;
+        }
+        function int clamp(int x, int lo, int hi) {
+          if (x < lo) { return lo; }
+          if (x > hi) { return hi; }
+          return x;
+        }
+        public function int twice(int x) {
+          return clamp(absv(x), 2, 9) + clamp(x, 0, 5);
+        }
+        """
+        module = compile_c3(source, "2")
+        twice = module.get_function("main_twice")
+        self.assertFalse(twice.get_out_calls())
+        inputs = [(x,) for x in range(-12, 12)]
+        results = self.results(source, "main_twice", inputs)
+        for level in self.levels:
+            self.assertEqual(results["0"], results[level], level)
+
+    def test_folded_branches(self):
+        """Branches folded by sccp leave blocks holding only a jump"""
+        source = """
+        module main;
+        public function int run(int a, int b) {
+          var int x = 3;
+          var int y = b;
+          if (x > 5) { y = a; }
+          if (b != b) {
+          } else {
+            if (b <= a) { y = x; }
+          }
+          return y;
+        }
+        """
+        inputs = [(a, b) for a in (-3, 0, 2, 7) for b in (-1, 1, 5)]
+        results = self.results(source, "main_run", inputs)
+        for level in self.levels:
+            self.assertEqual(results["0"], results[level], level)
+
+
 class TypedEvalTestCase(unittest.TestCase):
     """Test various integer values wrapped at bitsizes and signedness"""
 